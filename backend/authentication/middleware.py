@@ -0,0 +1,51 @@
+"""
+Websocket token authentication for BTS Monitoring System
+
+Browsers cannot set an Authorization header on a websocket, so clients of
+the token API pass their token either as ?token=<key> or as the
+subprotocols ["token", "<key>"]. TokenAuthMiddleware checks it with
+CachedTokenAuthentication and sets scope['user']; without a token the
+session user from AuthMiddlewareStack is kept. Consumers accept with
+scope['subprotocol'] so the browser sees its "token" subprotocol echoed.
+"""
+
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework import exceptions
+
+from .tokens import CachedTokenAuthentication
+
+TOKEN_SUBPROTOCOL = 'token'
+
+
+def scope_token(scope):
+    """
+    (token key, subprotocol to accept) of a websocket scope; None for either
+    when absent.
+    """
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) >= 2 and subprotocols[0] == TOKEN_SUBPROTOCOL:
+        return subprotocols[1], TOKEN_SUBPROTOCOL
+    query = parse_qs(scope.get('query_string', b'').decode())
+    tokens = query.get('token')
+    return (tokens[0], None) if tokens else (None, None)
+
+
+@database_sync_to_async
+def token_user(key):
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+    except exceptions.AuthenticationFailed:
+        return AnonymousUser()
+    return user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    async def __call__(self, scope, receive, send):
+        key, subprotocol = scope_token(scope)
+        if key:
+            scope = dict(scope, user=await token_user(key), subprotocol=subprotocol)
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,30 @@
+"""
+Authentication signals for BTS Monitoring System
+
+Changes to users, teams and tokens empty the cached token authentication
+(see authentication.tokens) in every process.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import Team, User
+from .tokens import bump_auth_version
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # login() saves last_login on every sign-in, which cached users need not see
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(bump_auth_version)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=Token)
+def auth_changed(sender, **kwargs):
+    transaction.on_commit(bump_auth_version)
@@ -0,0 +1,79 @@
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from monitoring.consumers import AlarmStreamConsumer
+from .middleware import TokenAuthMiddleware
+from .models import Team, User
+
+
+class CachedTokenAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        team = Team.objects.create(name='Power Team', team_type='power')
+        cls.user = User.objects.create_user('technician', password='x', role='technician', team=team)
+
+    def setUp(self):
+        cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_off_without_shared_cache(self):
+        # One query for the token, user and team; a deleted token fails at once
+        self.client.get(reverse('profile'))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        Token.objects.filter(key=self.token.key).delete()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    @override_settings(AUTH_TOKEN_CACHE_ENABLED=True)
+    def test_cached_until_logout(self):
+        self.client.get(reverse('profile'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class WebsocketTokenAuthTests(TransactionTestCase):
+    def setUp(self):
+        channel_layers.backends.clear()
+        self.token = Token.objects.create(user=User.objects.create_user('operator', password='x', role='operator'))
+        self.application = TokenAuthMiddleware(AlarmStreamConsumer.as_asgi())
+
+    async def connect(self, path, subprotocols=None):
+        communicator = WebsocketCommunicator(self.application, path, subprotocols=subprotocols)
+        connected, subprotocol = await communicator.connect()
+        return communicator, connected, subprotocol
+
+    async def test_query_string_token(self):
+        communicator, connected, _ = await self.connect(f'/ws/alarms/?token={self.token.key}')
+        self.assertTrue(connected)
+        await communicator.disconnect()
+
+    async def test_subprotocol_token(self):
+        communicator, connected, subprotocol = await self.connect('/ws/alarms/', ['token', self.token.key])
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'token')
+        await communicator.disconnect()
+
+    async def test_invalid_token(self):
+        for path in ('/ws/alarms/', '/ws/alarms/?token=invalid'):
+            with self.subTest(path=path):
+                _, connected, _ = await self.connect(path)
+                self.assertFalse(connected)
+
+    async def test_subscribe_requires_lists(self):
+        communicator, _, _ = await self.connect(f'/ws/alarms/?token={self.token.key}')
+        await communicator.send_json_to({'action': 'subscribe', 'regions': 'CEN'})
+        self.assertEqual((await communicator.receive_json_from())['type'], 'error')
+        await communicator.send_json_to({'action': 'subscribe', 'regions': ['CEN']})
+        response = await communicator.receive_json_from()
+        self.assertEqual(response['filters']['regions'], ['CEN'])
+        await communicator.disconnect()
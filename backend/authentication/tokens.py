@@ -0,0 +1,113 @@
+"""
+Cached token authentication for BTS Monitoring System
+
+DRF's TokenAuthentication reads the token and its user on every request,
+and views then read user.team. CachedTokenAuthentication keeps token ->
+(user with team) in a per-process LRU of AUTH_TOKEN_CACHE_SIZE entries that
+expire after AUTH_TOKEN_CACHE_TTL seconds, so repeated requests with the
+same token cost no queries. Logout, token deletion and user or team
+changes bump AUTH_VERSION_KEY, which empties the LRU of every process
+reading the same cache.
+
+Only a shared cache (CACHE_URL) carries that bump to other processes, so
+the LRU is off unless AUTH_TOKEN_CACHE_ENABLED is set, which it is by
+default with CACHE_URL. Without it every request reads the token and its
+user, team included, in one query.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+AUTH_VERSION_KEY = 'authentication:tokens:version'
+
+
+def bump_auth_version():
+    cache.set(AUTH_VERSION_KEY, time.time_ns(), None)
+
+
+class TokenCache:
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = None
+        # key -> (expires, user, token), least recently used first
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        """
+        ((user, token) or None, version); pass the version on to put().
+        """
+        version = cache.get(AUTH_VERSION_KEY)
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None, version
+            entry = self.entries.get(key)
+            if entry is None:
+                return None, version
+            if entry[0] <= now:
+                del self.entries[key]
+                return None, version
+            self.entries.move_to_end(key)
+            return (entry[1], entry[2]), version
+
+    def put(self, key, user, token, now, version):
+        with self.lock:
+            # Read before a logout or user change the cache has since seen
+            if version != self.version:
+                return
+            self.entries[key] = (now + self.ttl, user, token)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+_cache = None
+
+
+def get_token_cache():
+    """
+    The process-wide token cache, None when AUTH_TOKEN_CACHE_ENABLED is off.
+    """
+    global _cache
+    if not settings.AUTH_TOKEN_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = TokenCache(settings.AUTH_TOKEN_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+    return _cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication backed by the process-wide token cache.
+    """
+
+    def authenticate_credentials(self, key):
+        tokens = get_token_cache()
+        now = time.monotonic()
+        cached, version = tokens.get(key, now) if tokens is not None else (None, None)
+        if cached is None:
+            try:
+                token = Token.objects.select_related('user__team').get(key=key)
+            except Token.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            if tokens is not None:
+                tokens.put(key, token.user, token, now, version)
+            cached = token.user, token
+
+        # Each request gets its own copy, so views may set attributes on it
+        user, token = cached
+        return copy.copy(user), token
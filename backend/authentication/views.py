@@ -26,10 +26,8 @@ def login_view(request):
 @api_view(['POST'])
 def logout_view(request):
     if request.user.is_authenticated:
-        try:
-            request.user.auth_token.delete()
-        except:
-            pass
+        # Deleting the token also drops it from the token cache
+        Token.objects.filter(user=request.user).delete()
         logout(request)
     return Response({'message': 'Logged out successfully'})
 
@@ -1 +1,6 @@
-# This makes Python treat the directory as a package
\ No newline at end of file
+# This makes Python treat the directory as a package
+
+# Load the Celery app so shared_task binds to it when Django starts
+from celery_app import app as celery_app
+
+__all__ = ('celery_app',)
@@ -11,11 +11,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bts_monitoring.settings')
 
 django_asgi_app = get_asgi_application()
 
+from authentication.middleware import TokenAuthMiddleware  # noqa: E402
+from monitoring.routing import websocket_urlpatterns  # noqa: E402
+
+# Session users, or token users with ?token= or the "token" subprotocol
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
-        URLRouter([
-            # WebSocket URL patterns will be added here
-        ])
+        TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
     ),
 })
\ No newline at end of file
@@ -29,6 +29,7 @@ DJANGO_APPS = [
 
 THIRD_PARTY_APPS = [
     'rest_framework',
+    'rest_framework.authtoken',
     'corsheaders',
     'channels',
 ]
@@ -37,6 +38,7 @@ LOCAL_APPS = [
     'authentication',
     'monitoring',
     'tickets',
+    'notifications',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -120,16 +122,162 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'authentication.tokens.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'monitoring.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
 
+# Cache configuration (local memory unless a Redis cache URL is given).
+# Rule, site index and token caches learn of changes made by other
+# processes through version keys in this cache, so deployments running more
+# than one process need CACHE_URL; without it they only catch up on their
+# periodic reload
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bts-monitoring',
+        }
+    }
+
+# Token -> user cache of CachedTokenAuthentication, per process; user, team
+# and token changes clear it sooner, but only in every process when the
+# cache is shared, so it is off by default without CACHE_URL
+AUTH_TOKEN_CACHE_ENABLED = config('AUTH_TOKEN_CACHE_ENABLED', default=bool(CACHE_URL), cast=bool)
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=10000, cast=int)
+AUTH_TOKEN_CACHE_TTL = config('AUTH_TOKEN_CACHE_TTL', default=300, cast=int)
+
+# Dashboard statistics snapshot
+DASHBOARD_STATS_TTL = config('DASHBOARD_STATS_TTL', default=600, cast=int)
+DASHBOARD_STATS_REFRESH = config('DASHBOARD_STATS_REFRESH', default=300, cast=int)
+
+# Site health rows are reconciled with the alarms every SITE_HEALTH_RECONCILE seconds
+SITE_HEALTH_RECONCILE = config('SITE_HEALTH_RECONCILE', default=3600, cast=int)
+
+# Bulk alarm ingestion
+ALARM_BULK_MAX_ITEMS = config('ALARM_BULK_MAX_ITEMS', default=10000, cast=int)
+ALARM_BULK_BATCH_SIZE = config('ALARM_BULK_BATCH_SIZE', default=1000, cast=int)
+
+# Alarm deduplication and flap suppression (window in seconds)
+ALARM_FLAP_WINDOW = config('ALARM_FLAP_WINDOW', default=3600, cast=int)
+ALARM_FLAP_THRESHOLD = config('ALARM_FLAP_THRESHOLD', default=6, cast=int)
+ALARM_FLAP_RECOVERY = config('ALARM_FLAP_RECOVERY', default=2, cast=int)
+ALARM_DEDUP_INDEX_TTL = config('ALARM_DEDUP_INDEX_TTL', default=300, cast=int)
+ALARM_DEDUP_MAX_KEYS = 100000
+
+# Site heartbeats (seconds): pings are buffered and flushed to
+# Site.last_ping every HEARTBEAT_FLUSH_INTERVAL, sites silent for longer
+# than HEARTBEAT_STALE_AFTER get an 'ip' alarm
+HEARTBEAT_MAX_ITEMS = config('HEARTBEAT_MAX_ITEMS', default=20000, cast=int)
+HEARTBEAT_FLUSH_INTERVAL = config('HEARTBEAT_FLUSH_INTERVAL', default=5, cast=int)
+HEARTBEAT_FLUSH_BATCH_SIZE = 1000
+HEARTBEAT_DIRECTORY_TTL = 60
+HEARTBEAT_STALE_AFTER = config('HEARTBEAT_STALE_AFTER', default=180, cast=int)
+HEARTBEAT_CHECK_INTERVAL = config('HEARTBEAT_CHECK_INTERVAL', default=30, cast=int)
+HEARTBEAT_ALARM_SEVERITY = 'major'
+
+# Active TCP probing of site IP addresses (timeouts and intervals in seconds)
+PROBE_PORT = config('PROBE_PORT', default=22, cast=int)
+PROBE_TIMEOUT = config('PROBE_TIMEOUT', default=2.0, cast=float)
+PROBE_CONCURRENCY = config('PROBE_CONCURRENCY', default=200, cast=int)
+PROBE_JITTER = config('PROBE_JITTER', default=0.5, cast=float)
+PROBE_INTERVAL = config('PROBE_INTERVAL', default=60, cast=int)
+PROBE_LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000]
+
+# Site KPI time series: rollup resolutions and per-tier retention in seconds
+METRIC_ROLLUPS = [60, 300, 3600]
+METRIC_RETENTION = {
+    'raw': config('METRIC_RAW_RETENTION', default=2 * 86400, cast=int),
+    60: 7 * 86400,
+    300: 30 * 86400,
+    3600: 365 * 86400,
+}
+# Expected spacing of raw samples, used to estimate raw point counts
+METRIC_SAMPLE_INTERVAL = 60
+METRIC_LATE_ARRIVAL = 120
+METRIC_MAX_POINTS = 2000
+METRIC_MAX_ITEMS = 20000
+METRIC_BATCH_SIZE = 1000
+
+# Metric threshold rules: windowed aggregations (avg/min/max/p95) use the
+# last RULE_WINDOW_SAMPLES samples per site within RULE_WINDOW seconds
+RULE_WINDOW = config('RULE_WINDOW', default=300, cast=int)
+RULE_WINDOW_SAMPLES = 32
+# Seconds after which rules are recompiled even if the version key did not change
+RULE_RELOAD_INTERVAL = config('RULE_RELOAD_INTERVAL', default=60, cast=int)
+
+# Site map queries: ?near= radius default and cap in km, and map clusters
+# per 256px tile width (4 gives roughly 64px cells at any zoom)
+GEO_NEAR_RADIUS_KM = 10.0
+GEO_MAX_RADIUS_KM = 500.0
+GEO_CLUSTER_CELLS = 4
+# Seconds after which the site index reloads even if the version key did not change
+GEO_RELOAD_INTERVAL = config('GEO_RELOAD_INTERVAL', default=60, cast=int)
+
+# Rows fetched per round trip by the streaming CSV/NDJSON exports
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Alarms resolved or closed for ALARM_ARCHIVE_AFTER days move to the archive
+# tables, ALARM_ARCHIVE_BATCH_SIZE per transaction
+ALARM_ARCHIVE_AFTER = config('ALARM_ARCHIVE_AFTER', default=90, cast=int)
+ALARM_ARCHIVE_BATCH_SIZE = config('ALARM_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+ALARM_ARCHIVE_INTERVAL = config('ALARM_ARCHIVE_INTERVAL', default=3600, cast=int)
+
+# Alarm analytics rollups; each refresh looks back ANALYTICS_OVERLAP seconds
+# before its watermark for changes committed late
+ANALYTICS_REFRESH = config('ANALYTICS_REFRESH', default=300, cast=int)
+ANALYTICS_OVERLAP = 120
+
+# Alarm correlation into incidents (window in seconds)
+CORRELATION_ALARM_TYPES = ['ip', 'transmission', 'power']
+CORRELATION_WINDOW = config('CORRELATION_WINDOW', default=300, cast=int)
+CORRELATION_RADIUS_KM = config('CORRELATION_RADIUS_KM', default=30.0, cast=float)
+CORRELATION_MIN_ALARMS = config('CORRELATION_MIN_ALARMS', default=3, cast=int)
+CORRELATION_MAX_CLUSTERS = 5000
+# Correlation keeps its clusters in memory, so its task goes to a queue that
+# exactly one worker consumes, with concurrency 1:
+#   celery -A bts_monitoring worker -Q correlation -c 1
+CORRELATION_QUEUE = config('CORRELATION_QUEUE', default='correlation')
+# Seconds before a worker that does not own the clusters requeues a task
+CORRELATION_RETRY_DELAY = 1
+
+# Team responsible for each alarm type
+ALARM_TEAM_TYPES = {
+    'power': 'power',
+    'ip': 'transmission',
+    'transmission': 'transmission',
+    'bss': 'bss',
+    'hardware': 'hardware',
+    'security': 'security',
+}
+
+# Automatic tickets for new alarms, created by a non-login system user. The
+# colon fails Django's username validation, so no real account can take
+# this name
+TICKET_AUTO_SEVERITIES = ['critical', 'major']
+TICKET_SYSTEM_USERNAME = 'bts:system'
+TICKET_BATCH_SIZE = config('TICKET_BATCH_SIZE', default=500, cast=int)
+TICKET_ROUTING_TTL = config('TICKET_ROUTING_TTL', default=300, cast=int)
+# Upper bound on per-user ticket stats; ticket saves invalidate them sooner
+TICKET_STATS_TTL = config('TICKET_STATS_TTL', default=300, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -138,14 +286,40 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
-# Channels configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('127.0.0.1', 6379)],
+# Channels configuration (CHANNEL_LAYER=memory runs without Redis, single process only)
+if config('CHANNEL_LAYER', default='redis') == 'memory':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
         },
-    },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": [('127.0.0.1', 6379)],
+            },
+        },
+    }
+
+# Realtime alarm stream
+ALARM_STREAM_GROUP = 'alarm-stream'
+ALARM_STREAM_COALESCE_MS = config('ALARM_STREAM_COALESCE_MS', default=250, cast=int)
+
+# Notifications are collected for NOTIFICATION_DIGEST_WINDOW seconds and
+# sent as one digest per recipient and channel
+NOTIFICATION_SEVERITIES = ['critical', 'major']
+NOTIFICATION_DIGEST_WINDOW = config('NOTIFICATION_DIGEST_WINDOW', default=60, cast=int)
+NOTIFICATION_BATCH_SIZE = 5000
+# Alarms listed in the single notification of an ingestion batch
+NOTIFICATION_ALARM_LINES = 20
+# Pending notifications whose digest never ran are swept up this often
+NOTIFICATION_SWEEP_INTERVAL = config('NOTIFICATION_SWEEP_INTERVAL', default=300, cast=int)
+# Digests per channel per minute
+NOTIFICATION_RATE_LIMITS = {
+    'email': config('NOTIFICATION_EMAIL_RATE', default=100, cast=int),
+    'sms': config('NOTIFICATION_SMS_RATE', default=30, cast=int),
 }
 
 # Celery configuration
@@ -155,14 +329,64 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Eager mode runs tasks inline, e.g. for tests without a broker
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_ROUTES = {
+    'monitoring.tasks.correlate_alarms': {'queue': CORRELATION_QUEUE},
+}
+CELERY_BEAT_SCHEDULE = {
+    'refresh-dashboard-stats': {
+        'task': 'monitoring.tasks.refresh_dashboard_stats',
+        'schedule': DASHBOARD_STATS_REFRESH,
+    },
+    'resolve-cleared-incidents': {
+        'task': 'monitoring.tasks.resolve_cleared_incidents',
+        'schedule': 60,
+    },
+    'detect-stale-sites': {
+        'task': 'monitoring.tasks.detect_stale_sites',
+        'schedule': HEARTBEAT_CHECK_INTERVAL,
+    },
+    'probe-sites': {
+        'task': 'monitoring.tasks.probe_sites',
+        'schedule': PROBE_INTERVAL,
+    },
+    'rollup-metrics': {
+        'task': 'monitoring.tasks.rollup_metrics',
+        'schedule': 60,
+    },
+    'reconcile-site-health': {
+        'task': 'monitoring.tasks.reconcile_site_health',
+        'schedule': SITE_HEALTH_RECONCILE,
+    },
+    'refresh-alarm-analytics': {
+        'task': 'monitoring.tasks.refresh_alarm_analytics',
+        'schedule': ANALYTICS_REFRESH,
+    },
+    'sweep-pending-notifications': {
+        'task': 'notifications.tasks.sweep_pending_notifications',
+        'schedule': NOTIFICATION_SWEEP_INTERVAL,
+    },
+    'archive-alarms': {
+        'task': 'monitoring.tasks.archive_alarms',
+        'schedule': ALARM_ARCHIVE_INTERVAL,
+    },
+}
 
 # Email configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
 EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@bts-monitoring.local')
+
+# SMS configuration (sends are only logged when Twilio is not configured)
+TWILIO_ACCOUNT_SID = config('TWILIO_ACCOUNT_SID', default='')
+TWILIO_AUTH_TOKEN = config('TWILIO_AUTH_TOKEN', default='')
+TWILIO_PHONE_NUMBER = config('TWILIO_PHONE_NUMBER', default='')
+SMS_MAX_LENGTH = 1600
 
 # Logging configuration
 LOGGING = {
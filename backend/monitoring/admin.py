@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Region, Site, Alarm, AlarmHistory
+from .models import Region, Site, Alarm, AlarmHistory, ArchivedAlarm, Incident, MetricRule
 
 
 @admin.register(Region)
@@ -17,14 +17,36 @@ class SiteAdmin(admin.ModelAdmin):
 
 @admin.register(Alarm)
 class AlarmAdmin(admin.ModelAdmin):
-    list_display = ('title', 'site', 'alarm_type', 'severity', 'status', 'created_at')
-    list_filter = ('alarm_type', 'severity', 'status', 'site__region')
+    list_display = ('title', 'site', 'alarm_type', 'severity', 'status', 'occurrence_count', 'created_at')
+    list_filter = ('alarm_type', 'severity', 'status', 'is_flapping', 'site__region')
     search_fields = ('title', 'description', 'site__name')
     date_hierarchy = 'created_at'
 
 
+@admin.register(Incident)
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = ('title', 'region', 'alarm_type', 'status', 'alarm_count', 'first_alarm_at', 'last_alarm_at')
+    list_filter = ('status', 'alarm_type', 'region')
+    date_hierarchy = 'created_at'
+
+
+@admin.register(MetricRule)
+class MetricRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'metric', 'aggregation', 'operator', 'threshold', 'duration', 'severity', 'is_active')
+    list_filter = ('metric', 'severity', 'is_active', 'region')
+    search_fields = ('name',)
+
+
 @admin.register(AlarmHistory)
 class AlarmHistoryAdmin(admin.ModelAdmin):
     list_display = ('alarm', 'user', 'action', 'created_at')
     list_filter = ('action', 'created_at')
-    search_fields = ('alarm__title', 'user__username', 'comment')
\ No newline at end of file
+    search_fields = ('alarm__title', 'user__username', 'comment')
+
+
+@admin.register(ArchivedAlarm)
+class ArchivedAlarmAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'site', 'alarm_type', 'severity', 'status', 'created_at', 'archived_at')
+    list_filter = ('alarm_type', 'severity', 'status')
+    search_fields = ('title', 'site__name')
+    date_hierarchy = 'created_at'
@@ -0,0 +1,210 @@
+"""
+Alarm analytics for BTS Monitoring System
+
+AlarmDailyStat and SiteDailyStat hold per-day aggregates keyed by the day
+an alarm was created. refresh_analytics() finds the days of alarms that
+changed (or got history) since the last watermark and recomputes just
+those days, so the periodic refresh costs work proportional to recent
+activity rather than to months of alarms. rebuild_analytics() recomputes
+everything. Archived alarms count too: each day adds up both tables.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Alarm, AlarmHistory, ArchivedAlarm, AlarmDailyStat, SiteDailyStat, AnalyticsWatermark
+
+WATERMARK = 'alarm_analytics'
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def seconds(duration):
+    return duration.total_seconds() if duration else 0.0
+
+
+def daily_rows(alarms):
+    acknowledged = Q(acknowledged_at__isnull=False)
+    resolved = Q(resolved_at__isnull=False)
+    return alarms.values('day', 'site__region_id', 'alarm_type', 'severity').annotate(
+        alarm_count=Count('id'),
+        acknowledged_count=Count('id', filter=acknowledged),
+        acknowledge_time=Sum(ExpressionWrapper(
+            F('acknowledged_at') - F('created_at'), output_field=DurationField()
+        ), filter=acknowledged),
+        resolved_count=Count('id', filter=resolved),
+        resolve_time=Sum(ExpressionWrapper(
+            F('resolved_at') - F('created_at'), output_field=DurationField()
+        ), filter=resolved),
+    ).order_by()
+
+
+def add_rows(totals, key_fields, rows):
+    # Sum aggregate rows of the live and archive tables by key
+    for row in rows:
+        key = tuple(row[field] for field in key_fields)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = row
+            continue
+        for field, value in row.items():
+            if field not in key_fields and value is not None:
+                total[field] = value if total[field] is None else total[field] + value
+
+
+def recompute_days(days):
+    """
+    Rebuild both daily tables for the given dates.
+    """
+    days = sorted(set(days))
+    if not days:
+        return 0
+
+    condition = Q()
+    for day in days:
+        start, end = day_range(day)
+        condition |= Q(created_at__gte=start, created_at__lt=end)
+
+    daily = {}
+    per_site = {}
+    for model in (Alarm, ArchivedAlarm):
+        alarms = model.objects.filter(condition).annotate(day=TruncDate('created_at'))
+        add_rows(daily, ('day', 'site__region_id', 'alarm_type', 'severity'), daily_rows(alarms))
+        add_rows(per_site, ('day', 'site_id'), alarms.values('day', 'site_id').annotate(
+            alarm_count=Count('id'),
+            critical_count=Count('id', filter=Q(severity='critical')),
+        ).order_by())
+
+    with transaction.atomic():
+        AlarmDailyStat.objects.filter(day__in=days).delete()
+        SiteDailyStat.objects.filter(day__in=days).delete()
+        AlarmDailyStat.objects.bulk_create([
+            AlarmDailyStat(
+                day=row['day'],
+                region_id=row['site__region_id'],
+                alarm_type=row['alarm_type'],
+                severity=row['severity'],
+                alarm_count=row['alarm_count'],
+                acknowledged_count=row['acknowledged_count'],
+                acknowledge_seconds=seconds(row['acknowledge_time']),
+                resolved_count=row['resolved_count'],
+                resolve_seconds=seconds(row['resolve_time']),
+            )
+            for row in daily.values()
+        ], batch_size=1000)
+        SiteDailyStat.objects.bulk_create([
+            SiteDailyStat(
+                day=row['day'], site_id=row['site_id'],
+                alarm_count=row['alarm_count'], critical_count=row['critical_count'],
+            )
+            for row in per_site.values()
+        ], batch_size=1000)
+    return len(days)
+
+
+def refresh_analytics(now=None):
+    """
+    Recompute the days touched since the last run. The window reaches back
+    ANALYTICS_OVERLAP seconds before the watermark so changes committed late
+    are not missed; recomputing a day twice is harmless.
+    """
+    now = now or timezone.now()
+    watermark = AnalyticsWatermark.objects.filter(name=WATERMARK).first()
+    if watermark is None:
+        return rebuild_analytics(now)
+
+    since = watermark.value - timedelta(seconds=settings.ANALYTICS_OVERLAP)
+    days = set(Alarm.objects.filter(
+        updated_at__gt=since, updated_at__lte=now
+    ).annotate(day=TruncDate('created_at')).values_list('day', flat=True).distinct().order_by())
+    days |= set(AlarmHistory.objects.filter(
+        created_at__gt=since, created_at__lte=now
+    ).annotate(day=TruncDate('alarm__created_at')).values_list('day', flat=True).distinct().order_by())
+
+    recomputed = recompute_days(days)
+    AnalyticsWatermark.objects.filter(name=WATERMARK).update(value=now)
+    return recomputed
+
+
+def rebuild_analytics(now=None):
+    """
+    Recompute every day that has alarms, a month at a time.
+    """
+    now = now or timezone.now()
+    AlarmDailyStat.objects.all().delete()
+    SiteDailyStat.objects.all().delete()
+
+    days = set()
+    for model in (Alarm, ArchivedAlarm):
+        days |= set(model.objects.filter(created_at__lte=now).annotate(
+            day=TruncDate('created_at')
+        ).values_list('day', flat=True).distinct().order_by())
+    days = sorted(days)
+    for start in range(0, len(days), 31):
+        recompute_days(days[start:start + 31])
+
+    AnalyticsWatermark.objects.update_or_create(name=WATERMARK, defaults={'value': now})
+    return len(days)
+
+
+def ratio(total, count):
+    return round(total / count, 1) if count else None
+
+
+def alarm_analytics(start, end, region=None, alarm_type=None, top=10):
+    """
+    MTTA/MTTR, daily series, breakdowns and top offender sites between two
+    dates (inclusive), read from the daily tables only.
+    """
+    stats = AlarmDailyStat.objects.filter(day__gte=start, day__lte=end)
+    sites = SiteDailyStat.objects.filter(day__gte=start, day__lte=end)
+    if region:
+        stats = stats.filter(region__code=region)
+        sites = sites.filter(site__region__code=region)
+    if alarm_type:
+        stats = stats.filter(alarm_type=alarm_type)
+
+    sums = dict(
+        alarm_count=Sum('alarm_count'),
+        acknowledged_count=Sum('acknowledged_count'),
+        acknowledge_seconds=Sum('acknowledge_seconds'),
+        resolved_count=Sum('resolved_count'),
+        resolve_seconds=Sum('resolve_seconds'),
+    )
+
+    def summary(row):
+        return {
+            'alarm_count': row['alarm_count'] or 0,
+            'mtta_seconds': ratio(row['acknowledge_seconds'] or 0, row['acknowledged_count']),
+            'mttr_seconds': ratio(row['resolve_seconds'] or 0, row['resolved_count']),
+        }
+
+    def grouped(*fields):
+        return [
+            {**{field: row[field] for field in fields}, **summary(row)}
+            for row in stats.values(*fields).annotate(**sums).order_by(*fields)
+        ]
+
+    result = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': summary(stats.aggregate(**sums)),
+        'by_day': [{**row, 'day': row['day'].isoformat()} for row in grouped('day')],
+        'by_region': grouped('region__code'),
+        'by_type': grouped('alarm_type'),
+        'by_severity': grouped('severity'),
+    }
+    if alarm_type is None:
+        # Site rankings are not broken down by type
+        result['top_sites'] = list(sites.values('site__code', 'site__name').annotate(
+            alarm_count=Sum('alarm_count'), critical_count=Sum('critical_count')
+        ).order_by('-alarm_count', 'site__code')[:top])
+    return result
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class MonitoringConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'monitoring'
\ No newline at end of file
+    name = 'monitoring'
+
+    def ready(self):
+        from . import signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""
+Alarm archival for BTS Monitoring System
+
+Alarms resolved or closed for more than ALARM_ARCHIVE_AFTER days move, with
+their history, into ArchivedAlarm and ArchivedAlarmHistory, so the live
+tables only hold what operators work on. archive_alarms() moves them in
+batches of ALARM_ARCHIVE_BATCH_SIZE, each in its own short transaction that
+skips rows other writers hold, so it never blocks ingestion for long.
+
+The archive is split into monthly partitions by created_at. export_partition()
+writes one month as gzip-compressed JSON lines, one alarm per line with its
+history nested, and can then drop it from the database.
+"""
+
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .exports import plain
+from .models import Alarm, AlarmHistory, ArchivedAlarm, ArchivedAlarmHistory
+from .signals import archiving
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+ARCHIVE_STATUSES = ('resolved', 'closed')
+
+ALARM_FIELDS = [field.attname for field in Alarm._meta.concrete_fields]
+HISTORY_FIELDS = [field.attname for field in AlarmHistory._meta.concrete_fields]
+
+
+def include_archived(params):
+    # ?include_archived=1 adds archived alarms to the alarm read endpoints
+    return params.get('include_archived') in ('1', 'true')
+
+
+def archive_alarms(now=None, batch_size=None):
+    """
+    Move alarms cleared before the cutoff into the archive tables.
+    Returns the number of alarms archived.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.ALARM_ARCHIVE_AFTER)
+    batch_size = batch_size or settings.ALARM_ARCHIVE_BATCH_SIZE
+
+    archived = 0
+    while True:
+        moved = archive_batch(cutoff, now, batch_size)
+        archived += moved
+        if moved < batch_size:
+            break
+    if archived:
+        logger.info(f'Archived {archived} alarms cleared before {cutoff:%Y-%m-%d}')
+    return archived
+
+
+def archive_batch(cutoff, now, batch_size):
+    with transaction.atomic():
+        # updated_at is when the alarm was last touched, at latest when it
+        # was cleared; rows locked by a concurrent reopen are left for later
+        ids = list(Alarm.objects.select_for_update(skip_locked=True).filter(
+            status__in=ARCHIVE_STATUSES, updated_at__lt=cutoff
+        ).order_by('updated_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+
+        ArchivedAlarm.objects.bulk_create([
+            ArchivedAlarm(archived_at=now, **row)
+            for row in Alarm.objects.filter(id__in=ids).values(*ALARM_FIELDS)
+        ])
+        ArchivedAlarmHistory.objects.bulk_create([
+            ArchivedAlarmHistory(**row)
+            for row in AlarmHistory.objects.filter(alarm_id__in=ids).values(*HISTORY_FIELDS)
+        ], batch_size=settings.ALARM_BULK_BATCH_SIZE)
+
+        # The history goes with the cascade. The alarms are cleared, so stats
+        # and site health do not change, and clients should not see them as
+        # deleted. Tickets find the archived rows and keep the alarm id.
+        with archiving():
+            Alarm.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def partition_range(month):
+    """
+    'YYYY-MM' -> (start, end) of that month in local time; ValueError if invalid.
+    """
+    start = datetime.strptime(month, '%Y-%m')
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return timezone.make_aware(start), timezone.make_aware(end)
+
+
+def partition_rows(month):
+    # One dict per archived alarm created in the month, history nested
+    start, end = partition_range(month)
+    alarms = ArchivedAlarm.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).order_by('created_at', 'id').values(*ALARM_FIELDS, 'archived_at')
+
+    chunk = []
+    for alarm in alarms.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        chunk.append(alarm)
+        if len(chunk) == settings.EXPORT_CHUNK_SIZE:
+            yield from with_history(chunk)
+            chunk = []
+    yield from with_history(chunk)
+
+
+def with_history(alarms):
+    history = {}
+    for row in ArchivedAlarmHistory.objects.filter(
+        alarm_id__in=[alarm['id'] for alarm in alarms]
+    ).order_by('created_at', 'id').values(*HISTORY_FIELDS):
+        history.setdefault(row['alarm_id'], []).append(row)
+    for alarm in alarms:
+        alarm['history'] = history.get(alarm['id'], [])
+        yield alarm
+
+
+def export_partition(month, path, purge=False):
+    """
+    Write one month of the archive to a gzip JSON lines file and, when
+    purge is set, delete it from the database. Returns the number of alarms.
+    """
+    start, end = partition_range(month)
+    # Alarms archived into the month while it is written are kept for the next export
+    started = timezone.now()
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as output:
+        for alarm in partition_rows(month):
+            alarm['history'] = [{key: plain(value) for key, value in row.items()} for row in alarm['history']]
+            output.write(json.dumps({key: plain(value) for key, value in alarm.items()}) + '\n')
+            count += 1
+
+    if purge:
+        # History goes with its alarms through the cascade
+        ArchivedAlarm.objects.filter(
+            created_at__gte=start, created_at__lt=end, archived_at__lt=started
+        ).delete()
+        logger.info(f'Purged archive partition {month} after exporting {count} alarms to {path}')
+    return count
@@ -0,0 +1,111 @@
+"""
+Websocket consumers for BTS Monitoring System
+"""
+
+import asyncio
+from urllib.parse import parse_qs
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+# Subscription filter -> (query string parameter, alarm event field)
+FILTERS = {
+    'regions': ('region', 'region_code'),
+    'sites': ('site', 'site_code'),
+    'severities': ('severity', 'severity'),
+}
+
+
+def merge_stats(total, delta):
+    if total is None:
+        # Copy, as the in-memory layer may share one message between consumers
+        return {key: dict(value) if isinstance(value, dict) else value for key, value in delta.items()}
+    for key in ('total_alarms', 'critical_alarms'):
+        total[key] += delta[key]
+    for key in ('alarms_by_type', 'alarms_by_severity'):
+        for name, count in delta[key].items():
+            total[key][name] = total[key].get(name, 0) + count
+    return total
+
+
+class AlarmStreamConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams alarm create/acknowledge/resolve events and stats deltas.
+
+    Clients authenticate with their session or API token (see
+    authentication.middleware) and narrow the stream with
+    ?region=CEN,LIT&site=...&severity=critical or by sending
+    {"action": "subscribe", "regions": [...], "sites": [...],
+    "severities": [...]}, each a list of strings. Everything received
+    within ALARM_STREAM_COALESCE_MS goes out as a single
+    {"type": "alarms", "events": [...], "stats": {...}} frame.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.filters = {
+            name: {value for values in query.get(param, []) for value in values.split(',') if value}
+            for name, (param, _) in FILTERS.items()
+        }
+        self.pending_events = []
+        self.pending_stats = None
+        self.flush_task = None
+
+        await self.channel_layer.group_add(settings.ALARM_STREAM_GROUP, self.channel_name)
+        await self.accept(subprotocol=self.scope.get('subprotocol'))
+
+    async def disconnect(self, code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        await self.channel_layer.group_discard(settings.ALARM_STREAM_GROUP, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if not isinstance(content, dict) or content.get('action') != 'subscribe':
+            await self.send_json({'type': 'error', 'error': 'Unknown action'})
+            return
+
+        # A bare string would otherwise be split into characters
+        filters = {name: content.get(name) or [] for name in FILTERS}
+        invalid = sorted(
+            name for name, values in filters.items()
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values)
+        )
+        if invalid:
+            await self.send_json({'type': 'error', 'error': f'{", ".join(invalid)} must be lists of strings'})
+            return
+
+        for name, values in filters.items():
+            self.filters[name] = set(values)
+        await self.send_json({
+            'type': 'subscribed',
+            'filters': {name: sorted(values) for name, values in self.filters.items()}
+        })
+
+    def matches(self, alarm):
+        return all(
+            not self.filters[name] or alarm[field] in self.filters[name]
+            for name, (_, field) in FILTERS.items()
+        )
+
+    async def alarm_events(self, message):
+        self.pending_events.extend(
+            event for event in message['events'] if self.matches(event['alarm'])
+        )
+        self.pending_stats = merge_stats(self.pending_stats, message['stats'])
+
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(settings.ALARM_STREAM_COALESCE_MS / 1000)
+        events, stats = self.pending_events, self.pending_stats
+        self.pending_events, self.pending_stats = [], None
+        self.flush_task = None
+
+        if events or stats['alarms_by_type'] or stats['alarms_by_severity']:
+            await self.send_json({'type': 'alarms', 'events': events, 'stats': stats})
@@ -0,0 +1,246 @@
+"""
+Alarm correlation for BTS Monitoring System
+
+New alarms of the correlated types are grouped into clusters by region and
+alarm type, within CORRELATION_WINDOW seconds of the cluster's last alarm
+and CORRELATION_RADIUS_KM of its centroid. Once a cluster holds
+CORRELATION_MIN_ALARMS alarms it becomes an Incident and later alarms are
+attached to it directly. Clusters expire with the window and their number
+is capped, so memory stays bounded however long the stream runs.
+
+The clusters live in one process's memory, so alarms are only correlated
+by the correlate_alarms task, routed to CORRELATION_QUEUE; a single worker
+with concurrency 1 must consume it. claim_correlator() holds that worker to
+it when several consume the queue by mistake: the others put their tasks
+back until the owner has been idle for CORRELATION_WINDOW, by which time
+its clusters have expired anyway.
+"""
+
+import math
+import os
+import socket
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import Site, Alarm, Incident
+
+EARTH_RADIUS_KM = 6371.0
+
+CORRELATOR_OWNER_KEY = 'monitoring:correlation:owner'
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class Cluster:
+    __slots__ = ('key', 'latitude', 'longitude', 'size', 'pending', 'last_at', 'incident_id')
+
+    def __init__(self, key, latitude, longitude):
+        self.key = key
+        self.latitude = latitude
+        self.longitude = longitude
+        self.size = 0
+        self.pending = []
+        self.last_at = None
+        self.incident_id = None
+
+    def add(self, alarm_id, latitude, longitude, at):
+        # Running mean keeps the centroid without storing member positions
+        self.size += 1
+        self.latitude += (latitude - self.latitude) / self.size
+        self.longitude += (longitude - self.longitude) / self.size
+        self.last_at = at if self.last_at is None else max(self.last_at, at)
+        # Members are only kept until the cluster becomes an incident
+        if self.incident_id is None:
+            self.pending.append((alarm_id, at))
+
+
+class Correlator:
+    """
+    Streaming clusterer. add() takes alarms in arrival order and returns the
+    cluster each one joined, or None when its type is not correlated.
+    """
+
+    def __init__(self, window=None, radius_km=None, min_alarms=None, max_clusters=None, alarm_types=None):
+        self.window = window or settings.CORRELATION_WINDOW
+        self.radius_km = radius_km or settings.CORRELATION_RADIUS_KM
+        self.min_alarms = min_alarms or settings.CORRELATION_MIN_ALARMS
+        self.max_clusters = max_clusters or settings.CORRELATION_MAX_CLUSTERS
+        self.alarm_types = set(alarm_types or settings.CORRELATION_ALARM_TYPES)
+        self.lock = threading.Lock()
+        # All clusters, least recently updated first, for expiry and eviction
+        self.clusters = OrderedDict()
+        # (region_id, alarm_type) -> clusters, so matching only measures
+        # distances within the same bucket
+        self.buckets = {}
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def expire(self, now):
+        while self.clusters:
+            cluster = next(iter(self.clusters.values()))
+            if cluster.last_at >= now - self.window and len(self.clusters) <= self.max_clusters:
+                break
+            self.remove(cluster)
+
+    def remove(self, cluster):
+        del self.clusters[id(cluster)]
+        bucket = self.buckets[cluster.key]
+        bucket.remove(cluster)
+        if not bucket:
+            del self.buckets[cluster.key]
+
+    def add(self, alarm_id, region_id, alarm_type, latitude, longitude, at):
+        if alarm_type not in self.alarm_types:
+            return None
+
+        timestamp = at.timestamp()
+        with self.lock:
+            self.expire(timestamp)
+            key = (region_id, alarm_type)
+            bucket = self.buckets.setdefault(key, [])
+            best, best_distance = None, self.radius_km
+            for cluster in bucket:
+                distance = haversine_km(latitude, longitude, cluster.latitude, cluster.longitude)
+                if distance <= best_distance:
+                    best, best_distance = cluster, distance
+
+            if best is None:
+                best = Cluster(key, latitude, longitude)
+                bucket.append(best)
+            else:
+                self.clusters.move_to_end(id(best))
+            self.clusters[id(best)] = best
+            best.add(alarm_id, latitude, longitude, timestamp)
+            return best
+
+
+_correlator = None
+_sites = {}
+_sites_version = None
+
+
+def get_correlator():
+    global _correlator
+    if _correlator is None:
+        _correlator = Correlator()
+    return _correlator
+
+
+def claim_correlator():
+    """
+    Whether this process owns the clusters, claiming them when nobody has
+    correlated within CORRELATION_WINDOW. Only enforced with a shared cache.
+    """
+    owner = f'{socket.gethostname()}:{os.getpid()}'
+    claimed = cache.add(CORRELATOR_OWNER_KEY, owner, settings.CORRELATION_WINDOW)
+    if claimed or cache.get(CORRELATOR_OWNER_KEY) == owner:
+        cache.touch(CORRELATOR_OWNER_KEY, settings.CORRELATION_WINDOW)
+        return True
+    return False
+
+
+def site_positions(site_ids, version=None):
+    """
+    (region_id, latitude, longitude) per site, cached until the sites
+    version changes.
+    """
+    global _sites_version
+    if version != _sites_version:
+        _sites.clear()
+        _sites_version = version
+    missing = [site_id for site_id in site_ids if site_id not in _sites]
+    if missing:
+        for site_id, region_id, latitude, longitude in Site.objects.filter(id__in=missing).values_list(
+            'id', 'region_id', 'latitude', 'longitude'
+        ):
+            _sites[site_id] = (region_id, float(latitude), float(longitude))
+    return _sites
+
+
+def correlate_alarms(alarms, sites_version=None):
+    """
+    Feed newly created (alarm id, site id, alarm type) alarms to the
+    correlator and persist the result: clusters reaching the threshold
+    become incidents, later members are attached to their incident. Returns
+    the number of incidents opened.
+    """
+    correlator = get_correlator()
+    created = [
+        (alarm_id, site_id, alarm_type) for alarm_id, site_id, alarm_type in alarms
+        if alarm_type in correlator.alarm_types
+    ]
+    if not created:
+        return 0
+
+    times = dict(Alarm.objects.filter(id__in=[alarm_id for alarm_id, _, _ in created]).values_list('id', 'created_at'))
+    sites = site_positions({site_id for _, site_id, _ in created}, sites_version)
+
+    opened = {}
+    attached = {}
+    for alarm_id, site_id, alarm_type in created:
+        if alarm_id not in times or site_id not in sites:
+            continue
+        region_id, latitude, longitude = sites[site_id]
+        cluster = correlator.add(alarm_id, region_id, alarm_type, latitude, longitude, times[alarm_id])
+        if cluster.incident_id is not None:
+            attached.setdefault(cluster.incident_id, []).append(alarm_id)
+        elif cluster.size >= correlator.min_alarms:
+            opened[id(cluster)] = cluster
+
+    # Incidents can disappear under a cluster (deleted, or a rolled back
+    # write); their clusters start over
+    if attached:
+        existing = set(Incident.objects.filter(id__in=attached).values_list('id', flat=True))
+        for incident_id in set(attached) - existing:
+            del attached[incident_id]
+            for cluster in correlator.clusters.values():
+                if cluster.incident_id == incident_id:
+                    cluster.incident_id = None
+                    cluster.size = 0
+
+    incidents = {}
+    with transaction.atomic():
+        for key, cluster in opened.items():
+            region_id, alarm_type = cluster.key
+            alarm_ids = [alarm_id for alarm_id, _ in cluster.pending]
+            incident = Incident.objects.create(
+                region_id=region_id,
+                alarm_type=alarm_type,
+                title=f'Correlated {alarm_type} alarms',
+                latitude=Decimal(f'{cluster.latitude:.8f}'),
+                longitude=Decimal(f'{cluster.longitude:.8f}'),
+                alarm_count=len(alarm_ids),
+                first_alarm_at=datetime.fromtimestamp(min(at for _, at in cluster.pending), tz=timezone.utc),
+                last_alarm_at=datetime.fromtimestamp(max(at for _, at in cluster.pending), tz=timezone.utc),
+            )
+            Alarm.objects.filter(id__in=alarm_ids).update(incident=incident)
+            incidents[key] = incident.id
+
+        for incident_id, alarm_ids in attached.items():
+            last_at = max(times[alarm_id] for alarm_id in alarm_ids)
+            Alarm.objects.filter(id__in=alarm_ids).update(incident_id=incident_id)
+            Incident.objects.filter(id=incident_id).update(
+                alarm_count=F('alarm_count') + len(alarm_ids),
+                last_alarm_at=Greatest('last_alarm_at', Value(last_at)),
+            )
+
+    # Clusters only learn their incident once it has been written
+    for key, incident_id in incidents.items():
+        opened[key].incident_id = incident_id
+        opened[key].pending = []
+
+    return len(opened)
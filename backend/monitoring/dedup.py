@@ -0,0 +1,153 @@
+"""
+Alarm deduplication and flap suppression for BTS Monitoring System
+
+The engine keeps an in-process hash index of open alarms keyed by
+(site_id, alarm_type, title), so deciding whether an incoming alarm repeats
+an open one costs no query. Each key also carries a sliding window of
+raise/clear transitions: once a key changes state FLAP_THRESHOLD times within
+the window it is considered flapping, and a new raise reopens the alarm that
+was just cleared instead of creating another row. The key recovers when its
+transitions in the window drop to FLAP_RECOVERY or fewer.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from .models import Alarm
+
+OPEN_STATUSES = ('active', 'acknowledged')
+
+NEW = 'new'
+DUPLICATE = 'duplicate'
+REOPEN = 'reopen'
+
+
+def alarm_key(alarm):
+    return (alarm.site_id, alarm.alarm_type, alarm.title)
+
+
+class FlapState:
+    __slots__ = ('transitions', 'flapping', 'cleared_id', 'cleared_at')
+
+    def __init__(self):
+        self.transitions = deque()
+        self.flapping = False
+        self.cleared_id = None
+        self.cleared_at = None
+
+    def record(self, now, window, threshold, recovery):
+        self.transitions.append(now)
+        self.update(now, window, threshold, recovery)
+
+    def update(self, now, window, threshold, recovery):
+        while self.transitions and self.transitions[0] < now - window:
+            self.transitions.popleft()
+        if not self.flapping and len(self.transitions) >= threshold:
+            self.flapping = True
+        elif self.flapping and len(self.transitions) <= recovery:
+            self.flapping = False
+
+
+class DedupEngine:
+    def __init__(self, window=None, threshold=None, recovery=None, index_ttl=None, max_keys=None):
+        self.window = window or settings.ALARM_FLAP_WINDOW
+        self.threshold = threshold or settings.ALARM_FLAP_THRESHOLD
+        self.recovery = recovery if recovery is not None else settings.ALARM_FLAP_RECOVERY
+        self.index_ttl = index_ttl or settings.ALARM_DEDUP_INDEX_TTL
+        self.max_keys = max_keys or settings.ALARM_DEDUP_MAX_KEYS
+        self.lock = threading.RLock()
+        self.open_alarms = None
+        self.loaded_at = 0
+        self.flaps = OrderedDict()
+
+    def load(self):
+        """
+        (Re)build the open alarm index with a single query.
+        """
+        rows = Alarm.objects.filter(status__in=OPEN_STATUSES).values_list(
+            'id', 'site_id', 'alarm_type', 'title'
+        )
+        self.open_alarms = {(site_id, alarm_type, title): pk for pk, site_id, alarm_type, title in rows}
+        self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        # Periodic reloads pick up alarms opened by other processes
+        if self.open_alarms is None or time.monotonic() - self.loaded_at > self.index_ttl:
+            self.load()
+
+    def flap_state(self, key, create=False):
+        state = self.flaps.get(key)
+        if state is None and create:
+            state = self.flaps[key] = FlapState()
+            if len(self.flaps) > self.max_keys:
+                self.flaps.popitem(last=False)
+        if state is not None:
+            self.flaps.move_to_end(key)
+        return state
+
+    def classify(self, key, now):
+        """
+        Decide how a raised alarm is stored: (NEW, None), (DUPLICATE, id) of
+        the open alarm it repeats, or (REOPEN, id) of the alarm to reopen.
+        """
+        with self.lock:
+            self.ensure_loaded()
+            alarm_id = self.open_alarms.get(key)
+            if alarm_id is not None:
+                return DUPLICATE, alarm_id
+
+            state = self.flap_state(key, create=True)
+            state.record(now, self.window, self.threshold, self.recovery)
+            if state.flapping and state.cleared_id and now - state.cleared_at <= self.window:
+                return REOPEN, state.cleared_id
+            return NEW, None
+
+    def opened(self, key, alarm_id):
+        with self.lock:
+            if self.open_alarms is not None:
+                self.open_alarms[key] = alarm_id
+
+    def cleared(self, key, alarm_id, now):
+        with self.lock:
+            if self.open_alarms is not None and self.open_alarms.get(key) == alarm_id:
+                del self.open_alarms[key]
+            state = self.flap_state(key, create=True)
+            state.record(now, self.window, self.threshold, self.recovery)
+            state.cleared_id = alarm_id
+            state.cleared_at = now
+
+    def is_flapping(self, key, now):
+        with self.lock:
+            state = self.flap_state(key)
+            if state is None:
+                return False
+            state.update(now, self.window, self.threshold, self.recovery)
+            return state.flapping
+
+    def apply_changes(self, changes, now):
+        """
+        Keep the index in step with (old, new) AlarmState pairs.
+        """
+        for old, new in changes:
+            was_open = old is not None and old.status in OPEN_STATUSES
+            is_open = new is not None and new.status in OPEN_STATUSES
+            if was_open and not is_open:
+                self.cleared(alarm_key(old), old.id, now)
+            elif is_open:
+                if was_open and alarm_key(old) != alarm_key(new):
+                    self.cleared(alarm_key(old), old.id, now)
+                self.opened(alarm_key(new), new.id)
+
+
+_engine = None
+
+
+def get_engine():
+    # Created on first use so settings are read after Django is configured
+    global _engine
+    if _engine is None:
+        _engine = DedupEngine()
+    return _engine
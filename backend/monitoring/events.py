@@ -0,0 +1,105 @@
+"""
+Realtime alarm events for BTS Monitoring System
+
+Every alarm_states_changed batch is turned into one channel layer message
+carrying the alarm events and the matching dashboard stats delta. The
+AlarmStreamConsumer filters and coalesces these per websocket connection.
+"""
+
+import logging
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from .models import Site, Alarm
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+
+def event_kind(old, new):
+    if old is None:
+        return 'created'
+    if new is None:
+        return 'deleted'
+    if new.status != old.status and new.status in ('acknowledged', 'resolved', 'closed'):
+        return new.status
+    return 'updated'
+
+
+def stats_delta(changes):
+    """
+    Active alarm counter changes implied by a batch of (old, new) states.
+    """
+    by_type = Counter()
+    by_severity = Counter()
+    for old, new in changes:
+        for state, delta in ((old, -1), (new, 1)):
+            if state is not None and state.status == 'active':
+                by_type[state.alarm_type] += delta
+                by_severity[state.severity] += delta
+
+    by_type = {key: value for key, value in by_type.items() if value}
+    by_severity = {key: value for key, value in by_severity.items() if value}
+    return {
+        'total_alarms': sum(by_type.values()),
+        'critical_alarms': by_severity.get('critical', 0),
+        'alarms_by_type': by_type,
+        'alarms_by_severity': by_severity,
+    }
+
+
+def build_events(changes):
+    states = [new or old for old, new in changes]
+    alarms = {
+        row['id']: row
+        for row in Alarm.objects.filter(
+            id__in=[new.id for _, new in changes if new is not None]
+        ).values('id', 'title', 'created_at')
+    }
+    # Site codes come from Site so deleted alarms can still be filtered
+    sites = {
+        row['id']: row
+        for row in Site.objects.filter(
+            id__in={state.site_id for state in states}
+        ).values('id', 'code', 'region__code')
+    }
+
+    events = []
+    for (old, new), state in zip(changes, states):
+        alarm = alarms.get(state.id, {})
+        site = sites.get(state.site_id, {})
+        created_at = alarm.get('created_at')
+        events.append({
+            'event': event_kind(old, new),
+            'alarm': {
+                'id': state.id,
+                'site': state.site_id,
+                'site_code': site.get('code'),
+                'region_code': site.get('region__code'),
+                'alarm_type': state.alarm_type,
+                'severity': state.severity,
+                'status': state.status,
+                'title': alarm.get('title'),
+                'created_at': created_at.isoformat() if created_at else None,
+            }
+        })
+    return events
+
+
+def publish_alarm_changes(changes):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    message = {
+        'type': 'alarm.events',
+        'events': build_events(changes),
+        'stats': stats_delta(changes),
+    }
+    try:
+        async_to_sync(channel_layer.group_send)(settings.ALARM_STREAM_GROUP, message)
+    except Exception:
+        # Realtime push is best effort; never fail the write that caused it
+        logger.exception('Failed to publish %d alarm events', len(message['events']))
@@ -0,0 +1,115 @@
+"""
+Streaming exports for BTS Monitoring System
+
+Rows are read with values_list(...).iterator(), which uses a server-side
+cursor where the database supports it, and written one line at a time into
+a StreamingHttpResponse, so memory stays flat however many rows match.
+"""
+
+import csv
+import json
+from itertools import chain
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# (header, lookup) pairs; related lookups become joins in the same query
+ALARM_COLUMNS = [
+    ('id', 'id'),
+    ('site', 'site__code'),
+    ('site_name', 'site__name'),
+    ('region', 'site__region__code'),
+    ('alarm_type', 'alarm_type'),
+    ('severity', 'severity'),
+    ('status', 'status'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('occurrence_count', 'occurrence_count'),
+    ('is_flapping', 'is_flapping'),
+    ('incident', 'incident_id'),
+    ('acknowledged_by', 'acknowledged_by__username'),
+    ('acknowledged_at', 'acknowledged_at'),
+    ('resolved_at', 'resolved_at'),
+    ('last_seen', 'last_seen'),
+    ('created_at', 'created_at'),
+]
+
+HISTORY_COLUMNS = [
+    ('id', 'id'),
+    ('alarm', 'alarm_id'),
+    ('alarm_title', 'alarm__title'),
+    ('user', 'user__username'),
+    ('action', 'action'),
+    ('comment', 'comment'),
+    ('created_at', 'created_at'),
+]
+
+TICKET_COLUMNS = [
+    ('id', 'id'),
+    ('title', 'title'),
+    ('description', 'description'),
+    ('status', 'status'),
+    ('priority', 'priority'),
+    ('site', 'site__code'),
+    ('alarm', 'alarm_id'),
+    ('team', 'team__name'),
+    ('assigned_to', 'assigned_to__username'),
+    ('created_by', 'created_by__username'),
+    ('resolved_at', 'resolved_at'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+class Echo:
+    # csv.writer target that hands back each line instead of storing it
+    def write(self, value):
+        return value
+
+
+def plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([plain(value) for value in row])
+
+
+def ndjson_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, map(plain, row)))) + '\n'
+
+
+def stream_export(queryset, columns, export_format, name, archive=None):
+    """
+    Stream queryset rows as CSV or NDJSON, followed by the archive
+    queryset's when given. columns are (header, lookup) pairs; lookups may
+    follow relations, which become joins.
+    """
+    headers = [header for header, _ in columns]
+    lookups = [lookup for _, lookup in columns]
+    querysets = [queryset] if archive is None else [queryset, archive]
+    rows = chain.from_iterable(
+        part.values_list(*lookups).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE) for part in querysets
+    )
+    lines = csv_lines(headers, rows) if export_format == 'csv' else ndjson_lines(headers, rows)
+
+    response = StreamingHttpResponse(lines, content_type=FORMATS[export_format])
+    filename = f'{name}-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,186 @@
+"""
+Geospatial site index for BTS Monitoring System
+
+SiteIndex keeps every site's position in numpy arrays so map clustering is
+a vectorized scan taking milliseconds even for tens of thousands of sites;
+at that size a brute-force scan beats building and maintaining a tree. The
+site list filters by box and radius in SQL instead, with bbox_filter() and
+distance_km(), so it pages and sorts like any other queryset. The index reloads whenever site or region
+saves bump SITES_VERSION_KEY, and at least every GEO_RELOAD_INTERVAL seconds
+for changes made by processes that do not share the cache.
+
+Boxes are (min_lon, min_lat, max_lon, max_lat), as in GeoJSON; a box whose
+min_lon exceeds max_lon crosses the antimeridian.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Sin, Sqrt
+
+from .correlation import EARTH_RADIUS_KM
+from .models import Site
+from .signals import SITES_VERSION_KEY
+
+KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180.0
+
+
+def parse_bbox(value):
+    """
+    "min_lon,min_lat,max_lon,max_lat" -> tuple of floats; ValueError if invalid.
+    """
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('Expected min_lon,min_lat,max_lon,max_lat')
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError('Coordinates out of range')
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_point(value):
+    """
+    "lat,lon" -> (lat, lon); ValueError if invalid.
+    """
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 2 or not (-90 <= parts[0] <= 90 and -180 <= parts[1] <= 180):
+        raise ValueError('Expected lat,lon')
+    return parts[0], parts[1]
+
+
+def bbox_filter(bbox):
+    """
+    Q of the sites inside a box.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    q = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon <= max_lon:
+        return q & Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    return q & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon))
+
+
+def distance_km(latitude, longitude):
+    """
+    Expression of a site's great-circle distance in km from a point, the
+    haversine formula of correlation.haversine_km in SQL.
+    """
+    lat1, lon1 = float(np.radians(latitude)), float(np.radians(longitude))
+    lat2 = Radians(Cast('latitude', FloatField()))
+    lon2 = Radians(Cast('longitude', FloatField()))
+    a = (
+        Power(Sin((lat2 - Value(lat1)) / 2), 2)
+        + Value(float(np.cos(lat1))) * Cos(lat2) * Power(Sin((lon2 - Value(lon1)) / 2), 2)
+    )
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def near_filter(latitude, radius_km):
+    """
+    Q of the latitude band that can hold sites within radius_km, which
+    rules out most sites before any distance is computed.
+    """
+    band = radius_km / KM_PER_DEGREE
+    return Q(latitude__gte=latitude - band, latitude__lte=latitude + band)
+
+
+class SiteIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.ids = None
+        self.loaded_at = None
+
+    def load(self, version):
+        rows = list(Site.objects.values_list('id', 'code', 'latitude', 'longitude', 'region__code'))
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.codes = np.array([row[1] for row in rows], dtype=object)
+        self.latitudes = np.array([float(row[2]) for row in rows], dtype=np.float64)
+        self.longitudes = np.array([float(row[3]) for row in rows], dtype=np.float64)
+        regions = sorted({row[4] for row in rows})
+        self.region_numbers = {code: number for number, code in enumerate(regions)}
+        self.regions = np.array([self.region_numbers[row[4]] for row in rows], dtype=np.int32)
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def refresh(self):
+        # Callers hold the lock, so queries never see a half-loaded index
+        version = cache.get(SITES_VERSION_KEY)
+        if (
+            self.ids is None or version != self.version
+            or time.monotonic() - self.loaded_at > settings.GEO_RELOAD_INTERVAL
+        ):
+            self.load(version)
+
+    def mask(self, bbox=None, region=None):
+        mask = np.ones(len(self.ids), dtype=bool)
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            mask &= (self.latitudes >= min_lat) & (self.latitudes <= max_lat)
+            if min_lon <= max_lon:
+                mask &= (self.longitudes >= min_lon) & (self.longitudes <= max_lon)
+            else:
+                mask &= (self.longitudes >= min_lon) | (self.longitudes <= max_lon)
+        if region is not None:
+            mask &= self.regions == self.region_numbers.get(region, -1)
+        return mask
+
+    def clusters(self, zoom, bbox=None, region=None, alarm_counts=None):
+        """
+        Group the sites in view into grid cells sized for a map zoom level,
+        GEO_CLUSTER_CELLS cells across a 256px tile. alarm_counts maps
+        site id -> active alarms.
+        """
+        with self.lock:
+            self.refresh()
+            positions = np.flatnonzero(self.mask(bbox, region))
+            ids = self.ids[positions]
+            codes = self.codes[positions]
+            latitudes = self.latitudes[positions]
+            longitudes = self.longitudes[positions]
+        cell = 360.0 / (2 ** zoom) / settings.GEO_CLUSTER_CELLS
+
+        rows = np.floor((latitudes + 90.0) / cell).astype(np.int64)
+        columns = np.floor((longitudes + 180.0) / cell).astype(np.int64)
+        keys = rows * (int(360.0 / cell) + 2) + columns
+        _, groups, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+
+        alarm_counts = alarm_counts or {}
+        alarms = np.fromiter(
+            (alarm_counts.get(site_id, 0) for site_id in ids.tolist()),
+            dtype=np.int64, count=len(positions)
+        )
+        centre_latitudes = np.bincount(groups, weights=latitudes, minlength=len(sizes)) / np.maximum(sizes, 1)
+        centre_longitudes = np.bincount(groups, weights=longitudes, minlength=len(sizes)) / np.maximum(sizes, 1)
+        group_alarms = np.bincount(groups, weights=alarms, minlength=len(sizes))
+        # Any member stands in for single-site clusters
+        members = np.zeros(len(sizes), dtype=np.int64)
+        members[groups] = np.arange(len(positions))
+
+        result = []
+        for group, size in enumerate(sizes.tolist()):
+            cluster = {
+                'latitude': round(float(centre_latitudes[group]), 6),
+                'longitude': round(float(centre_longitudes[group]), 6),
+                'count': size,
+                'alarm_count': int(group_alarms[group]),
+            }
+            if size == 1:
+                member = members[group]
+                cluster['site'] = int(ids[member])
+                cluster['code'] = codes[member]
+            result.append(cluster)
+        return cell, result
+
+
+_index = None
+
+
+def get_site_index():
+    global _index
+    if _index is None:
+        _index = SiteIndex()
+    return _index
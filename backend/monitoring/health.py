@@ -0,0 +1,183 @@
+"""
+Site health for BTS Monitoring System
+
+SiteHealth holds each site's worst active severity and active alarm counts
+by type and severity, so readers get one row per site instead of
+aggregating alarms. send_alarm_changes() calls apply_alarm_changes() inside
+the transaction that changed the alarms: each change's old -> new delta is
+added to the affected rows with F() updates, so they commit (or roll back)
+together with the alarms and concurrent writers cannot lose counts. Only a
+site's first row is counted from its alarms; the reconcile_site_health task
+recomputes every site with rebuild_site_health() to correct any drift.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import Region, Site, Alarm, SiteHealth
+
+# Most severe first
+SEVERITIES = [choice for choice, _ in Alarm.SEVERITY_LEVELS]
+
+TYPE_FIELDS = {alarm_type: f'{alarm_type}_count' for alarm_type, _ in Alarm.ALARM_TYPES}
+SEVERITY_FIELDS = {severity: f'{severity}_count' for severity in SEVERITIES}
+COUNT_FIELDS = ['active_count', *TYPE_FIELDS.values(), *SEVERITY_FIELDS.values()]
+
+
+def counted(state):
+    # What a change must touch to matter to health
+    if state is None or state.status != 'active':
+        return None
+    return state.site_id, state.alarm_type, state.severity
+
+
+def worst_severity():
+    # The row's worst severity from its own count columns
+    return Case(
+        *[When(**{f'{SEVERITY_FIELDS[severity]}__gt': 0}, then=Value(severity)) for severity in SEVERITIES],
+        default=None, output_field=CharField()
+    )
+
+
+def alarm_deltas(changes):
+    """
+    {site_id: Counter(count field -> delta)} of (old, new) AlarmState pairs.
+    """
+    deltas = {}
+    for old, new in changes:
+        old, new = counted(old), counted(new)
+        if old == new:
+            continue
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None:
+                continue
+            site_id, alarm_type, severity = state
+            delta = deltas.setdefault(site_id, Counter())
+            delta['active_count'] += sign
+            delta[TYPE_FIELDS[alarm_type]] += sign
+            delta[SEVERITY_FIELDS[severity]] += sign
+    return deltas
+
+
+def apply_alarm_changes(changes, now=None):
+    """
+    Add the deltas of (old, new) AlarmState pairs to the health rows.
+    """
+    deltas = alarm_deltas(changes)
+    if not deltas:
+        return
+    now = now or timezone.now()
+    with transaction.atomic():
+        # Locked in site order so concurrent writers cannot deadlock
+        existing = list(SiteHealth.objects.select_for_update().filter(
+            site_id__in=deltas
+        ).order_by('site_id').values_list('site_id', flat=True))
+
+        # A new row is counted from the alarms, which include these changes
+        missing = set(deltas).difference(existing)
+        if missing:
+            refresh_site_health(missing, now)
+
+        # Sites with the same delta share one UPDATE
+        groups = {}
+        for site_id in existing:
+            delta = tuple(sorted((field, count) for field, count in deltas[site_id].items() if count))
+            if delta:
+                groups.setdefault(delta, []).append(site_id)
+        for delta, site_ids in groups.items():
+            SiteHealth.objects.filter(site_id__in=site_ids).update(
+                **{field: F(field) + count for field, count in delta}
+            )
+        # A separate statement, so it reads the new counts on every backend
+        updated = [site_id for site_ids in groups.values() for site_id in site_ids]
+        if updated:
+            SiteHealth.objects.filter(site_id__in=updated).update(worst_severity=worst_severity(), changed_at=now)
+
+
+def refresh_site_health(site_ids, now=None):
+    """
+    Recompute the health rows of the given sites from their active alarms.
+    Returns the number of rows that changed.
+    """
+    site_ids = sorted(set(site_ids))
+    now = now or timezone.now()
+    with transaction.atomic():
+        SiteHealth.objects.bulk_create(
+            [SiteHealth(site_id=site_id) for site_id in site_ids], ignore_conflicts=True
+        )
+        # Locked in site order so concurrent refreshes cannot deadlock
+        rows = list(SiteHealth.objects.select_for_update().filter(site_id__in=site_ids).order_by('site_id'))
+
+        counts = {site_id: Counter() for site_id in site_ids}
+        for row in Alarm.objects.filter(site_id__in=site_ids, status='active').values(
+            'site_id', 'alarm_type', 'severity'
+        ).annotate(count=Count('id')).order_by():
+            site_counts = counts[row['site_id']]
+            site_counts['active_count'] += row['count']
+            site_counts[TYPE_FIELDS[row['alarm_type']]] += row['count']
+            site_counts[SEVERITY_FIELDS[row['severity']]] += row['count']
+
+        changed = []
+        for health in rows:
+            site_counts = counts[health.site_id]
+            worst = next((severity for severity in SEVERITIES if site_counts[SEVERITY_FIELDS[severity]]), None)
+            values = {field: site_counts[field] for field in COUNT_FIELDS}
+            if health.worst_severity == worst and all(
+                getattr(health, field) == count for field, count in values.items()
+            ):
+                continue
+            for field, count in values.items():
+                setattr(health, field, count)
+            health.worst_severity = worst
+            health.changed_at = now
+            changed.append(health)
+        SiteHealth.objects.bulk_update(changed, [*COUNT_FIELDS, 'worst_severity', 'changed_at'])
+    return len(changed)
+
+
+def rebuild_site_health(batch_size=1000):
+    """
+    Reconcile every site's health row with its alarms. Returns the number
+    of rows that had drifted.
+    """
+    site_ids = list(Site.objects.order_by('id').values_list('id', flat=True))
+    changed = 0
+    for start in range(0, len(site_ids), batch_size):
+        changed += refresh_site_health(site_ids[start:start + batch_size])
+    return changed
+
+
+def region_health():
+    """
+    Per-region rollup of the site health rows, in one query: sites, sites
+    with active alarms, active alarms, sites per worst severity and the
+    region's worst severity.
+    """
+    by_severity = {
+        f'{severity}_sites': Count('site__health', filter=Q(site__health__worst_severity=severity))
+        for severity in SEVERITIES
+    }
+    rows = Region.objects.annotate(
+        sites=Count('site'),
+        alarmed_sites=Count('site__health', filter=Q(site__health__active_count__gt=0)),
+        active_alarms=Sum('site__health__active_count'),
+        **by_severity,
+    ).order_by('code')
+
+    return [
+        {
+            'region': region.code,
+            'name': region.name,
+            'sites': region.sites,
+            'alarmed_sites': region.alarmed_sites,
+            'active_alarms': region.active_alarms or 0,
+            'worst_severity': next(
+                (severity for severity in SEVERITIES if getattr(region, f'{severity}_sites')), None
+            ),
+            'sites_by_severity': {severity: getattr(region, f'{severity}_sites') for severity in SEVERITIES},
+        }
+        for region in rows
+    ]
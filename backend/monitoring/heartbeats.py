@@ -0,0 +1,235 @@
+"""
+Site heartbeats for BTS Monitoring System
+
+Pings only touch an in-memory buffer holding the latest ping per site; the
+buffer is written to Site.last_ping with bulk_update at most every
+HEARTBEAT_FLUSH_INTERVAL seconds: by the next ping once the interval has
+passed, or by a timer thread if no ping comes, and at process exit.
+detect_stale_sites() then compares every site's last ping against
+HEARTBEAT_STALE_AFTER in one vectorized pass and raises or clears the
+sites' 'ip' alarms in bulk.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import stats
+from .dedup import OPEN_STATUSES
+from .ingestion import clear_alarms, store_alarms
+from .models import Site, Alarm
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+HEARTBEAT_ALARM_TITLE = 'Heartbeat lost'
+
+
+class SiteDirectory:
+    """
+    Resolves site codes and IP addresses to site ids, reloading at most
+    every HEARTBEAT_DIRECTORY_TTL seconds when an unknown name shows up.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or settings.HEARTBEAT_DIRECTORY_TTL
+        self.lock = threading.Lock()
+        self.ids = {}
+        self.loaded_at = None
+
+    def load(self):
+        ids = {}
+        for site_id, code, ip_address in Site.objects.values_list('id', 'code', 'ip_address'):
+            ids[code] = site_id
+            ids[ip_address] = site_id
+        self.ids = ids
+        self.loaded_at = time.monotonic()
+
+    def resolve(self, names):
+        """
+        {name: site_id} for the known names among `names`.
+        """
+        with self.lock:
+            missing = any(name not in self.ids for name in names)
+            if self.loaded_at is None or (missing and time.monotonic() - self.loaded_at > self.ttl):
+                self.load()
+            return {name: self.ids[name] for name in names if name in self.ids}
+
+
+class HeartbeatBuffer:
+    def __init__(self, flush_interval=None):
+        self.flush_interval = flush_interval or settings.HEARTBEAT_FLUSH_INTERVAL
+        self.lock = threading.Lock()
+        self.pings = {}
+        self.flushed_at = time.monotonic()
+        self.timer = None
+        self.directory = SiteDirectory()
+
+    def __len__(self):
+        return len(self.pings)
+
+    def record(self, pings):
+        """
+        Buffer (site code or IP address, datetime) pings and flush when the
+        interval has passed. Returns the names that match no site.
+        """
+        ids = self.directory.resolve({name for name, _ in pings})
+        unknown = []
+        with self.lock:
+            for name, at in pings:
+                site_id = ids.get(name)
+                if site_id is None:
+                    unknown.append(name)
+                elif site_id not in self.pings or self.pings[site_id] < at:
+                    self.pings[site_id] = at
+            due = time.monotonic() - self.flushed_at >= self.flush_interval
+            # Without a later ping, the timer writes these out
+            if self.pings and not due and self.timer is None:
+                self.timer = threading.Timer(self.flush_interval, self.flush_pending)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if due:
+            self.flush()
+        return unknown
+
+    def flush_pending(self):
+        # Runs on the timer thread, which has its own database connection
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Failed to flush %d buffered heartbeats', len(self))
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            pings, self.pings = self.pings, {}
+            self.flushed_at = time.monotonic()
+            timer, self.timer = self.timer, None
+        if timer is not None:
+            timer.cancel()
+        if not pings:
+            return 0
+
+        # bulk_update skips post_save, which would recompute site stats for
+        # every single ping
+        Site.objects.bulk_update(
+            [Site(id=site_id, last_ping=at) for site_id, at in pings.items()],
+            ['last_ping'], batch_size=settings.HEARTBEAT_FLUSH_BATCH_SIZE
+        )
+        return len(pings)
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = HeartbeatBuffer()
+        atexit.register(_buffer.flush_pending)
+    return _buffer
+
+
+def parse_ping_time(value, now):
+    """
+    A ping's time from a unix timestamp or ISO 8601 string; missing or
+    future times count as now.
+    """
+    if value in (None, ''):
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        at = datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    elif isinstance(value, str):
+        try:
+            return parse_ping_time(float(value), now)
+        except ValueError:
+            pass
+        at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at, dt_timezone.utc)
+    else:
+        raise ValueError(f'Invalid ping time "{value}"')
+    return min(at, now)
+
+
+def detect_stale_sites(now=None, probed_at=None):
+    """
+    Raise an 'ip' alarm for every site whose last ping is older than
+    HEARTBEAT_STALE_AFTER and clear it for sites that ping again. Sites
+    that never pinged are not monitored, unless probed_at is given: a probe
+    sweep that started then reached every site, so those that existed by
+    then and still never pinged are down. Sites under maintenance are
+    skipped. Active sites that go silent are set inactive and flagged as
+    heartbeat_down; only flagged sites are set active again, as soon as
+    they ping, whatever became of their alarm. Returns (raised, cleared).
+    """
+    now = now or timezone.now()
+    monitored = Q(last_ping__isnull=False)
+    if probed_at is not None:
+        monitored |= Q(created_at__lt=probed_at)
+    rows = list(Site.objects.exclude(status='maintenance').filter(monitored).values_list(
+        'id', 'last_ping', 'status', 'heartbeat_down'
+    ))
+    if not rows:
+        return 0, 0
+
+    site_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    # Never pinged counts as silent forever
+    last_ping = np.fromiter(
+        (row[1].timestamp() if row[1] is not None else -np.inf for row in rows), dtype=np.float64, count=len(rows)
+    )
+    stale = now.timestamp() - last_ping > settings.HEARTBEAT_STALE_AFTER
+
+    alarmed = dict(Alarm.objects.filter(
+        site_id__in=site_ids.tolist(), alarm_type='ip', title=HEARTBEAT_ALARM_TITLE,
+        status__in=OPEN_STATUSES
+    ).values_list('site_id', 'id'))
+    has_alarm = np.isin(site_ids, np.fromiter(alarmed, dtype=np.int64, count=len(alarmed)))
+
+    # Sites the detector set inactive and sites still active otherwise; an
+    # 'inactive' set by an administrator is neither
+    held_down = np.fromiter((row[3] for row in rows), dtype=bool, count=len(rows))
+    active = np.fromiter((row[2] == 'active' for row in rows), dtype=bool, count=len(rows))
+
+    raise_ids = site_ids[stale & ~has_alarm].tolist()
+    clear_ids = site_ids[~stale & has_alarm].tolist()
+    down_ids = site_ids[stale & active].tolist()
+    back_ids = site_ids[~stale & held_down].tolist()
+
+    with transaction.atomic():
+        store_alarms([
+            Alarm(
+                site_id=site_id,
+                alarm_type='ip',
+                severity=settings.HEARTBEAT_ALARM_SEVERITY,
+                title=HEARTBEAT_ALARM_TITLE,
+                description=f'No heartbeat for more than {settings.HEARTBEAT_STALE_AFTER} seconds.',
+            )
+            for site_id in raise_ids
+        ])
+
+        cleared = clear_alarms([alarmed[site_id] for site_id in clear_ids], now)
+
+        # The status filters skip sites an administrator changed since the
+        # rows were read
+        went_down = Site.objects.filter(id__in=down_ids, status='active').update(
+            status='inactive', heartbeat_down=True, updated_at=now
+        )
+        came_back = Site.objects.filter(id__in=back_ids, status='inactive').update(
+            status='active', heartbeat_down=False, updated_at=now
+        )
+        # A flagged site whose status was changed by hand is no longer held
+        Site.objects.filter(id__in=back_ids, heartbeat_down=True).update(heartbeat_down=False)
+        if went_down or came_back:
+            transaction.on_commit(stats.invalidate_snapshot)
+
+    return len(raise_ids), cleared
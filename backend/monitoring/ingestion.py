@@ -0,0 +1,242 @@
+"""
+Bulk alarm ingestion for BTS Monitoring System
+
+Alarms are validated as plain dicts, their site codes are resolved with a
+single query and they are written in one transaction: repeats are folded
+into open alarms by the dedup engine and the rest go through bulk_create.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .dedup import NEW, REOPEN, OPEN_STATUSES, alarm_key, get_engine
+from .models import Site, Alarm
+from .signals import alarm_state, send_alarm_changes
+from .transitions import transition_alarms
+
+ALARM_TYPES = {choice for choice, _ in Alarm.ALARM_TYPES}
+SEVERITY_LEVELS = {choice for choice, _ in Alarm.SEVERITY_LEVELS}
+TITLE_MAX_LENGTH = Alarm._meta.get_field('title').max_length
+
+
+def validate_alarm_item(item):
+    """
+    Return a dict of field errors for one incoming alarm (empty when valid).
+    """
+    if not isinstance(item, dict):
+        return {'non_field_errors': ['Expected an object.']}
+
+    errors = {}
+    site_code = item.get('site')
+    if not isinstance(site_code, str) or not site_code:
+        errors['site'] = ['Site code is required.']
+
+    if item.get('alarm_type') not in ALARM_TYPES:
+        errors['alarm_type'] = [f'"{item.get("alarm_type")}" is not a valid choice.']
+
+    if item.get('severity') not in SEVERITY_LEVELS:
+        errors['severity'] = [f'"{item.get("severity")}" is not a valid choice.']
+
+    title = item.get('title')
+    if not isinstance(title, str) or not title.strip():
+        errors['title'] = ['This field is required.']
+    elif len(title) > TITLE_MAX_LENGTH:
+        errors['title'] = [f'Ensure this field has no more than {TITLE_MAX_LENGTH} characters.']
+
+    if not isinstance(item.get('description'), str):
+        errors['description'] = ['This field is required.']
+
+    return errors
+
+
+def ingest_alarms(items):
+    """
+    Validate and create alarms in bulk.
+
+    Returns one result per input item, in input order:
+    {'index': i, 'status': 'created' | 'duplicate' | 'reopened', 'id': ...}
+    or {'index': i, 'status': 'error', 'errors': {...}}.
+    """
+    results = [None] * len(items)
+    valid = []
+
+    for index, item in enumerate(items):
+        errors = validate_alarm_item(item)
+        if errors:
+            results[index] = {'index': index, 'status': 'error', 'errors': errors}
+        else:
+            valid.append((index, item))
+
+    # Resolve all site codes in a single query
+    codes = {item['site'] for _, item in valid}
+    site_ids = dict(Site.objects.filter(code__in=codes).values_list('code', 'id'))
+
+    pending = []
+    for index, item in valid:
+        site_id = site_ids.get(item['site'])
+        if site_id is None:
+            results[index] = {
+                'index': index,
+                'status': 'error',
+                'errors': {'site': [f'Unknown site code "{item["site"]}".']}
+            }
+            continue
+        pending.append((index, Alarm(
+            site_id=site_id,
+            alarm_type=item['alarm_type'],
+            severity=item['severity'],
+            title=item['title'],
+            description=item['description'],
+        )))
+
+    outcomes = store_alarms([alarm for _, alarm in pending])
+    for (index, _), (outcome, alarm_id) in zip(pending, outcomes):
+        results[index] = {'index': index, 'status': outcome, 'id': alarm_id}
+
+    return results
+
+
+def store_alarms(alarms):
+    """
+    Write unsaved Alarm objects through the dedup engine.
+
+    Repeats of an open alarm (or of an earlier item in the same batch) only
+    bump its occurrence_count and last_seen; a raise on a flapping key
+    reopens the alarm that was just cleared. Returns one (outcome, alarm_id)
+    per alarm, outcome being 'created', 'duplicate' or 'reopened'.
+    """
+    if not alarms:
+        return []
+
+    engine = get_engine()
+    now = timezone.now()
+    clock = now.timestamp()
+
+    # Decide every alarm in memory first. A target is either an Alarm to
+    # create or the id of an existing alarm to fold into or reopen.
+    targets = []
+    batch = {}
+    reopen_ids = set()
+    repeats = Counter()
+    for alarm in alarms:
+        key = alarm_key(alarm)
+        alarm.last_seen = now
+        if key in batch:
+            target = batch[key]
+        else:
+            outcome, target = engine.classify(key, clock)
+            if outcome == NEW:
+                target = alarm
+            elif outcome == REOPEN:
+                reopen_ids.add(target)
+            batch[key] = target
+
+        if isinstance(target, Alarm):
+            if target is not alarm:
+                target.occurrence_count += 1
+        else:
+            repeats[target] += 1
+        targets.append(target)
+
+    with transaction.atomic():
+        changes, stale_ids = reopen_alarms(reopen_ids, repeats, now)
+        for _, new in changes:
+            engine.opened(alarm_key(new), new.id)
+        stale_ids |= fold_repeats(set(repeats) - reopen_ids, repeats, now)
+
+        # Alarms closed or deleted behind the index's back are created afresh
+        replacements = {}
+        for index, (alarm, target) in enumerate(zip(alarms, targets)):
+            if not isinstance(target, Alarm) and target in stale_ids:
+                if target not in replacements:
+                    alarm.occurrence_count = repeats[target]
+                    replacements[target] = alarm
+                targets[index] = replacements[target]
+
+        new_alarms = list({id(target): target for target in targets if isinstance(target, Alarm)}.values())
+        Alarm.objects.bulk_create(new_alarms, batch_size=settings.ALARM_BULK_BATCH_SIZE)
+        for alarm in new_alarms:
+            engine.opened(alarm_key(alarm), alarm.id)
+        changes += [(None, alarm_state(alarm)) for alarm in new_alarms]
+
+        # bulk_create and update() skip post_save, so announce the changes here
+        send_alarm_changes(changes)
+
+    results = []
+    reopened = set()
+    for alarm, target in zip(alarms, targets):
+        if isinstance(target, Alarm):
+            results.append(('created' if target is alarm else 'duplicate', target.id))
+        elif target in reopen_ids and target not in reopened:
+            reopened.add(target)
+            results.append(('reopened', target))
+        else:
+            results.append(('duplicate', target))
+    return results
+
+
+def fold_repeats(alarm_ids, repeats, now):
+    """
+    Add repeats to open alarms, one UPDATE per distinct repeat count.
+    Returns the ids that were no longer open.
+    """
+    by_count = {}
+    for alarm_id in alarm_ids:
+        by_count.setdefault(repeats[alarm_id], []).append(alarm_id)
+
+    updated = 0
+    for count, ids in by_count.items():
+        updated += Alarm.objects.filter(id__in=ids, status__in=OPEN_STATUSES).update(
+            occurrence_count=F('occurrence_count') + count,
+            last_seen=now,
+            updated_at=now
+        )
+    if updated == len(alarm_ids):
+        return set()
+
+    open_ids = set(Alarm.objects.filter(
+        id__in=alarm_ids, status__in=OPEN_STATUSES
+    ).values_list('id', flat=True))
+    return set(alarm_ids) - open_ids
+
+
+def reopen_alarms(alarm_ids, repeats, now):
+    """
+    Reactivate cleared alarms of flapping keys. Returns the state changes
+    and the ids that could not be reopened.
+    """
+    if not alarm_ids:
+        return [], set()
+
+    alarms = list(Alarm.objects.select_for_update().filter(
+        id__in=alarm_ids, status__in=('resolved', 'closed')
+    ))
+    changes = []
+    for alarm in alarms:
+        old = alarm_state(alarm)
+        alarm.status = 'active'
+        alarm.is_flapping = True
+        alarm.acknowledged_by = None
+        alarm.acknowledged_at = None
+        alarm.resolved_at = None
+        alarm.last_seen = now
+        alarm.updated_at = now
+        alarm.occurrence_count += repeats[alarm.id]
+        changes.append((old, alarm_state(alarm)))
+
+    Alarm.objects.bulk_update(alarms, [
+        'status', 'is_flapping', 'acknowledged_by', 'acknowledged_at',
+        'resolved_at', 'last_seen', 'updated_at', 'occurrence_count'
+    ])
+    return changes, set(alarm_ids) - {alarm.id for alarm in alarms}
+
+
+def clear_alarms(alarm_ids, now):
+    """
+    Resolve open alarms in bulk. Returns the number resolved.
+    """
+    return len(transition_alarms(Alarm.objects.filter(id__in=alarm_ids), 'resolve', now))
@@ -0,0 +1,23 @@
+"""
+Move alarms cleared more than ALARM_ARCHIVE_AFTER days ago to the archive.
+
+    python manage.py archive_alarms [--batch-size 1000]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.archive import archive_alarms
+
+
+class Command(BaseCommand):
+    help = 'Archive resolved and closed alarms older than ALARM_ARCHIVE_AFTER days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        archived = archive_alarms(batch_size=options['batch_size'])
+        self.stdout.write(f'Archived {archived} alarms in {time.perf_counter() - started:.2f}s')
@@ -0,0 +1,135 @@
+"""
+Benchmark the alarm list filters against a large seeded alarm table.
+
+Seeds the configured database up to --alarms rows (bulk inserts, no signals)
+and prints the query plan and median timing for each filter combination used
+by the alarm list and dashboard. Run it against a scratch database:
+
+    python manage.py benchmark_alarm_filters --alarms 1000000
+"""
+
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from monitoring.models import Region, Site, Alarm
+
+STATUS_WEIGHTS = [('active', 10), ('acknowledged', 5), ('resolved', 45), ('closed', 40)]
+
+
+@contextmanager
+def explicit_created_at():
+    # Let seeded rows keep their own created_at instead of "now"
+    field = Alarm._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Seed alarms and report query plans/timings for the hot alarm filters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alarms', type=int, default=1000000)
+        parser.add_argument('--sites', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--no-seed', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['no_seed']:
+            self.seed(options)
+
+        site = Site.objects.order_by('?').first()
+        region = site.region if site else None
+        scenarios = [
+            ('status', {'status': 'active'}),
+            ('status+severity', {'status': 'active', 'severity': 'critical'}),
+            ('type+status', {'alarm_type': 'power', 'status': 'active'}),
+            ('severity', {'severity': 'major'}),
+            ('site', {'site__code': site.code if site else ''}),
+            ('site+status', {'site__code': site.code if site else '', 'status': 'active'}),
+            ('region', {'site__region__code': region.code if region else ''}),
+            ('region+status', {'site__region__code': region.code if region else '', 'status': 'active'}),
+            ('unfiltered', {}),
+        ]
+
+        for name, filters in scenarios:
+            queryset = Alarm.objects.filter(**filters).order_by('-created_at', '-id')[:20]
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{name}: {filters}'))
+            self.stdout.write(queryset.explain())
+            self.stdout.write(
+                f'  page:  {self.time(lambda: list(queryset.all()), options["repeat"]):.2f} ms'
+            )
+            self.stdout.write(
+                f'  count: {self.time(Alarm.objects.filter(**filters).count, options["repeat"]):.2f} ms'
+            )
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def seed(self, options):
+        site_ids = list(Site.objects.values_list('id', flat=True))
+        if not site_ids:
+            site_ids = self.seed_sites(options['sites'])
+
+        missing = options['alarms'] - Alarm.objects.count()
+        if missing <= 0:
+            return
+
+        alarm_types = [choice for choice, _ in Alarm.ALARM_TYPES]
+        severities = [choice for choice, _ in Alarm.SEVERITY_LEVELS]
+        statuses = [status for status, _ in STATUS_WEIGHTS]
+        weights = [weight for _, weight in STATUS_WEIGHTS]
+        now = timezone.now()
+        span = options['days'] * 86400
+
+        self.stdout.write(f'Seeding {missing} alarms...')
+        with explicit_created_at():
+            while missing > 0:
+                size = min(missing, options['batch_size'])
+                Alarm.objects.bulk_create([
+                    Alarm(
+                        site_id=random.choice(site_ids),
+                        alarm_type=random.choice(alarm_types),
+                        severity=random.choice(severities),
+                        status=random.choices(statuses, weights)[0],
+                        title='Benchmark alarm',
+                        description='',
+                        created_at=now - timedelta(seconds=random.randint(0, span)),
+                    )
+                    for _ in range(size)
+                ], batch_size=options['batch_size'])
+                missing -= size
+
+    def seed_sites(self, count):
+        regions = [
+            Region.objects.get_or_create(code=f'B{i:02d}', defaults={'name': f'Bench {i}'})[0]
+            for i in range(10)
+        ]
+        Site.objects.bulk_create([
+            Site(
+                name=f'BTS-BENCH-{i:05d}',
+                code=f'BENCH-{i:05d}',
+                region=regions[i % len(regions)],
+                latitude=Decimal(str(round(random.uniform(2, 12), 6))),
+                longitude=Decimal(str(round(random.uniform(9, 16), 6))),
+                ip_address=f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}',
+            )
+            for i in range(count)
+        ])
+        return list(Site.objects.values_list('id', flat=True))
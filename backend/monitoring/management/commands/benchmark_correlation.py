@@ -0,0 +1,80 @@
+"""
+Benchmark the streaming alarm correlator on a synthetic alarm storm.
+
+Runs entirely in memory: --sites synthetic sites, --hubs failing hubs whose
+nearby sites raise alarms, plus random background alarms, all spread over
+--seconds of simulated time.
+
+    python manage.py benchmark_correlation --alarms 10000 --seconds 60
+"""
+
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+
+from monitoring.correlation import Correlator, haversine_km
+
+
+class Command(BaseCommand):
+    help = 'Measure correlator throughput and memory on a synthetic alarm storm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alarms', type=int, default=10000)
+        parser.add_argument('--seconds', type=int, default=60)
+        parser.add_argument('--sites', type=int, default=1000)
+        parser.add_argument('--regions', type=int, default=10)
+        parser.add_argument('--hubs', type=int, default=20)
+        parser.add_argument('--noise', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sites = [
+            (rng.randrange(options['regions']), rng.uniform(2.0, 12.0), rng.uniform(9.0, 16.0))
+            for _ in range(options['sites'])
+        ]
+        hubs = rng.sample(range(len(sites)), options['hubs'])
+        downstream = {
+            hub: [
+                index for index, site in enumerate(sites)
+                if site[0] == sites[hub][0] and haversine_km(site[1], site[2], sites[hub][1], sites[hub][2]) < 25
+            ]
+            for hub in hubs
+        }
+
+        start = datetime.now(timezone.utc)
+        stream = []
+        for alarm_id in range(options['alarms']):
+            if rng.random() < options['noise']:
+                site = rng.randrange(len(sites))
+                alarm_type = rng.choice(['ip', 'transmission', 'power', 'bss', 'hardware'])
+            else:
+                site = rng.choice(downstream[rng.choice(hubs)])
+                alarm_type = rng.choice(['ip', 'transmission'])
+            at = start + timedelta(seconds=options['seconds'] * alarm_id / options['alarms'])
+            stream.append((alarm_id, sites[site], alarm_type, at))
+
+        correlator = Correlator(
+            window=300, radius_km=30, min_alarms=3, max_clusters=5000,
+            alarm_types=['ip', 'transmission', 'power']
+        )
+        incidents = set()
+        peak = 0
+        began = time.perf_counter()
+        for alarm_id, (region, latitude, longitude), alarm_type, at in stream:
+            cluster = correlator.add(alarm_id, region, alarm_type, latitude, longitude, at)
+            if cluster is not None and cluster.size >= correlator.min_alarms:
+                incidents.add(id(cluster))
+                # Mimic persistence dropping pending members once an incident exists
+                cluster.pending = []
+                cluster.incident_id = cluster.incident_id or alarm_id
+            peak = max(peak, len(correlator))
+        elapsed = time.perf_counter() - began
+
+        rate = options['alarms'] / elapsed
+        self.stdout.write(f'{options["alarms"]} alarms in {elapsed * 1000:.1f} ms ({rate:,.0f} alarms/s)')
+        self.stdout.write(f'required for {options["alarms"]}/{options["seconds"]}s: '
+                          f'{options["alarms"] / options["seconds"]:,.0f} alarms/s')
+        self.stdout.write(f'incidents: {len(incidents)}, open clusters: {len(correlator)}, peak clusters: {peak}')
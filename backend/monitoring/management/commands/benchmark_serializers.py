@@ -0,0 +1,89 @@
+"""
+Benchmark alarm list rendering: AlarmSerializer + JSONRenderer (what the
+list endpoint rendered before) against the .values() row path +
+ORJSONRenderer, with and without ?expand=history.
+
+Synthetic alarms are created inside a transaction that is rolled back.
+
+    python manage.py benchmark_serializers --alarms 10000
+"""
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from monitoring.models import Region, Site, Alarm, AlarmHistory
+from monitoring.renderers import ORJSONRenderer
+from monitoring.rows import ALARM_ROWS
+from monitoring.serializers import AlarmSerializer
+from monitoring.views import alarm_queryset
+
+
+class Command(BaseCommand):
+    help = 'Compare list rendering through serializers and through .values() rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alarms', type=int, default=10000)
+        parser.add_argument('--history', type=int, default=2, help='History entries per alarm')
+        parser.add_argument('--sites', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.populate(options)
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def populate(self, options):
+        user = get_user_model().objects.create(username='benchmark', first_name='Bench', last_name='Mark')
+        region = Region.objects.create(name='Benchmark', code='BENCH')
+        sites = Site.objects.bulk_create([
+            Site(name=f'Bench {index}', code=f'BENCH-{index:04d}', region=region,
+                 latitude=0, longitude=0, ip_address=f'10.255.{index // 256 % 256}.{index % 256}')
+            for index in range(options['sites'])
+        ])
+        alarms = Alarm.objects.bulk_create([
+            Alarm(
+                site=sites[index % len(sites)], alarm_type='power', severity='major',
+                title=f'Alarm {index}', description='Synthetic alarm', acknowledged_by=user,
+            )
+            for index in range(options['alarms'])
+        ], batch_size=1000)
+        AlarmHistory.objects.bulk_create([
+            AlarmHistory(alarm=alarm, user=user, action='comment', comment='Synthetic entry')
+            for alarm in alarms for _ in range(options['history'])
+        ], batch_size=1000)
+
+    def measure(self, render, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = len(render())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, size
+
+    def run(self, options):
+        alarms = alarm_queryset().filter(site__region__code='BENCH')
+        plain = alarms.prefetch_related(None)
+        json_renderer = JSONRenderer()
+        orjson_renderer = ORJSONRenderer()
+
+        def rows(expand):
+            names = list(ALARM_ROWS.fields)
+            return ALARM_ROWS.render(list(plain.values(*ALARM_ROWS.lookups(names))), names, expand, None)
+
+        cases = [
+            ('serializer', lambda: json_renderer.render(AlarmSerializer(alarms, many=True).data)),
+            ('rows + history', lambda: orjson_renderer.render(rows(['history']))),
+            ('rows', lambda: orjson_renderer.render(rows([]))),
+        ]
+        self.stdout.write(f'{options["alarms"]} alarms, {options["history"]} history entries each')
+        for name, render in cases:
+            elapsed, size = self.measure(render, options['repeat'])
+            self.stdout.write(
+                f'{name:<24} {elapsed * 1000:8.1f} ms  {options["alarms"] / elapsed:>10,.0f} rows/s  {size:>10,} bytes'
+            )
@@ -0,0 +1,36 @@
+"""
+Write one month of archived alarms, with their history, to a gzip JSON
+lines file, optionally deleting it from the database afterwards.
+
+    python manage.py export_archived_alarms --month 2024-01 [--output alarms-2024-01.jsonl.gz] [--purge]
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.archive import export_partition, partition_range
+
+
+class Command(BaseCommand):
+    help = 'Export a monthly partition of the alarm archive as compressed JSON lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help='YYYY-MM, by alarm creation time')
+        parser.add_argument('--output', default=None)
+        parser.add_argument('--purge', action='store_true', help='Delete the partition once written')
+
+    def handle(self, *args, **options):
+        month = options['month']
+        try:
+            partition_range(month)
+        except ValueError:
+            raise CommandError('Month must be YYYY-MM')
+        output = options['output'] or f'alarms-{month}.jsonl.gz'
+
+        started = time.perf_counter()
+        count = export_partition(month, output, purge=options['purge'])
+        purged = ' and purged it' if options['purge'] else ''
+        self.stdout.write(
+            f'Exported {count} alarms from {month} to {output}{purged} in {time.perf_counter() - started:.2f}s'
+        )
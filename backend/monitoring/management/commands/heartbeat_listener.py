@@ -0,0 +1,120 @@
+"""
+Receive site heartbeats over UDP and/or TCP.
+
+Each datagram or TCP line holds one ping per line: a site code or IP
+address, optionally followed by a unix timestamp. An empty UDP datagram
+is a ping from the sender's own IP address. Pings are buffered and flushed
+to Site.last_ping every HEARTBEAT_FLUSH_INTERVAL seconds.
+
+    python manage.py heartbeat_listener --udp-port 9999 --tcp-port 9998
+"""
+
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from monitoring.heartbeats import get_buffer, parse_ping_time
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+
+def parse_lines(data, sender, now):
+    pings = []
+    for line in data.decode('utf-8', 'replace').splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            at = parse_ping_time(float(parts[1]) if len(parts) > 1 else None, now)
+        except (ValueError, OverflowError, OSError):
+            logger.warning('Ignoring malformed heartbeat %r from %s', line, sender)
+            continue
+        pings.append((parts[0], at))
+    return pings
+
+
+class Collector:
+    """
+    Gathers pings from the network handlers; the event loop never touches
+    the database, buffer.record() runs in a worker thread.
+    """
+
+    def __init__(self):
+        self.pings = []
+        self.buffer = get_buffer()
+        self.received = 0
+
+    def add(self, pings):
+        self.pings.extend(pings)
+        self.received += len(pings)
+
+    async def run(self, interval):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            pings, self.pings = self.pings, []
+            try:
+                if pings:
+                    unknown = await loop.run_in_executor(None, self.buffer.record, pings)
+                    if unknown:
+                        logger.warning('Heartbeats from %d unknown sites', len(set(unknown)))
+                await loop.run_in_executor(None, self.buffer.flush)
+            except Exception:
+                logger.exception('Failed to store %d heartbeats', len(pings))
+
+
+class HeartbeatProtocol(asyncio.DatagramProtocol):
+    def __init__(self, collector):
+        self.collector = collector
+
+    def datagram_received(self, data, addr):
+        now = timezone.now()
+        pings = parse_lines(data, addr[0], now) if data.strip() else [(addr[0], now)]
+        self.collector.add(pings)
+
+
+class Command(BaseCommand):
+    help = 'Listen for site heartbeats over UDP and TCP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--udp-port', type=int, default=9999)
+        parser.add_argument('--tcp-port', type=int, default=None)
+        parser.add_argument('--no-udp', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['no_udp'] and options['tcp_port'] is None:
+            raise CommandError('Nothing to listen on: give --tcp-port or drop --no-udp')
+        try:
+            asyncio.run(self.serve(options))
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self, options):
+        loop = asyncio.get_running_loop()
+        collector = Collector()
+        host = options['host']
+
+        if not options['no_udp']:
+            await loop.create_datagram_endpoint(
+                lambda: HeartbeatProtocol(collector), local_addr=(host, options['udp_port'])
+            )
+            self.stdout.write(f'Listening for UDP heartbeats on {host}:{options["udp_port"]}')
+
+        if options['tcp_port'] is not None:
+            async def handle_connection(reader, writer):
+                sender = writer.get_extra_info('peername')[0]
+                try:
+                    async for line in reader:
+                        collector.add(parse_lines(line, sender, timezone.now()))
+                finally:
+                    writer.close()
+
+            server = await asyncio.start_server(handle_connection, host, options['tcp_port'])
+            self.stdout.write(f'Listening for TCP heartbeats on {host}:{options["tcp_port"]}')
+            await server.start_serving()
+
+        await collector.run(settings.HEARTBEAT_FLUSH_INTERVAL)
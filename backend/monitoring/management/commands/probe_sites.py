@@ -0,0 +1,37 @@
+"""
+Probe every site's IP address once, or repeatedly with --every.
+
+    python manage.py probe_sites --concurrency 500 --timeout 1
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.prober import probe_sites
+
+
+class Command(BaseCommand):
+    help = 'Sweep all sites with concurrent TCP probes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=None)
+        parser.add_argument('--timeout', type=float, default=None)
+        parser.add_argument('--concurrency', type=int, default=None)
+        parser.add_argument('--jitter', type=float, default=None)
+        parser.add_argument('--every', type=float, default=None, help='Repeat every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            summary = probe_sites(
+                port=options['port'], timeout=options['timeout'],
+                concurrency=options['concurrency'], jitter=options['jitter'],
+            )
+            self.stdout.write(
+                f'{summary["probed"]} sites probed in {summary["duration"]:.2f}s: '
+                f'{summary["reachable"]} reachable, {len(summary["unreachable"])} unreachable, '
+                f'p50 {summary["latency_ms"]["p50"]} ms, p95 {summary["latency_ms"]["p95"]} ms'
+            )
+            if not options['every']:
+                break
+            time.sleep(options['every'])
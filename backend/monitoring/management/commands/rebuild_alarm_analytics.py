@@ -0,0 +1,20 @@
+"""
+Recompute the alarm analytics tables from scratch.
+
+    python manage.py rebuild_alarm_analytics
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.analytics import rebuild_analytics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily alarm analytics tables and reset their watermark'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        days = rebuild_analytics()
+        self.stdout.write(f'Rebuilt {days} days of alarm analytics in {time.perf_counter() - started:.2f}s')
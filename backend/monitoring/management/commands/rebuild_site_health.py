@@ -0,0 +1,22 @@
+"""
+Reconcile the site health rows with the alarms, e.g. after deploying them.
+
+    python manage.py rebuild_site_health
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from monitoring.health import rebuild_site_health
+from monitoring.stats import invalidate_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recompute every site health row from the active alarms'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        changed = rebuild_site_health()
+        invalidate_snapshot()
+        self.stdout.write(f'Reconciled site health, {changed} rows changed, in {time.perf_counter() - started:.2f}s')
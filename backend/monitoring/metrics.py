@@ -0,0 +1,221 @@
+"""
+Site KPI time series for BTS Monitoring System
+
+Raw samples are appended to SiteMetric in bulk and run through the
+threshold rule engine. rollup_metrics() folds them
+into SiteMetricRollup tiers of METRIC_ROLLUPS seconds, each tier built from
+the one below it, and prunes every tier after its METRIC_RETENTION. Reads
+pick the finest tier that covers the requested range in at most
+METRIC_MAX_POINTS points, so a 30 day chart is served from hourly buckets.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .heartbeats import parse_ping_time
+from .models import Site, SiteMetric, SiteMetricRollup
+from .rules import evaluate_samples
+
+METRICS = {choice for choice, _ in SiteMetric.METRIC_CHOICES}
+
+# Tier name of raw samples in METRIC_RETENTION
+RAW = 'raw'
+
+
+def validate_metric_item(item):
+    """
+    Return a dict of field errors for one incoming sample (empty when valid).
+    """
+    if not isinstance(item, dict):
+        return {'non_field_errors': ['Expected an object.']}
+
+    errors = {}
+    if not isinstance(item.get('site'), str) or not item['site']:
+        errors['site'] = ['Site code is required.']
+    if item.get('metric') not in METRICS:
+        errors['metric'] = [f'"{item.get("metric")}" is not a valid choice.']
+    value = item.get('value')
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        errors['value'] = ['A number is required.']
+    return errors
+
+
+def record_metrics(items):
+    """
+    Validate and append samples {'site': code, 'metric', 'value',
+    'timestamp'?} with one bulk insert. Returns (stored, errors) where
+    errors are {'index': i, 'errors': {...}}.
+    """
+    now = timezone.now()
+    errors = []
+    valid = []
+    for index, item in enumerate(items):
+        item_errors = validate_metric_item(item)
+        if not item_errors:
+            try:
+                timestamp = parse_ping_time(item.get('timestamp'), now)
+            except (TypeError, ValueError, OverflowError, OSError):
+                item_errors = {'timestamp': ['Invalid timestamp.']}
+        if item_errors:
+            errors.append({'index': index, 'errors': item_errors})
+        else:
+            valid.append((index, item, timestamp))
+
+    site_ids = dict(Site.objects.filter(
+        code__in={item['site'] for _, item, _ in valid}
+    ).values_list('code', 'id'))
+
+    samples = []
+    for index, item, timestamp in valid:
+        if item['site'] not in site_ids:
+            errors.append({'index': index, 'errors': {'site': [f'Unknown site code "{item["site"]}".']}})
+            continue
+        samples.append(SiteMetric(
+            site_id=site_ids[item['site']], metric=item['metric'], timestamp=timestamp, value=float(item['value'])
+        ))
+
+    SiteMetric.objects.bulk_create(samples, batch_size=settings.METRIC_BATCH_SIZE)
+    evaluate_samples(samples)
+    errors.sort(key=lambda error: error['index'])
+    return len(samples), errors
+
+
+def record_samples(metric, values, at):
+    """
+    Append {site_id: value} samples taken at `at`, for internal collectors.
+    """
+    samples = SiteMetric.objects.bulk_create([
+        SiteMetric(site_id=site_id, metric=metric, timestamp=at, value=value)
+        for site_id, value in values.items()
+    ], batch_size=settings.METRIC_BATCH_SIZE)
+    evaluate_samples(samples)
+
+
+def bucket_start(timestamp, resolution):
+    return int(timestamp // resolution * resolution)
+
+
+def rollup_tier(resolution, source, now):
+    """
+    (Re)build the buckets of one tier from `source` (a finer resolution, or
+    None for raw samples) starting at the tier's last bucket minus
+    METRIC_LATE_ARRIVAL, so partial and late buckets are recomputed.
+    """
+    watermark = SiteMetricRollup.objects.filter(resolution=resolution).aggregate(Max('bucket'))['bucket__max']
+    start = None
+    if watermark is not None:
+        start = datetime.fromtimestamp(
+            bucket_start(watermark.timestamp() - settings.METRIC_LATE_ARRIVAL, resolution), tz=dt_timezone.utc
+        )
+
+    if source is None:
+        rows = SiteMetric.objects.filter(timestamp__lte=now)
+        if start is not None:
+            rows = rows.filter(timestamp__gte=start)
+        rows = ((site_id, metric, at, 1, value, value, value) for site_id, metric, at, value in rows.values_list(
+            'site_id', 'metric', 'timestamp', 'value'
+        ).iterator())
+    else:
+        rows = SiteMetricRollup.objects.filter(resolution=source)
+        if start is not None:
+            rows = rows.filter(bucket__gte=start)
+        rows = rows.values_list(
+            'site_id', 'metric', 'bucket', 'count', 'total', 'minimum', 'maximum'
+        ).iterator()
+
+    buckets = {}
+    for site_id, metric, at, count, total, minimum, maximum in rows:
+        key = (site_id, metric, bucket_start(at.timestamp(), resolution))
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = [count, total, minimum, maximum]
+        else:
+            bucket[0] += count
+            bucket[1] += total
+            bucket[2] = min(bucket[2], minimum)
+            bucket[3] = max(bucket[3], maximum)
+
+    with transaction.atomic():
+        stale = SiteMetricRollup.objects.filter(resolution=resolution)
+        if start is not None:
+            stale = stale.filter(bucket__gte=start)
+        stale.delete()
+        SiteMetricRollup.objects.bulk_create([
+            SiteMetricRollup(
+                site_id=site_id, metric=metric, resolution=resolution,
+                bucket=datetime.fromtimestamp(at, tz=dt_timezone.utc),
+                count=count, total=total, minimum=minimum, maximum=maximum,
+            )
+            for (site_id, metric, at), (count, total, minimum, maximum) in buckets.items()
+        ], batch_size=settings.METRIC_BATCH_SIZE)
+    return len(buckets)
+
+
+def prune_metrics(now):
+    retention = settings.METRIC_RETENTION
+    deleted, _ = SiteMetric.objects.filter(timestamp__lt=now - timedelta(seconds=retention[RAW])).delete()
+    for resolution in settings.METRIC_ROLLUPS:
+        count, _ = SiteMetricRollup.objects.filter(
+            resolution=resolution, bucket__lt=now - timedelta(seconds=retention[resolution])
+        ).delete()
+        deleted += count
+    return deleted
+
+
+def rollup_metrics(now=None):
+    """
+    Refresh every rollup tier, finest first, then apply retention.
+    Returns {resolution: buckets written}.
+    """
+    now = now or timezone.now()
+    written = {}
+    source = None
+    for resolution in settings.METRIC_ROLLUPS:
+        written[resolution] = rollup_tier(resolution, source, now)
+        source = resolution
+    prune_metrics(now)
+    return written
+
+
+def pick_resolution(start, end, now):
+    """
+    The finest tier (0 for raw samples) still holding `start` whose
+    estimated number of points over the range fits METRIC_MAX_POINTS.
+    """
+    window = (end - start).total_seconds()
+    age = (now - start).total_seconds()
+    tiers = [(0, settings.METRIC_SAMPLE_INTERVAL, settings.METRIC_RETENTION[RAW])] + [
+        (resolution, resolution, settings.METRIC_RETENTION[resolution])
+        for resolution in settings.METRIC_ROLLUPS
+    ]
+    for resolution, spacing, retention in tiers:
+        if age <= retention and window / spacing <= settings.METRIC_MAX_POINTS:
+            return resolution
+    return settings.METRIC_ROLLUPS[-1]
+
+
+def metric_series(site_id, metric, start, end, resolution=None):
+    """
+    [[unix time, avg, min, max], ...] of a site's metric over [start, end].
+    """
+    if resolution is None:
+        resolution = pick_resolution(start, end, timezone.now())
+
+    if resolution == 0:
+        rows = SiteMetric.objects.filter(
+            site_id=site_id, metric=metric, timestamp__gte=start, timestamp__lte=end
+        ).order_by('timestamp').values_list('timestamp', 'value')
+        return resolution, [[int(at.timestamp()), value, value, value] for at, value in rows]
+
+    first_bucket = datetime.fromtimestamp(bucket_start(start.timestamp(), resolution), tz=dt_timezone.utc)
+    rows = SiteMetricRollup.objects.filter(
+        site_id=site_id, metric=metric, resolution=resolution, bucket__gte=first_bucket, bucket__lte=end
+    ).order_by('bucket').values_list('bucket', 'count', 'total', 'minimum', 'maximum')
+    return resolution, [
+        [int(at.timestamp()), total / count, minimum, maximum]
+        for at, count, total, minimum, maximum in rows
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -33,6 +34,9 @@ class Site(models.Model):
     status = models.CharField(max_length=20, choices=SITE_STATUS_CHOICES, default='active')
     ip_address = models.GenericIPAddressField()
     last_ping = models.DateTimeField(null=True, blank=True)
+    # Set while the heartbeat detector holds the site inactive, so only
+    # those sites come back on their next ping
+    heartbeat_down = models.BooleanField(default=False, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -74,8 +78,15 @@ class Alarm(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    incident = models.ForeignKey(
+        'Incident', on_delete=models.SET_NULL, null=True, blank=True, related_name='alarms'
+    )
     acknowledged_at = models.DateTimeField(null=True, blank=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    # Repeats folded into this alarm by the dedup engine (created_at is first seen)
+    occurrence_count = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    is_flapping = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -84,6 +95,273 @@ class Alarm(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'severity'], name='alarm_status_severity_idx'),
+            models.Index(fields=['status', '-created_at'], name='alarm_status_created_idx'),
+            models.Index(fields=['alarm_type', 'status'], name='alarm_type_status_idx'),
+            models.Index(fields=['site', 'status', '-created_at'], name='alarm_site_status_idx'),
+            models.Index(fields=['-created_at', '-id'], name='alarm_created_idx'),
+            models.Index(fields=['updated_at'], name='alarm_updated_idx'),
+            # Partial indexes for the live dashboard, which only reads active alarms
+            models.Index(
+                fields=['-created_at'], name='alarm_active_created_idx',
+                condition=Q(status='active')
+            ),
+            models.Index(
+                fields=['severity', 'alarm_type'], name='alarm_active_severity_idx',
+                condition=Q(status='active')
+            ),
+        ]
+
+
+class ArchivedAlarm(models.Model):
+    """
+    A resolved or closed alarm moved out of Alarm by monitoring.archive,
+    keeping its original id and timestamps. Monthly partitions are the
+    alarms created in a calendar month.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='+')
+    alarm_type = models.CharField(max_length=20, choices=Alarm.ALARM_TYPES)
+    severity = models.CharField(max_length=20, choices=Alarm.SEVERITY_LEVELS)
+    status = models.CharField(max_length=20, choices=Alarm.STATUS_CHOICES)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    acknowledged_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    incident = models.ForeignKey(
+        'Incident', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    acknowledged_at = models.DateTimeField(null=True, blank=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    occurrence_count = models.PositiveIntegerField(default=1)
+    last_seen = models.DateTimeField(null=True, blank=True)
+    is_flapping = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.site_id} - {self.title}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='archivedalarm_created_idx'),
+            models.Index(fields=['site', '-created_at'], name='archivedalarm_site_idx'),
+        ]
+
+
+class SiteHealth(models.Model):
+    """
+    A site's active alarms, denormalized and kept current by
+    monitoring.health in the same transaction as every alarm change. One
+    count column per severity and alarm type, so changes apply as F()
+    increments.
+    """
+    site = models.OneToOneField(Site, on_delete=models.CASCADE, primary_key=True, related_name='health')
+    worst_severity = models.CharField(max_length=20, choices=Alarm.SEVERITY_LEVELS, null=True, blank=True)
+    active_count = models.IntegerField(default=0)
+    critical_count = models.IntegerField(default=0)
+    major_count = models.IntegerField(default=0)
+    minor_count = models.IntegerField(default=0)
+    warning_count = models.IntegerField(default=0)
+    power_count = models.IntegerField(default=0)
+    ip_count = models.IntegerField(default=0)
+    transmission_count = models.IntegerField(default=0)
+    bss_count = models.IntegerField(default=0)
+    hardware_count = models.IntegerField(default=0)
+    security_count = models.IntegerField(default=0)
+    changed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.site_id}: {self.worst_severity or 'ok'} ({self.active_count})"
+
+    @property
+    def type_counts(self):
+        # {alarm_type: count} of the types with active alarms
+        counts = {alarm_type: getattr(self, f'{alarm_type}_count') for alarm_type, _ in Alarm.ALARM_TYPES}
+        return {alarm_type: count for alarm_type, count in counts.items() if count}
+
+    @property
+    def severity_counts(self):
+        counts = {severity: getattr(self, f'{severity}_count') for severity, _ in Alarm.SEVERITY_LEVELS}
+        return {severity: count for severity, count in counts.items() if count}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['worst_severity'], name='sitehealth_severity_idx'),
+        ]
+
+
+class Incident(models.Model):
+    """
+    Parent of alarms correlated by region, type, time and distance.
+    """
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('resolved', 'Resolved'),
+    ]
+
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    alarm_type = models.CharField(max_length=20, choices=Alarm.ALARM_TYPES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    title = models.CharField(max_length=200)
+    latitude = models.DecimalField(max_digits=10, decimal_places=8)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8)
+    alarm_count = models.PositiveIntegerField(default=0)
+    first_alarm_at = models.DateTimeField()
+    last_alarm_at = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='incident_status_created_idx'),
+        ]
+
+
+class SiteMetric(models.Model):
+    """
+    Raw KPI sample of a site. Append-only; rolled up into SiteMetricRollup
+    and deleted after METRIC_RETENTION['raw'] seconds.
+    """
+    METRIC_CHOICES = [
+        ('latency', 'Latency (ms)'),
+        ('battery_voltage', 'Battery Voltage (V)'),
+        ('temperature', 'Temperature (°C)'),
+    ]
+
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='metrics')
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES)
+    timestamp = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['site', 'metric', 'timestamp'], name='sitemetric_series_idx'),
+            models.Index(fields=['timestamp'], name='sitemetric_timestamp_idx'),
+        ]
+
+
+class SiteMetricRollup(models.Model):
+    """
+    Aggregate of a site's samples over one bucket of `resolution` seconds.
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, related_name='metric_rollups')
+    metric = models.CharField(max_length=30, choices=SiteMetric.METRIC_CHOICES)
+    resolution = models.PositiveIntegerField()
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    total = models.FloatField()
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['site', 'metric', 'resolution', 'bucket'], name='sitemetricrollup_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket'], name='sitemetricrollup_tier_idx'),
+        ]
+
+
+class MetricRule(models.Model):
+    """
+    Threshold condition on a site metric, e.g. battery_voltage < 44 for 5m.
+    Applies to every site, to a region or to a single site. The alarm is
+    cleared once the value is back beyond clear_threshold (hysteresis).
+    """
+    AGGREGATION_CHOICES = [
+        ('last', 'Last Value'),
+        ('avg', 'Average'),
+        ('min', 'Minimum'),
+        ('max', 'Maximum'),
+        ('p95', '95th Percentile'),
+    ]
+
+    OPERATOR_CHOICES = [
+        ('<', 'Below'),
+        ('<=', 'Below or Equal'),
+        ('>', 'Above'),
+        ('>=', 'Above or Equal'),
+    ]
+
+    name = models.CharField(max_length=200, unique=True)
+    metric = models.CharField(max_length=30, choices=SiteMetric.METRIC_CHOICES)
+    aggregation = models.CharField(max_length=10, choices=AGGREGATION_CHOICES, default='last')
+    operator = models.CharField(max_length=2, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField()
+    clear_threshold = models.FloatField(null=True, blank=True)
+    duration = models.PositiveIntegerField(default=0, help_text='Seconds the condition must hold')
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, null=True, blank=True)
+    site = models.ForeignKey(Site, on_delete=models.CASCADE, null=True, blank=True)
+    alarm_type = models.CharField(max_length=20, choices=Alarm.ALARM_TYPES)
+    severity = models.CharField(max_length=20, choices=Alarm.SEVERITY_LEVELS)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['name']
+
+
+class AlarmDailyStat(models.Model):
+    """
+    Alarms created on a day per region, type and severity, with the time
+    they took to be acknowledged and resolved. Maintained by analytics.
+    """
+    day = models.DateField()
+    region = models.ForeignKey(Region, on_delete=models.CASCADE)
+    alarm_type = models.CharField(max_length=20, choices=Alarm.ALARM_TYPES)
+    severity = models.CharField(max_length=20, choices=Alarm.SEVERITY_LEVELS)
+    alarm_count = models.PositiveIntegerField(default=0)
+    acknowledged_count = models.PositiveIntegerField(default=0)
+    acknowledge_seconds = models.FloatField(default=0)
+    resolved_count = models.PositiveIntegerField(default=0)
+    resolve_seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'region', 'alarm_type', 'severity'], name='alarmdailystat_unique'
+            ),
+        ]
+
+
+class SiteDailyStat(models.Model):
+    """
+    Alarms created on a day per site, for top offender rankings.
+    """
+    day = models.DateField()
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    alarm_count = models.PositiveIntegerField(default=0)
+    critical_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'site'], name='sitedailystat_unique'),
+        ]
+
+
+class AnalyticsWatermark(models.Model):
+    """
+    Point up to which a periodic rollup has processed changes.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
 
 
 class AlarmHistory(models.Model):
@@ -97,4 +375,27 @@ class AlarmHistory(models.Model):
         return f"{self.alarm} - {self.action}"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['alarm', '-created_at'], name='alarmhistory_alarm_created_idx'),
+            models.Index(fields=['-created_at', '-id'], name='alarmhistory_created_idx'),
+        ]
+
+
+class ArchivedAlarmHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    alarm = models.ForeignKey(ArchivedAlarm, on_delete=models.CASCADE, related_name='history')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    action = models.CharField(max_length=50)
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.alarm_id} - {self.action}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['alarm', '-created_at'], name='archivedhistory_alarm_idx'),
+            models.Index(fields=['-created_at', '-id'], name='archivedhistory_created_idx'),
+        ]
@@ -0,0 +1,145 @@
+"""
+Pagination for BTS Monitoring System list endpoints
+
+KeysetPagination walks a list ordered by (-created_at, -id) with an opaque
+cursor holding the last seen position, so every page is an indexed range
+scan without OFFSET or COUNT(*). SelectablePagination lets each request pick
+between it and the default page-number pagination.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        # Total counts cost a full scan, so they are opt-in
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+
+        if cursor is None:
+            queryset = queryset.order_by('-created_at', '-id')
+        elif reverse:
+            queryset = queryset.filter(
+                Q(created_at__gt=cursor['created_at']) |
+                Q(created_at=cursor['created_at'], id__gt=cursor['id'])
+            ).order_by('created_at', 'id')
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=cursor['created_at']) |
+                Q(created_at=cursor['created_at'], id__lt=cursor['id'])
+            ).order_by('-created_at', '-id')
+
+        # One extra row tells us whether another page exists
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_position = None
+        self.previous_position = None
+        if results:
+            if has_more or reverse:
+                self.next_position = self.position(results[-1])
+            if cursor is not None and (has_more or not reverse):
+                self.previous_position = self.position(results[0])
+
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def position(self, item):
+        # Rows may be model instances or .values() dicts
+        if isinstance(item, dict):
+            return item['created_at'], item['id']
+        return item.created_at, item.id
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            created_at = parse_datetime(data['t'])
+            cursor = {'created_at': created_at, 'id': int(data['i']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, position, reverse):
+        created_at, pk = position
+        data = {'t': created_at.isoformat(), 'i': pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response['count'] = self.count
+        return Response(response)
+
+
+class SelectablePagination(BasePagination):
+    """
+    Keyset pagination for ?pagination=cursor (or any ?cursor=), page-number
+    pagination otherwise.
+    """
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or KeysetPagination.cursor_query_param in request.query_params):
+            self.paginator = KeysetPagination()
+        else:
+            self.paginator = PageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,122 @@
+"""
+Active site probing for BTS Monitoring System
+
+Every site's ip_address is probed with a TCP connect to PROBE_PORT, up to
+PROBE_CONCURRENCY probes in flight, so a sweep of thousands of sites takes
+about (sites / concurrency) * timeout at worst. A site is reachable when
+its management port accepts the connection. Reachable sites count as a
+heartbeat and their latency is stored as a 'latency' metric sample; the
+staleness detector then raises or clears their 'ip' alarms, including for
+sites that have not answered a single probe.
+"""
+
+import asyncio
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import heartbeats, metrics
+from .models import Site
+
+SUMMARY_KEY = 'monitoring:probe:summary'
+
+
+async def probe(host, port, timeout):
+    """
+    Round trip time in seconds of a TCP connect to host:port, or None when
+    the connection fails or takes longer than timeout.
+    """
+    started = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    latency = time.perf_counter() - started
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return latency
+
+
+async def sweep(targets, port, timeout, concurrency, jitter=0.0):
+    """
+    Probe (key, host) targets concurrently. Returns {key: latency or None}.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(key, host):
+        # Jitter spreads the first connects instead of opening all at once
+        if jitter:
+            await asyncio.sleep(random.uniform(0, jitter))
+        async with semaphore:
+            return key, await probe(host, port, timeout)
+
+    return dict(await asyncio.gather(*(run(key, host) for key, host in targets)))
+
+
+def latency_histogram(latencies):
+    buckets = settings.PROBE_LATENCY_BUCKETS_MS
+    counts, _ = np.histogram(
+        np.asarray(latencies, dtype=np.float64) * 1000, bins=[0, *buckets, np.inf]
+    )
+    labels = [f'<{bucket}' for bucket in buckets] + [f'>={buckets[-1]}']
+    return dict(zip(labels, counts.tolist()))
+
+
+def probe_sites(port=None, timeout=None, concurrency=None, jitter=None):
+    """
+    Sweep all sites not under maintenance, record the reachable ones as
+    heartbeats and run the staleness detector. Returns the sweep summary,
+    which is also cached for the probe status endpoint.
+    """
+    port = port or settings.PROBE_PORT
+    timeout = timeout or settings.PROBE_TIMEOUT
+    concurrency = concurrency or settings.PROBE_CONCURRENCY
+    jitter = settings.PROBE_JITTER if jitter is None else jitter
+
+    listed_at = timezone.now()
+    sites = list(Site.objects.exclude(status='maintenance').values_list('id', 'code', 'ip_address'))
+    site_ids = {code: site_id for site_id, code, _ in sites}
+    targets = [(code, ip_address) for _, code, ip_address in sites]
+    started = time.perf_counter()
+    results = asyncio.run(sweep(targets, port, timeout, concurrency, jitter))
+    duration = time.perf_counter() - started
+
+    now = timezone.now()
+    reachable = {code: latency for code, latency in results.items() if latency is not None}
+    buffer = heartbeats.get_buffer()
+    buffer.record([(code, now) for code in reachable])
+    buffer.flush()
+    metrics.record_samples('latency', {
+        site_ids[code]: latency * 1000 for code, latency in reachable.items()
+    }, now)
+    # Sites unreachable since they were added have no last ping to go stale
+    raised, cleared = heartbeats.detect_stale_sites(now, probed_at=listed_at)
+
+    latencies = np.fromiter(reachable.values(), dtype=np.float64, count=len(reachable))
+    summary = {
+        'swept_at': now.isoformat(),
+        'duration': round(duration, 3),
+        'probed': len(results),
+        'reachable': len(reachable),
+        'unreachable': sorted(code for code, latency in results.items() if latency is None),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies, 50)) * 1000, 2) if len(latencies) else None,
+            'p95': round(float(np.percentile(latencies, 95)) * 1000, 2) if len(latencies) else None,
+            'histogram': latency_histogram(latencies),
+        },
+        'alarms_raised': raised,
+        'alarms_cleared': cleared,
+    }
+    cache.set(SUMMARY_KEY, summary, None)
+    return summary
+
+
+def get_probe_summary():
+    return cache.get(SUMMARY_KEY)
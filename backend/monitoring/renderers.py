@@ -0,0 +1,22 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson. Types orjson does not handle itself, and
+    datetimes (so they keep DRF's millisecond 'Z' format), go through DRF's
+    encoder.
+    """
+    encoder = JSONEncoder()
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = self.options
+        # orjson only indents by two spaces, whatever indent was asked for
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=self.encoder.default, option=options)
@@ -0,0 +1,341 @@
+"""
+Metric threshold rules for BTS Monitoring System
+
+Active MetricRules are compiled per metric into NumPy arrays: thresholds,
+operator signs, durations and a rules x sites scope mask. A batch of
+samples is then evaluated for every rule and site at once, keeping per
+(rule, site) state of when the condition started to hold and whether the
+alarm is raised. Raising needs the condition to hold for `duration`
+seconds; clearing needs the value back beyond clear_threshold.
+"""
+
+import re
+import threading
+import time
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .dedup import OPEN_STATUSES
+from .ingestion import clear_alarms, store_alarms
+from .models import Site, Alarm, MetricRule, SiteMetric
+from .signals import RULES_VERSION_KEY
+
+# Operator -> (sign, inclusive): x op t  <=>  sign*x > sign*t (or == t)
+OPERATORS = {
+    '<': (-1.0, False),
+    '<=': (-1.0, True),
+    '>': (1.0, False),
+    '>=': (1.0, True),
+}
+
+WINDOWED = ('avg', 'min', 'max', 'p95')
+
+EXPRESSION = re.compile(
+    r'^\s*(?P<metric>[a-z_]+?)(?:_(?P<aggregation>last|avg|min|max|p95))?'
+    r'\s*(?P<operator><=|>=|<|>)\s*(?P<threshold>-?\d+(?:\.\d+)?)\s*[a-z%°]*'
+    r'(?:\s+for\s+(?P<duration>\d+)\s*(?P<unit>s|m|h))?\s*$',
+    re.IGNORECASE
+)
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600}
+
+
+def parse_expression(expression):
+    """
+    Rule fields from an expression like 'battery_voltage < 44 for 5m' or
+    'latency_p95 > 300ms'. Raises ValueError when it does not parse.
+    """
+    match = EXPRESSION.match(expression)
+    metrics = {choice for choice, _ in SiteMetric.METRIC_CHOICES}
+    if not match or match['metric'].lower() not in metrics:
+        raise ValueError(f'Invalid rule expression "{expression}"')
+    duration = 0
+    if match['duration']:
+        duration = int(match['duration']) * DURATION_UNITS[match['unit'].lower()]
+    return {
+        'metric': match['metric'].lower(),
+        'aggregation': (match['aggregation'] or 'last').lower(),
+        'operator': match['operator'],
+        'threshold': float(match['threshold']),
+        'duration': duration,
+    }
+
+
+def percentile(values, q):
+    """
+    Row-wise percentile ignoring NaN, with the same linear interpolation as
+    np.nanpercentile but vectorized over rows instead of looping.
+    """
+    ordered = np.sort(values, axis=1)  # NaN sorts last
+    counts = np.count_nonzero(~np.isnan(values), axis=1)
+    position = (np.maximum(counts, 1) - 1) * (q / 100)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, np.maximum(counts - 1, 0))
+    low = np.take_along_axis(ordered, below[:, None], axis=1)[:, 0]
+    high = np.take_along_axis(ordered, above[:, None], axis=1)[:, 0]
+    return low + (high - low) * (position - below)
+
+
+class CompiledMetric:
+    """
+    The rules of one metric with their state over all sites.
+    """
+
+    def __init__(self, rules, site_ids, site_regions, window, window_samples):
+        count = len(rules)
+        self.rules = rules
+        self.window = window
+        self.sign = np.array([OPERATORS[rule.operator][0] for rule in rules])
+        self.inclusive = np.array([OPERATORS[rule.operator][1] for rule in rules])
+        self.threshold = np.array([rule.threshold for rule in rules])
+        self.clear = np.array([
+            rule.threshold if rule.clear_threshold is None else rule.clear_threshold for rule in rules
+        ])
+        self.duration = np.array([float(rule.duration) for rule in rules])
+        self.aggregations = {}
+        for index, rule in enumerate(rules):
+            self.aggregations.setdefault(rule.aggregation, []).append(index)
+
+        self.scope = np.zeros((count, len(site_ids)), dtype=bool)
+        for index, rule in enumerate(rules):
+            if rule.site_id is not None:
+                self.scope[index] = site_ids == rule.site_id
+            elif rule.region_id is not None:
+                self.scope[index] = site_regions == rule.region_id
+            else:
+                self.scope[index] = True
+
+        # When each (rule, site) condition started to hold, and raised alarms
+        self.since = np.full((count, len(site_ids)), np.nan)
+        self.active = np.zeros((count, len(site_ids)), dtype=bool)
+
+        # Ring buffer of recent samples per site for windowed aggregations
+        self.buffered = any(aggregation in WINDOWED for aggregation in self.aggregations)
+        if self.buffered:
+            self.values = np.full((len(site_ids), window_samples), np.nan)
+            self.times = np.full((len(site_ids), window_samples), -np.inf)
+            self.head = np.zeros(len(site_ids), dtype=np.int64)
+
+    def aggregate(self, aggregation, sites, latest, latest_at):
+        if aggregation == 'last':
+            return latest
+        values = np.where(self.times[sites] >= latest_at[:, None] - self.window, self.values[sites], np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if aggregation == 'avg':
+                return np.nanmean(values, axis=1)
+            if aggregation == 'min':
+                return np.nanmin(values, axis=1)
+            if aggregation == 'max':
+                return np.nanmax(values, axis=1)
+            return percentile(values, 95)
+
+    def evaluate(self, sites, values, times):
+        """
+        Feed samples (site indexes, values, unix times) and return the
+        (rule index, site index) arrays of alarms to raise and to clear.
+        """
+        order = np.argsort(sites, kind='stable')
+        sites, values, times = sites[order], values[order], times[order]
+        touched, first, counts = np.unique(sites, return_index=True, return_counts=True)
+        last = first + counts - 1
+        latest, latest_at = values[last], times[last]
+
+        if self.buffered:
+            rank = np.arange(len(sites)) - np.repeat(first, counts)
+            slots = (self.head[sites] + rank) % self.values.shape[1]
+            self.values[sites, slots] = values
+            self.times[sites, slots] = times
+            self.head[touched] += counts
+
+        current = np.empty((len(self.rules), len(touched)))
+        for aggregation, rows in self.aggregations.items():
+            current[rows] = self.aggregate(aggregation, touched, latest, latest_at)
+
+        sign = self.sign[:, None]
+        threshold = self.threshold[:, None]
+        holds = (sign * current > sign * threshold) | (self.inclusive[:, None] & (current == threshold))
+        recovered = sign * current < sign * self.clear[:, None]
+
+        scope = self.scope[:, touched]
+        since = self.since[:, touched]
+        active = self.active[:, touched]
+
+        since = np.where(scope & holds & np.isnan(since), latest_at[None, :], since)
+        since[~holds & ~active] = np.nan
+        raised = scope & holds & ~active & (latest_at[None, :] - since >= self.duration[:, None])
+        cleared = scope & active & recovered
+        active = (active | raised) & ~cleared
+        since[cleared] = np.nan
+
+        self.since[:, touched] = since
+        self.active[:, touched] = active
+
+        raised_rules, raised_sites = np.nonzero(raised)
+        cleared_rules, cleared_sites = np.nonzero(cleared)
+        return (raised_rules, touched[raised_sites]), (cleared_rules, touched[cleared_sites])
+
+
+def site_columns(site_ids, wanted):
+    """
+    Column of each wanted site id in the sorted site_ids array, and a mask
+    of the ones present.
+    """
+    if not len(site_ids):
+        return np.zeros(len(wanted), dtype=np.int64), np.zeros(len(wanted), dtype=bool)
+    columns = np.minimum(np.searchsorted(site_ids, wanted), len(site_ids) - 1)
+    return columns, site_ids[columns] == wanted
+
+
+class RuleEngine:
+    """
+    Compiled rules of this process. They are recompiled when the rules
+    version in the cache changes (any rule or site save, in any process
+    sharing the cache) and at least every RULE_RELOAD_INTERVAL seconds;
+    condition timers and sample buffers carry over to the new compile.
+    """
+
+    def __init__(self, window=None, window_samples=None, reload_interval=None):
+        self.window = window or settings.RULE_WINDOW
+        self.window_samples = window_samples or settings.RULE_WINDOW_SAMPLES
+        self.reload_interval = reload_interval or settings.RULE_RELOAD_INTERVAL
+        self.lock = threading.Lock()
+        self.metrics = None
+        self.site_ids = np.zeros(0, dtype=np.int64)
+        self.version = None
+        self.loaded_at = None
+
+    def compile(self, rules, sites):
+        """
+        Compile rules for sites given as (site_id, region_id) pairs.
+        """
+        previous, previous_sites = self.metrics or {}, self.site_ids
+        sites = sorted(sites)
+        self.site_ids = np.array([site_id for site_id, _ in sites], dtype=np.int64)
+        site_regions = np.array([region_id for _, region_id in sites], dtype=np.int64)
+        by_metric = {}
+        for rule in rules:
+            by_metric.setdefault(rule.metric, []).append(rule)
+        self.metrics = {
+            metric: CompiledMetric(metric_rules, self.site_ids, site_regions, self.window, self.window_samples)
+            for metric, metric_rules in by_metric.items()
+        }
+
+        columns, known = site_columns(previous_sites, self.site_ids)
+        for metric, compiled in self.metrics.items():
+            old = previous.get(metric)
+            if old is None:
+                continue
+            old_rows = {rule.pk: row for row, rule in enumerate(old.rules)}
+            for row, rule in enumerate(compiled.rules):
+                if rule.pk in old_rows:
+                    compiled.since[row, known] = old.since[old_rows[rule.pk], columns[known]]
+            if compiled.buffered and old.buffered:
+                compiled.values[known] = old.values[columns[known]]
+                compiled.times[known] = old.times[columns[known]]
+                compiled.head[known] = old.head[columns[known]]
+
+    def load(self, version):
+        rules = list(MetricRule.objects.filter(is_active=True))
+        self.compile(rules, list(Site.objects.values_list('id', 'region_id')))
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # Raised state comes from the open alarms, so alarms raised before
+        # a reload or by another process can still be cleared
+        names = {rule.name: rule for rule in rules}
+        for site_id, title in Alarm.objects.filter(
+            title__in=names, status__in=OPEN_STATUSES
+        ).values_list('site_id', 'title'):
+            rule = names[title]
+            compiled = self.metrics[rule.metric]
+            columns, known = site_columns(self.site_ids, np.array([site_id]))
+            if known[0]:
+                compiled.active[compiled.rules.index(rule), columns[0]] = True
+
+    def evaluate(self, metric, site_ids, values, times):
+        """
+        Evaluate samples of one metric given as arrays. Returns (raised,
+        cleared) lists of (rule, site_id).
+        """
+        with self.lock:
+            version = cache.get(RULES_VERSION_KEY)
+            if (
+                self.metrics is None or version != self.version
+                or time.monotonic() - self.loaded_at > self.reload_interval
+            ):
+                self.load(version)
+            compiled = self.metrics.get(metric)
+            if compiled is None:
+                return [], []
+
+            # Samples of sites created after the last compile are skipped
+            columns, known = site_columns(self.site_ids, site_ids)
+            raised, cleared = compiled.evaluate(columns[known], values[known], times[known])
+
+        return [
+            [(compiled.rules[rule], int(self.site_ids[site])) for rule, site in zip(*result)]
+            for result in (raised, cleared)
+        ]
+
+
+_engine = None
+
+
+def get_rule_engine():
+    global _engine
+    if _engine is None:
+        _engine = RuleEngine()
+    return _engine
+
+
+def evaluate_samples(samples):
+    """
+    Run SiteMetric samples through the rule engine and raise or clear the
+    resulting alarms in bulk.
+    """
+    by_metric = {}
+    for sample in samples:
+        by_metric.setdefault(sample.metric, []).append(sample)
+
+    engine = get_rule_engine()
+    raised, cleared = [], []
+    for metric, metric_samples in by_metric.items():
+        metric_raised, metric_cleared = engine.evaluate(
+            metric,
+            np.fromiter((sample.site_id for sample in metric_samples), dtype=np.int64, count=len(metric_samples)),
+            np.fromiter((sample.value for sample in metric_samples), dtype=np.float64, count=len(metric_samples)),
+            np.fromiter(
+                (sample.timestamp.timestamp() for sample in metric_samples), dtype=np.float64, count=len(metric_samples)
+            ),
+        )
+        raised += metric_raised
+        cleared += metric_cleared
+
+    store_alarms([
+        Alarm(
+            site_id=site_id,
+            alarm_type=rule.alarm_type,
+            severity=rule.severity,
+            title=rule.name,
+            description=f'{rule.metric} {rule.aggregation} {rule.operator} {rule.threshold:g}'
+                        + (f' for {rule.duration}s' if rule.duration else ''),
+        )
+        for rule, site_id in raised
+    ])
+
+    if cleared:
+        keys = {(site_id, rule.alarm_type, rule.name) for rule, site_id in cleared}
+        alarm_ids = [
+            alarm_id for alarm_id, site_id, alarm_type, title in Alarm.objects.filter(
+                site_id__in={key[0] for key in keys}, title__in={key[2] for key in keys},
+                status__in=OPEN_STATUSES
+            ).values_list('id', 'site_id', 'alarm_type', 'title')
+            if (site_id, alarm_type, title) in keys
+        ]
+        clear_alarms(alarm_ids, timezone.now())
+    return len(raised), len(cleared)
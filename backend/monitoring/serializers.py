@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Region, Site, Alarm, AlarmHistory
+from .models import Region, Site, Alarm, AlarmHistory, Incident, MetricRule, SiteHealth
+from .rules import parse_expression
 
 
 class RegionSerializer(serializers.ModelSerializer):
@@ -10,23 +11,36 @@ class RegionSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'code', 'description', 'site_count', 'created_at']
     
     def get_site_count(self, obj):
+        # Prefer the num_sites annotation from the list queryset
+        if hasattr(obj, 'num_sites'):
+            return obj.num_sites
         return obj.site_set.count()
 
 
 class SiteSerializer(serializers.ModelSerializer):
     region_name = serializers.CharField(source='region.name', read_only=True)
     alarm_count = serializers.SerializerMethodField()
+    worst_severity = serializers.SerializerMethodField()
     
     class Meta:
         model = Site
         fields = [
             'id', 'name', 'code', 'region', 'region_name',
             'latitude', 'longitude', 'status', 'ip_address',
-            'last_ping', 'alarm_count', 'created_at', 'updated_at'
+            'last_ping', 'alarm_count', 'worst_severity', 'created_at', 'updated_at'
         ]
     
     def get_alarm_count(self, obj):
+        # Prefer the num_active_alarms annotation from the view queryset
+        if hasattr(obj, 'num_active_alarms'):
+            return obj.num_active_alarms
         return obj.alarm_set.filter(status='active').count()
+    
+    def get_worst_severity(self, obj):
+        # Worst severity among active alarms, from the site health row
+        if hasattr(obj, 'worst_severity'):
+            return obj.worst_severity
+        return SiteHealth.objects.filter(site=obj).values_list('worst_severity', flat=True).first()
 
 
 class AlarmHistorySerializer(serializers.ModelSerializer):
@@ -37,6 +51,11 @@ class AlarmHistorySerializer(serializers.ModelSerializer):
         fields = ['id', 'action', 'comment', 'user_name', 'created_at']
 
 
+class AlarmHistoryListSerializer(AlarmHistorySerializer):
+    class Meta(AlarmHistorySerializer.Meta):
+        fields = ['id', 'alarm', 'action', 'comment', 'user', 'user_name', 'created_at']
+
+
 class AlarmSerializer(serializers.ModelSerializer):
     site_name = serializers.CharField(source='site.name', read_only=True)
     site_code = serializers.CharField(source='site.code', read_only=True)
@@ -50,9 +69,25 @@ class AlarmSerializer(serializers.ModelSerializer):
             'id', 'site', 'site_name', 'site_code', 'region_name',
             'alarm_type', 'severity', 'status', 'title', 'description',
             'acknowledged_by', 'acknowledged_by_name', 'acknowledged_at',
-            'resolved_at', 'created_at', 'updated_at', 'history'
+            'resolved_at', 'incident', 'occurrence_count', 'last_seen', 'is_flapping',
+            'created_at', 'updated_at', 'history'
+        ]
+        read_only_fields = [
+            'acknowledged_at', 'resolved_at', 'incident', 'occurrence_count', 'last_seen', 'is_flapping'
+        ]
+
+
+class IncidentSerializer(serializers.ModelSerializer):
+    region_name = serializers.CharField(source='region.name', read_only=True)
+    
+    class Meta:
+        model = Incident
+        fields = [
+            'id', 'region', 'region_name', 'alarm_type', 'status', 'title',
+            'latitude', 'longitude', 'alarm_count', 'first_alarm_at',
+            'last_alarm_at', 'resolved_at', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['acknowledged_at', 'resolved_at']
+        read_only_fields = fields
 
 
 class AlarmCreateSerializer(serializers.ModelSerializer):
@@ -60,4 +95,53 @@ class AlarmCreateSerializer(serializers.ModelSerializer):
         model = Alarm
         fields = [
             'site', 'alarm_type', 'severity', 'title', 'description'
-        ]
\ No newline at end of file
+        ]
+
+
+class MetricRuleSerializer(serializers.ModelSerializer):
+    # Shorthand for metric/aggregation/operator/threshold/duration,
+    # e.g. "battery_voltage < 44 for 5m"
+    expression = serializers.CharField(write_only=True, required=False)
+
+    class Meta:
+        model = MetricRule
+        fields = [
+            'id', 'name', 'expression', 'metric', 'aggregation', 'operator', 'threshold',
+            'clear_threshold', 'duration', 'region', 'site', 'alarm_type', 'severity',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
+        extra_kwargs = {
+            'metric': {'required': False},
+            'operator': {'required': False},
+            'threshold': {'required': False},
+        }
+
+    def validate(self, data):
+        expression = data.pop('expression', None)
+        if expression is not None:
+            try:
+                data.update(parse_expression(expression))
+            except ValueError as exc:
+                raise serializers.ValidationError({'expression': [str(exc)]})
+
+        if not self.partial:
+            missing = [field for field in ('metric', 'operator', 'threshold') if field not in data]
+            if missing:
+                raise serializers.ValidationError(
+                    {field: ['This field is required.'] for field in missing}
+                )
+
+        operator = data.get('operator', getattr(self.instance, 'operator', None))
+        threshold = data.get('threshold', getattr(self.instance, 'threshold', None))
+        clear_threshold = data.get('clear_threshold', getattr(self.instance, 'clear_threshold', None))
+        if clear_threshold is not None and operator and threshold is not None:
+            # Hysteresis: clearing must need a value on the far side of the threshold
+            below = operator in ('<', '<=')
+            if (below and clear_threshold < threshold) or (not below and clear_threshold > threshold):
+                raise serializers.ValidationError(
+                    {'clear_threshold': ['Must be on the recovered side of the threshold.']}
+                )
+        if data.get('site') and data.get('region'):
+            raise serializers.ValidationError('A rule applies to a region or a site, not both.')
+        return data
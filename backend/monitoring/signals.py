@@ -0,0 +1,186 @@
+"""
+Alarm change signals for BTS Monitoring System
+
+alarm_states_changed is sent with a list of (old, new) AlarmState pairs
+whenever alarms are created, change state or are deleted, both for single
+saves (bridged from post_save/post_delete) and for bulk writes that bypass
+model signals. A None old state means creation, a None new state deletion.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Region, Site, Alarm, Incident, MetricRule, SiteHealth
+from . import events, health, stats
+from .dedup import get_engine
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+AlarmState = namedtuple('AlarmState', ['id', 'site_id', 'alarm_type', 'severity', 'status', 'title'])
+
+STATE_FIELDS = ('site_id', 'alarm_type', 'severity', 'status', 'title')
+
+# Sent with changes=[(old, new), ...]
+alarm_states_changed = Signal()
+
+_archiving = threading.local()
+
+# Changes whenever metric rules or sites change, so every process's rule
+# engine recompiles; only seen across processes with a shared cache, see
+# RULE_RELOAD_INTERVAL
+RULES_VERSION_KEY = 'monitoring:rules:version'
+
+# Changes whenever sites or regions change, so every process's geospatial
+# site index reloads; only seen across processes with a shared cache, see
+# GEO_RELOAD_INTERVAL
+SITES_VERSION_KEY = 'monitoring:sites:version'
+
+
+def alarm_state(alarm):
+    return AlarmState(
+        alarm.id, alarm.site_id, alarm.alarm_type, alarm.severity, alarm.status, alarm.title
+    )
+
+
+def send_alarm_changes(changes):
+    """
+    Update site health now, in the caller's transaction, and send
+    alarm_states_changed once that transaction commits.
+    """
+    if changes:
+        health.apply_alarm_changes(changes)
+        transaction.on_commit(
+            lambda: alarm_states_changed.send(sender=Alarm, changes=changes)
+        )
+
+
+@contextmanager
+def archiving():
+    """
+    Alarms deleted inside are moving to the archive, not going away, so
+    their deletes send no alarm changes.
+    """
+    _archiving.active = True
+    try:
+        yield
+    finally:
+        _archiving.active = False
+
+
+@receiver(post_init, sender=Alarm)
+def remember_alarm_state(sender, instance, **kwargs):
+    # Deferred fields would cost a query each, so their state stays unknown
+    if instance.pk is None:
+        instance._loaded_state = None
+    elif all(field in instance.__dict__ for field in STATE_FIELDS):
+        instance._loaded_state = alarm_state(instance)
+    else:
+        instance._loaded_state = False
+
+
+@receiver(post_save, sender=Alarm)
+def alarm_saved(sender, instance, created, **kwargs):
+    old = None if created else instance._loaded_state
+    new = alarm_state(instance)
+    instance._loaded_state = new
+
+    if old is False:
+        health.refresh_site_health([instance.site_id])
+        transaction.on_commit(stats.invalidate_snapshot)
+    elif old != new:
+        send_alarm_changes([(old, new)])
+
+
+@receiver(post_delete, sender=Alarm)
+def alarm_deleted(sender, instance, **kwargs):
+    if getattr(_archiving, 'active', False):
+        return
+    # Archived alarms stay counted in their incident, deleted ones do not
+    incident_id = instance.__dict__.get('incident_id')
+    if incident_id is not None:
+        Incident.objects.filter(id=incident_id, alarm_count__gt=0).update(alarm_count=F('alarm_count') - 1)
+    old = instance._loaded_state
+    if old is False:
+        if 'site_id' in instance.__dict__:
+            health.refresh_site_health([instance.site_id])
+        transaction.on_commit(stats.invalidate_snapshot)
+    elif old is not None:
+        send_alarm_changes([(old, None)])
+
+
+def bump_rules_version():
+    cache.set(RULES_VERSION_KEY, time.time_ns(), None)
+
+
+def bump_sites_version():
+    cache.set(SITES_VERSION_KEY, time.time_ns(), None)
+
+
+@receiver(post_save, sender=Site)
+def site_saved(sender, instance, **kwargs):
+    transaction.on_commit(bump_rules_version)
+    transaction.on_commit(bump_sites_version)
+    transaction.on_commit(lambda: stats.apply_site_change(instance))
+
+
+@receiver(post_delete, sender=Site)
+def site_deleted(sender, instance, **kwargs):
+    site_id = instance.id
+    # Deleting the site's alarms may have recreated its health row
+    SiteHealth.objects.filter(site_id=site_id).delete()
+    transaction.on_commit(lambda: stats.remove_site(site_id))
+    transaction.on_commit(bump_rules_version)
+    transaction.on_commit(bump_sites_version)
+
+
+@receiver(post_save, sender=Region)
+@receiver(post_delete, sender=Region)
+def region_changed(sender, **kwargs):
+    transaction.on_commit(bump_sites_version)
+
+
+@receiver(post_save, sender=MetricRule)
+@receiver(post_delete, sender=MetricRule)
+def metric_rule_changed(sender, **kwargs):
+    transaction.on_commit(bump_rules_version)
+
+
+@receiver(alarm_states_changed)
+def update_dashboard_stats(sender, changes, **kwargs):
+    stats.apply_alarm_changes(changes)
+
+
+@receiver(alarm_states_changed)
+def publish_alarm_events(sender, changes, **kwargs):
+    events.publish_alarm_changes(changes)
+
+
+@receiver(alarm_states_changed)
+def update_dedup_index(sender, changes, **kwargs):
+    get_engine().apply_changes(changes, time.time())
+
+
+@receiver(alarm_states_changed)
+def correlate_new_alarms(sender, changes, **kwargs):
+    alarms = [
+        (new.id, new.site_id, new.alarm_type) for old, new in changes
+        if old is None and new is not None and new.alarm_type in settings.CORRELATION_ALARM_TYPES
+    ]
+    if alarms:
+        # Imported here as the task module imports this one
+        from .tasks import correlate_alarms
+        try:
+            correlate_alarms.delay(alarms)
+        except Exception:
+            # The alarms are already stored; never fail their write
+            logger.exception('Failed to queue correlation of %d alarms', len(alarms))
@@ -0,0 +1,201 @@
+"""
+Dashboard statistics snapshot for BTS Monitoring System
+
+The snapshot lives in Django's cache and holds per-site metadata plus active
+alarm counters. It is rebuilt from the database on a cache miss, on request
+(?fresh=1) and periodically by the refresh_dashboard_stats task; in between,
+alarm and site signals apply incremental deltas. The rendered response is
+cached separately so repeated reads cost a single cache lookup.
+
+The cache has no compare-and-set, so every write takes the next number of
+VERSION_KEY with cache.incr and stores it in the snapshot. A writer that
+does not get the version right after its snapshot's raced another one and
+drops the snapshot instead of storing it, and reads only trust a snapshot
+(or rendered response) carrying the current version: an update lost to a
+race costs a recompute rather than a wrong count.
+"""
+
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Site, Incident, SiteHealth
+
+SNAPSHOT_KEY = 'monitoring:dashboard_stats:snapshot'
+RENDERED_KEY = 'monitoring:dashboard_stats:rendered'
+VERSION_KEY = 'monitoring:dashboard_stats:version'
+
+
+def compute_snapshot():
+    sites = {
+        site['id']: [site['name'], site['code'], site['region__name'], site['status']]
+        for site in Site.objects.values('id', 'name', 'code', 'region__name', 'status')
+    }
+
+    # Active alarm counts come from the per-site health rows
+    site_alarms = {}
+    by_type = Counter()
+    by_severity = Counter()
+    for health in SiteHealth.objects.filter(active_count__gt=0):
+        site_alarms[health.site_id] = health.active_count
+        by_type.update(health.type_counts)
+        by_severity.update(health.severity_counts)
+
+    return {
+        'sites': sites,
+        'site_alarms': site_alarms,
+        'by_type': dict(by_type),
+        'by_severity': dict(by_severity),
+        'incidents': Incident.objects.filter(status='open').count(),
+        'computed_at': timezone.now().isoformat(),
+    }
+
+
+def render_snapshot(snapshot):
+    sites = snapshot['sites']
+    site_alarms = snapshot['site_alarms']
+
+    def ranked(counts, key):
+        return [
+            {key: name, 'count': count}
+            for name, count in sorted(counts.items(), key=lambda item: -item[1])
+            if count > 0
+        ]
+
+    region_counts = Counter(site[2] for site in sites.values())
+    top_sites = heapq.nlargest(
+        10,
+        ((count, site_id) for site_id, count in site_alarms.items() if count > 0 and site_id in sites)
+    )
+
+    return {
+        'total_sites': len(sites),
+        'active_sites': sum(1 for site in sites.values() if site[3] == 'active'),
+        'total_alarms': sum(snapshot['by_type'].values()),
+        'critical_alarms': snapshot['by_severity'].get('critical', 0),
+        'active_incidents': snapshot['incidents'],
+        'alarms_by_type': ranked(snapshot['by_type'], 'alarm_type'),
+        'alarms_by_severity': ranked(snapshot['by_severity'], 'severity'),
+        'sites_by_region': ranked(region_counts, 'region__name'),
+        'top_impacted_sites': [
+            {
+                'name': sites[site_id][0],
+                'code': sites[site_id][1],
+                'region': sites[site_id][2],
+                'alarm_count': count
+            }
+            for count, site_id in top_sites
+        ],
+        'computed_at': snapshot['computed_at'],
+    }
+
+
+def next_version():
+    cache.add(VERSION_KEY, 0, None)
+    return cache.incr(VERSION_KEY)
+
+
+def refresh_snapshot():
+    version = next_version()
+    snapshot = compute_snapshot()
+    snapshot['version'] = version
+    cache.set(SNAPSHOT_KEY, snapshot, settings.DASHBOARD_STATS_TTL)
+    return snapshot
+
+
+def invalidate_snapshot():
+    # The new version also outdates any snapshot a writer stores after this
+    next_version()
+    cache.delete_many([SNAPSHOT_KEY, RENDERED_KEY])
+
+
+def update_snapshot(apply):
+    """
+    Apply `apply(snapshot)` to the cached snapshot, or drop the snapshot
+    when another write raced this one. Nothing happens when no snapshot is
+    cached; the next read rebuilds it.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return
+
+    version = next_version()
+    if version != snapshot['version'] + 1:
+        cache.delete_many([SNAPSHOT_KEY, RENDERED_KEY])
+        return
+    apply(snapshot)
+    snapshot['version'] = version
+    cache.set(SNAPSHOT_KEY, snapshot, settings.DASHBOARD_STATS_TTL)
+
+
+def get_snapshot(fresh=False):
+    if not fresh:
+        cached = cache.get_many([SNAPSHOT_KEY, VERSION_KEY])
+        snapshot = cached.get(SNAPSHOT_KEY)
+        if snapshot is not None and snapshot['version'] == cached.get(VERSION_KEY):
+            return snapshot
+    return refresh_snapshot()
+
+
+def get_dashboard_stats(fresh=False):
+    if not fresh:
+        cached = cache.get_many([RENDERED_KEY, VERSION_KEY])
+        version, rendered = cached.get(RENDERED_KEY, (None, None))
+        if rendered is not None and version == cached.get(VERSION_KEY):
+            return rendered
+
+    snapshot = get_snapshot(fresh)
+
+    rendered = render_snapshot(snapshot)
+    cache.set(RENDERED_KEY, (snapshot['version'], rendered), settings.DASHBOARD_STATS_TTL)
+    return rendered
+
+
+def _bump(counts, key, delta):
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_alarm_changes(changes):
+    """
+    Apply (old, new) AlarmState pairs to the cached snapshot.
+
+    Only active alarms are counted, so a pair contributes -1 for an active
+    old state and +1 for an active new state.
+    """
+    def apply(snapshot):
+        for old, new in changes:
+            for state, delta in ((old, -1), (new, 1)):
+                if state is None or state.status != 'active':
+                    continue
+                _bump(snapshot['site_alarms'], state.site_id, delta)
+                _bump(snapshot['by_type'], state.alarm_type, delta)
+                _bump(snapshot['by_severity'], state.severity, delta)
+
+    update_snapshot(apply)
+
+
+def adjust_incidents(delta):
+    def apply(snapshot):
+        snapshot['incidents'] = max(0, snapshot['incidents'] + delta)
+
+    update_snapshot(apply)
+
+
+def apply_site_change(site):
+    def apply(snapshot):
+        snapshot['sites'][site.id] = [site.name, site.code, site.region.name, site.status]
+
+    update_snapshot(apply)
+
+
+def remove_site(site_id):
+    def apply(snapshot):
+        snapshot['sites'].pop(site_id, None)
+        snapshot['site_alarms'].pop(site_id, None)
+
+    update_snapshot(apply)
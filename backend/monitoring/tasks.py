@@ -0,0 +1,74 @@
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import analytics, archive, correlation, health, heartbeats, metrics, prober, stats
+from .dedup import OPEN_STATUSES
+from .models import Incident
+from .signals import SITES_VERSION_KEY
+
+
+@shared_task
+def refresh_dashboard_stats():
+    # Full recompute corrects any drift in the incrementally updated snapshot
+    stats.refresh_snapshot()
+
+
+@shared_task
+def reconcile_site_health():
+    # Corrects rows missed by writes that bypass send_alarm_changes
+    changed = health.rebuild_site_health()
+    if changed:
+        stats.invalidate_snapshot()
+    return changed
+
+
+@shared_task(bind=True, max_retries=None)
+def correlate_alarms(self, alarms):
+    # Routed to CORRELATION_QUEUE; a worker that does not own the clusters
+    # hands the alarms back for the one that does
+    if not self.request.is_eager and not correlation.claim_correlator():
+        raise self.retry(countdown=settings.CORRELATION_RETRY_DELAY)
+    opened = correlation.correlate_alarms(alarms, cache.get(SITES_VERSION_KEY))
+    if opened:
+        stats.adjust_incidents(opened)
+    return opened
+
+
+@shared_task
+def resolve_cleared_incidents():
+    # An incident is over once none of its alarms is open any more
+    resolved = Incident.objects.filter(status='open').exclude(
+        alarms__status__in=OPEN_STATUSES
+    ).update(status='resolved', resolved_at=timezone.now())
+    if resolved:
+        stats.adjust_incidents(-resolved)
+    return resolved
+
+
+@shared_task
+def detect_stale_sites():
+    raised, cleared = heartbeats.detect_stale_sites()
+    return {'raised': raised, 'cleared': cleared}
+
+
+@shared_task
+def probe_sites():
+    summary = prober.probe_sites()
+    return {key: summary[key] for key in ('probed', 'reachable', 'duration')}
+
+
+@shared_task
+def rollup_metrics():
+    return metrics.rollup_metrics()
+
+
+@shared_task
+def refresh_alarm_analytics():
+    return analytics.refresh_analytics()
+
+
+@shared_task
+def archive_alarms():
+    return archive.archive_alarms()
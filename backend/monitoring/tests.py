@@ -0,0 +1,279 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from authentication.models import User
+from . import correlation, stats
+from .archive import archive_alarms
+from .health import rebuild_site_health
+from .heartbeats import HeartbeatBuffer
+from .models import Region, Site, Alarm, AlarmHistory, Incident, SiteHealth
+from .renderers import ORJSONRenderer
+from .signals import alarm_state
+
+
+class AlarmQueryCountTests(APITestCase):
+    """
+    The alarm list and detail endpoints run a fixed number of queries
+    whatever the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='x', role='operator')
+        region = Region.objects.create(name='Centre', code='CEN')
+        sites = [
+            Site.objects.create(
+                name=f'Site {index}', code=f'CEN-{index:03d}', region=region,
+                latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address=f'10.0.0.{index + 1}'
+            )
+            for index in range(3)
+        ]
+        alarms = Alarm.objects.bulk_create([
+            Alarm(
+                site=sites[index % len(sites)], alarm_type='power', severity='major',
+                title=f'Alarm {index}', description='', acknowledged_by=cls.user,
+            )
+            for index in range(60)
+        ])
+        AlarmHistory.objects.bulk_create([
+            AlarmHistory(alarm=alarm, user=cls.user, action='acknowledged') for alarm in alarms
+        ])
+        cls.alarm = alarms[0]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def assert_list_queries(self, count, params):
+        for page_size in (5, 50):
+            with self.subTest(page_size=page_size), self.assertNumQueries(count):
+                response = self.client.get(reverse('alarm-list-create'), {**params, 'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_list(self):
+        # The page, with site, region and acknowledger joined
+        self.assert_list_queries(1, {'pagination': 'cursor'})
+
+    def test_list_with_history(self):
+        # One more query for the whole page's history
+        self.assert_list_queries(2, {'pagination': 'cursor', 'expand': 'history'})
+
+    def test_page_number_list(self):
+        # COUNT(*) and the page; an empty result needs only the count
+        for severity, expected in (('major', 20), ('critical', 0)):
+            with self.subTest(severity=severity), self.assertNumQueries(2 if expected else 1):
+                response = self.client.get(reverse('alarm-list-create'), {'severity': severity})
+            self.assertEqual(len(response.data['results']), expected)
+
+    def test_detail(self):
+        # The alarm with its relations, then its history with users
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('alarm-detail', args=[self.alarm.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['history']), 1)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    def test_indent(self):
+        renderer = ORJSONRenderer()
+        data = {'id': 1, 'history': []}
+        self.assertEqual(renderer.render(data, 'application/json'), b'{"id":1,"history":[]}')
+        expected = b'{\n  "id": 1,\n  "history": []\n}'
+        self.assertEqual(renderer.render(data, 'application/json; indent=4'), expected)
+        self.assertEqual(renderer.render(data, 'application/json', {'indent': 4}), expected)
+
+
+class BulkTransitionFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='x', role='operator')
+        region = Region.objects.create(name='Centre', code='CEN')
+        site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+        Alarm.objects.create(site=site, alarm_type='power', severity='major', title='Mains failure', description='')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_rejects_filters_that_would_match_everything(self):
+        for filters in ({'sites': 'CEN-001'}, {'site': 'CEN-001', 'foo': 'x'}, {'site': ''}, {'site': 1}):
+            with self.subTest(filters=filters):
+                response = self.client.post(reverse('bulk-resolve-alarms'), {'filter': filters}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(Alarm.objects.filter(status='active').count(), 1)
+
+    def test_filter(self):
+        response = self.client.post(reverse('bulk-resolve-alarms'), {'filter': {'site': 'CEN-001'}}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+
+
+class SiteGeoFilterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='x', role='operator')
+        region = Region.objects.create(name='Centre', code='CEN')
+        # One site every 0.01 degrees (about 1.1 km) north of 3.80
+        for index in range(5):
+            Site.objects.create(
+                name=f'Site {index}', code=f'CEN-{index:03d}', region=region,
+                latitude=Decimal('3.80') + Decimal(index) / 100, longitude=Decimal('11.5'),
+                ip_address=f'10.0.0.{index + 1}'
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def codes(self, params):
+        response = self.client.get(reverse('site-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return [site['code'] for site in response.data['results']]
+
+    def test_bbox(self):
+        self.assertEqual(sorted(self.codes({'bbox': '11.4,3.805,11.6,3.835'})), ['CEN-001', 'CEN-002', 'CEN-003'])
+        self.assertEqual(self.codes({'bbox': '179,3,-179,4'}), [])
+
+    def test_near_sorted_by_distance(self):
+        self.assertEqual(
+            self.codes({'near': '3.832,11.5', 'radius_km': '50'}),
+            ['CEN-003', 'CEN-004', 'CEN-002', 'CEN-001', 'CEN-000']
+        )
+        self.assertEqual(self.codes({'near': '3.832,11.5', 'radius_km': '1.5'}), ['CEN-003', 'CEN-004', 'CEN-002'])
+
+
+class SiteHealthTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+
+    def alarm(self, alarm_type, severity):
+        return Alarm.objects.create(
+            site=self.site, alarm_type=alarm_type, severity=severity, title=f'{alarm_type} {severity}', description=''
+        )
+
+    def assert_health(self, worst, active, type_counts):
+        health = SiteHealth.objects.get(site=self.site)
+        self.assertEqual((health.worst_severity, health.active_count, health.type_counts), (worst, active, type_counts))
+
+    def test_deltas(self):
+        power = self.alarm('power', 'major')
+        self.assert_health('major', 1, {'power': 1})
+        ip = self.alarm('ip', 'critical')
+        self.assert_health('critical', 2, {'power': 1, 'ip': 1})
+        ip.status = 'resolved'
+        ip.save()
+        self.assert_health('major', 1, {'power': 1})
+        power.delete()
+        self.assert_health(None, 0, {})
+
+    def test_reconcile(self):
+        self.alarm('power', 'major')
+        SiteHealth.objects.filter(site=self.site).update(active_count=5, power_count=5, worst_severity=None)
+        self.assertEqual(rebuild_site_health(), 1)
+        self.assert_health('major', 1, {'power': 1})
+
+
+class DashboardStatsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def alarm(self):
+        return Alarm.objects.create(
+            site=self.site, alarm_type='power', severity='major', title='Mains failure', description=''
+        )
+
+    def test_raced_update_recomputes(self):
+        self.alarm()
+        self.assertEqual(stats.get_dashboard_stats()['total_alarms'], 1)
+        stale = cache.get(stats.SNAPSHOT_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alarm()
+        with self.assertNumQueries(0):
+            self.assertEqual(stats.get_dashboard_stats()['total_alarms'], 2)
+
+        # A writer that read the snapshot before the last write must not
+        # store its copy, which lacks that write
+        alarm = self.alarm()
+        with mock.patch.object(stats.cache, 'get', return_value=stale):
+            stats.apply_alarm_changes([(None, alarm_state(alarm))])
+        self.assertIsNone(cache.get(stats.SNAPSHOT_KEY))
+        self.assertEqual(stats.get_dashboard_stats()['total_alarms'], 3)
+
+
+class CorrelationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.sites = [
+            Site.objects.create(
+                name=f'Site {index}', code=f'CEN-{index:03d}', region=region,
+                latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address=f'10.0.0.{index + 1}'
+            )
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        correlation._correlator = None
+
+    def correlate(self):
+        alarms = Alarm.objects.bulk_create([
+            Alarm(site=site, alarm_type='power', severity='major', title='Mains failure', description='')
+            for site in self.sites
+        ])
+        correlation.correlate_alarms([(alarm.id, alarm.site_id, alarm.alarm_type) for alarm in alarms])
+        return Incident.objects.get()
+
+    def test_single_owner(self):
+        self.assertTrue(correlation.claim_correlator())
+        self.assertTrue(correlation.claim_correlator())
+        cache.set(correlation.CORRELATOR_OWNER_KEY, 'other-host:1')
+        self.assertFalse(correlation.claim_correlator())
+
+    def test_deleted_alarms_leave_the_count(self):
+        incident = self.correlate()
+        self.assertEqual(incident.alarm_count, 3)
+        incident.alarms.first().delete()
+        incident.refresh_from_db()
+        self.assertEqual(incident.alarm_count, 2)
+
+        incident.alarms.update(status='resolved')
+        archive_alarms(timezone.now() + timedelta(days=365))
+        incident.refresh_from_db()
+        self.assertEqual(incident.alarm_count, 2)
+
+
+class HeartbeatFlushTests(TransactionTestCase):
+    def test_timer_flushes_without_another_ping(self):
+        region = Region.objects.create(name='Centre', code='CEN')
+        site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+        buffer = HeartbeatBuffer(flush_interval=0.5)
+        now = timezone.now()
+        self.assertEqual(buffer.record([('CEN-001', now)]), [])
+        buffer.timer.join(5)
+        site.refresh_from_db()
+        self.assertEqual(site.last_ping, now)
+        self.assertIsNone(buffer.timer)
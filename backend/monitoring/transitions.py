@@ -0,0 +1,60 @@
+"""
+Alarm state transitions for BTS Monitoring System
+
+TRANSITIONS is the alarm state machine: each action moves alarms from a
+set of statuses to one target status. transition_alarms() applies an action
+to any number of alarms in one transaction: the rows allowed to move are
+locked, changed with a single conditional UPDATE and, when a user acts,
+given one history row each through bulk_create.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Alarm, AlarmHistory
+from .signals import AlarmState, send_alarm_changes
+
+# action -> (statuses it applies to, resulting status, history action)
+TRANSITIONS = {
+    'acknowledge': (('active',), 'acknowledged', 'acknowledged'),
+    'resolve': (('active', 'acknowledged'), 'resolved', 'resolved'),
+}
+
+
+def transition_alarms(queryset, action, now=None, user=None, comment=''):
+    """
+    Apply `action` to the alarms in `queryset` whose status allows it.
+    Returns the ids of the alarms that moved; the rest are left untouched.
+    """
+    sources, target, history_action = TRANSITIONS[action]
+    now = now or timezone.now()
+    updates = {'status': target, 'updated_at': now}
+    if action == 'acknowledge':
+        updates.update(acknowledged_by=user, acknowledged_at=now)
+    else:
+        updates['resolved_at'] = now
+
+    with transaction.atomic():
+        # Lock through an id subquery so filters joining other tables do
+        # not lock sites or regions too
+        rows = list(Alarm.objects.select_for_update().filter(
+            id__in=queryset.values('id'), status__in=sources
+        ).order_by('id').values_list('id', 'site_id', 'alarm_type', 'severity', 'status', 'title'))
+        if not rows:
+            return []
+
+        ids = [row[0] for row in rows]
+        Alarm.objects.filter(id__in=ids, status__in=sources).update(**updates)
+        if user is not None:
+            AlarmHistory.objects.bulk_create([
+                AlarmHistory(alarm_id=alarm_id, user=user, action=history_action, comment=comment)
+                for alarm_id in ids
+            ], batch_size=settings.ALARM_BULK_BATCH_SIZE)
+
+        changes = []
+        for row in rows:
+            old = AlarmState(*row)
+            changes.append((old, old._replace(status=target)))
+        send_alarm_changes(changes)
+    return ids
@@ -3,11 +3,28 @@ from . import views
 
 urlpatterns = [
     path('regions/', views.RegionListView.as_view(), name='region-list'),
+    path('regions/health/', views.region_health, name='region-health'),
     path('sites/', views.SiteListView.as_view(), name='site-list'),
     path('sites/<int:pk>/', views.SiteDetailView.as_view(), name='site-detail'),
+    path('sites/heartbeats/', views.site_heartbeats, name='site-heartbeats'),
+    path('sites/clusters/', views.site_clusters, name='site-clusters'),
+    path('sites/probes/', views.site_probes, name='site-probes'),
+    path('sites/metrics/', views.ingest_site_metrics, name='site-metrics-ingest'),
+    path('sites/<int:site_id>/metrics/', views.site_metrics, name='site-metrics'),
     path('alarms/', views.AlarmListCreateView.as_view(), name='alarm-list-create'),
+    path('alarms/export/<str:export_format>/', views.export_alarms, name='alarm-export'),
+    path('alarms/bulk/', views.bulk_ingest_alarms, name='alarm-bulk-ingest'),
+    path('alarms/acknowledge/', views.bulk_acknowledge_alarms, name='bulk-acknowledge-alarms'),
+    path('alarms/resolve/', views.bulk_resolve_alarms, name='bulk-resolve-alarms'),
     path('alarms/<int:pk>/', views.AlarmDetailView.as_view(), name='alarm-detail'),
     path('alarms/<int:alarm_id>/acknowledge/', views.acknowledge_alarm, name='acknowledge-alarm'),
     path('alarms/<int:alarm_id>/resolve/', views.resolve_alarm, name='resolve-alarm'),
+    path('incidents/', views.IncidentListView.as_view(), name='incident-list'),
+    path('incidents/<int:pk>/', views.IncidentDetailView.as_view(), name='incident-detail'),
+    path('rules/', views.MetricRuleListCreateView.as_view(), name='metric-rule-list-create'),
+    path('rules/<int:pk>/', views.MetricRuleDetailView.as_view(), name='metric-rule-detail'),
+    path('history/', views.AlarmHistoryListView.as_view(), name='alarm-history-list'),
+    path('history/export/<str:export_format>/', views.export_history, name='alarm-history-export'),
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('analytics/', views.analytics, name='analytics'),
 ]
\ No newline at end of file
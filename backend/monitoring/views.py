@@ -1,35 +1,142 @@
+from collections import Counter
+from datetime import date, timedelta
+
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from django.db.models import Count, Q
+from django.conf import settings
+from django.db.models import Count, F, Prefetch
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.utils import timezone
-from .models import Region, Site, Alarm, AlarmHistory
+from .models import Region, Site, Alarm, AlarmHistory, ArchivedAlarm, ArchivedAlarmHistory, Incident, MetricRule
+from .ingestion import ingest_alarms, store_alarms
+from .heartbeats import get_buffer, parse_ping_time
+from .prober import get_probe_summary
+from .metrics import METRICS, record_metrics, metric_series
+from .stats import get_dashboard_stats, get_snapshot
+from . import health
+from .geo import get_site_index, bbox_filter, distance_km, near_filter, parse_bbox, parse_point
+from .analytics import alarm_analytics
+from .transitions import transition_alarms
+from .archive import include_archived
+from .exports import FORMATS, ALARM_COLUMNS, HISTORY_COLUMNS, stream_export
+from .parsers import NDJSONParser
+from .pagination import SelectablePagination
+from .rows import ALARM_ROWS, HISTORY_ROWS
 from .serializers import (
     RegionSerializer, SiteSerializer, AlarmSerializer, 
-    AlarmCreateSerializer, AlarmHistorySerializer
+    AlarmCreateSerializer, AlarmHistorySerializer, AlarmHistoryListSerializer,
+    IncidentSerializer, MetricRuleSerializer
 )
 
 
+def alarm_queryset():
+    # Join site/region/acknowledger and prefetch history with its users so
+    # AlarmSerializer renders a page in a fixed number of queries
+    return Alarm.objects.select_related(
+        'site__region', 'acknowledged_by'
+    ).prefetch_related(
+        Prefetch('history', queryset=AlarmHistory.objects.select_related('user'))
+    )
+
+
+ALARM_FILTERS = ('site', 'type', 'severity', 'status', 'region')
+
+
+def filter_alarms(queryset, params):
+    # Query filters shared by the alarm list and its export, see ALARM_FILTERS
+    site = params.get('site')
+    alarm_type = params.get('type')
+    severity = params.get('severity')
+    status_filter = params.get('status')
+    region = params.get('region')
+
+    if site:
+        queryset = queryset.filter(site__code=site)
+    if alarm_type:
+        queryset = queryset.filter(alarm_type=alarm_type)
+    if severity:
+        queryset = queryset.filter(severity=severity)
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if region:
+        queryset = queryset.filter(site__region__code=region)
+    return queryset
+
+
+def filter_history(queryset, params):
+    alarm = params.get('alarm')
+    user = params.get('user')
+    action = params.get('action')
+
+    if alarm:
+        queryset = queryset.filter(alarm_id=alarm)
+    if user:
+        queryset = queryset.filter(user_id=user)
+    if action:
+        queryset = queryset.filter(action=action)
+    return queryset
+
+
+def site_queryset():
+    # Alarm counts and worst severity come from the joined site health row
+    # instead of aggregating alarms per site
+    return Site.objects.select_related('region').annotate(
+        num_active_alarms=Coalesce('health__active_count', 0),
+        worst_severity=F('health__worst_severity'),
+    )
+
+
 class RegionListView(generics.ListAPIView):
-    queryset = Region.objects.all()
+    queryset = Region.objects.annotate(num_sites=Count('site'))
     serializer_class = RegionSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def region_health(request):
+    # Rolled up from the per-site health rows, no alarm aggregation
+    return Response(health.region_health())
+
+
 class SiteListView(generics.ListCreateAPIView):
     queryset = Site.objects.all()
     serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Site.objects.all()
+        queryset = site_queryset()
         region = self.request.query_params.get('region')
         status_filter = self.request.query_params.get('status')
+        bbox = self.request.query_params.get('bbox')
+        near = self.request.query_params.get('near')
         
         if region:
             queryset = queryset.filter(region__code=region)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
+        # ?bbox=min_lon,min_lat,max_lon,max_lat and ?near=lat,lon&radius_km=,
+        # the latter nearest first
+        if bbox:
+            try:
+                queryset = queryset.filter(bbox_filter(parse_bbox(bbox)))
+            except ValueError as exc:
+                raise ValidationError({'bbox': [str(exc)]})
+        if near:
+            try:
+                latitude, longitude = parse_point(near)
+                radius = float(self.request.query_params.get('radius_km', settings.GEO_NEAR_RADIUS_KM))
+            except ValueError as exc:
+                raise ValidationError({'near': [str(exc)]})
+            if not 0 < radius <= settings.GEO_MAX_RADIUS_KM:
+                raise ValidationError({'radius_km': [f'Must be between 0 and {settings.GEO_MAX_RADIUS_KM}.']})
+            queryset = queryset.filter(near_filter(latitude, radius)).annotate(
+                distance_km=distance_km(latitude, longitude)
+            ).filter(distance_km__lte=radius).order_by('distance_km', 'id')
             
         return queryset
 
@@ -38,11 +145,15 @@ class SiteDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Site.objects.all()
     serializer_class = SiteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return site_queryset()
 
 
 class AlarmListCreateView(generics.ListCreateAPIView):
     queryset = Alarm.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SelectablePagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -50,124 +161,427 @@ class AlarmListCreateView(generics.ListCreateAPIView):
         return AlarmSerializer
     
     def get_queryset(self):
-        queryset = Alarm.objects.all()
+        return filter_alarms(alarm_queryset(), self.request.query_params)
+    
+    def list(self, request, *args, **kwargs):
+        # Rendered from .values() rows; ?expand=history nests the history
+        archive = None
+        if include_archived(request.query_params):
+            archive = filter_alarms(ArchivedAlarm.objects.all(), request.query_params)
+        return ALARM_ROWS.list_response(self, self.get_queryset(), archive)
+    
+    def perform_create(self, serializer):
+        # Route through the dedup engine so repeats fold into the open alarm
+        [(_, alarm_id)] = store_alarms([Alarm(**serializer.validated_data)])
+        serializer.instance = Alarm.objects.get(id=alarm_id)
+
+
+class AlarmDetailView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = Alarm.objects.all()
+    serializer_class = AlarmSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return alarm_queryset()
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not include_archived(request.query_params):
+                raise
+        # Archived alarms are read-only and rendered like the list rows
+        row = ArchivedAlarm.objects.filter(pk=kwargs['pk']).values(
+            *ALARM_ROWS.lookups(ALARM_ROWS.fields)
+        ).first()
+        if row is None:
+            raise Http404
+        [alarm] = ALARM_ROWS.render([row], list(ALARM_ROWS.fields), ['history'], request, archived=True)
+        return Response(alarm)
+
+
+class AlarmHistoryListView(generics.ListAPIView):
+    serializer_class = AlarmHistoryListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SelectablePagination
+    
+    def get_queryset(self):
+        return filter_history(AlarmHistory.objects.select_related('user'), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        archive = None
+        if include_archived(request.query_params):
+            archive = filter_history(ArchivedAlarmHistory.objects.all(), request.query_params)
+        return HISTORY_ROWS.list_response(self, self.get_queryset(), archive)
+
+
+class IncidentListView(generics.ListAPIView):
+    serializer_class = IncidentSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SelectablePagination
+    
+    def get_queryset(self):
+        queryset = Incident.objects.select_related('region')
         
         # Filter parameters
-        site = self.request.query_params.get('site')
-        alarm_type = self.request.query_params.get('type')
-        severity = self.request.query_params.get('severity')
         status_filter = self.request.query_params.get('status')
+        alarm_type = self.request.query_params.get('type')
         region = self.request.query_params.get('region')
         
-        if site:
-            queryset = queryset.filter(site__code=site)
-        if alarm_type:
-            queryset = queryset.filter(alarm_type=alarm_type)
-        if severity:
-            queryset = queryset.filter(severity=severity)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
+        if alarm_type:
+            queryset = queryset.filter(alarm_type=alarm_type)
         if region:
-            queryset = queryset.filter(site__region__code=region)
+            queryset = queryset.filter(region__code=region)
             
         return queryset
 
 
-class AlarmDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Alarm.objects.all()
-    serializer_class = AlarmSerializer
+class MetricRuleListCreateView(generics.ListCreateAPIView):
+    serializer_class = MetricRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = MetricRule.objects.all()
+        metric = self.request.query_params.get('metric')
+        if metric:
+            queryset = queryset.filter(metric=metric)
+        return queryset
+
+
+class MetricRuleDetailView(generics.RetrieveUpdateDestroyAPIView):
+    queryset = MetricRule.objects.all()
+    serializer_class = MetricRuleSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class IncidentDetailView(generics.RetrieveAPIView):
+    queryset = Incident.objects.select_related('region')
+    serializer_class = IncidentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def acknowledge_alarm(request, alarm_id):
-    try:
-        alarm = Alarm.objects.get(id=alarm_id)
-        alarm.status = 'acknowledged'
-        alarm.acknowledged_by = request.user
-        alarm.acknowledged_at = timezone.now()
-        alarm.save()
-        
-        # Create history entry
-        AlarmHistory.objects.create(
-            alarm=alarm,
-            user=request.user,
-            action='acknowledged',
-            comment=request.data.get('comment', '')
+@parser_classes([JSONParser, NDJSONParser])
+def bulk_ingest_alarms(request):
+    items = request.data
+    if isinstance(items, dict):
+        items = items.get('alarms')
+    if not isinstance(items, list):
+        return Response(
+            {'error': 'Expected a list of alarms or an object with an "alarms" list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(items) > settings.ALARM_BULK_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.ALARM_BULK_MAX_ITEMS} alarms per request'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        
-        return Response({'message': 'Alarm acknowledged successfully'})
-    except Alarm.DoesNotExist:
-        return Response({'error': 'Alarm not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    results = ingest_alarms(items)
+    counts = Counter(result['status'] for result in results)
+    stored = len(results) - counts['error']
+
+    return Response({
+        'created': counts['created'],
+        'duplicate': counts['duplicate'],
+        'reopened': counts['reopened'],
+        'failed': counts['error'],
+        'results': results
+    }, status=status.HTTP_201_CREATED if stored else status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
-def resolve_alarm(request, alarm_id):
+@parser_classes([JSONParser, NDJSONParser])
+def site_heartbeats(request):
+    """
+    Accept a batch of pings, each a site code or IP address or an object
+    {"site": ..., "timestamp": unix seconds or ISO 8601}.
+    """
+    items = request.data
+    if isinstance(items, dict):
+        items = items.get('pings')
+    if not isinstance(items, list):
+        return Response(
+            {'error': 'Expected a list of pings or an object with a "pings" list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(items) > settings.HEARTBEAT_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.HEARTBEAT_MAX_ITEMS} pings per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    now = timezone.now()
+    pings = []
     try:
-        alarm = Alarm.objects.get(id=alarm_id)
-        alarm.status = 'resolved'
-        alarm.resolved_at = timezone.now()
-        alarm.save()
-        
-        # Create history entry
-        AlarmHistory.objects.create(
-            alarm=alarm,
-            user=request.user,
-            action='resolved',
-            comment=request.data.get('comment', '')
+        for item in items:
+            if isinstance(item, dict):
+                pings.append((str(item.get('site', '')), parse_ping_time(item.get('timestamp'), now)))
+            else:
+                pings.append((str(item), now))
+    except (TypeError, ValueError, OverflowError, OSError) as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    unknown = get_buffer().record(pings)
+    return Response({
+        'accepted': len(pings) - len(unknown),
+        'unknown': sorted(set(unknown)),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def site_clusters(request):
+    """
+    ?zoom=0-20 (required), optional &bbox=min_lon,min_lat,max_lon,max_lat
+    and &region=CODE. Sites grouped into map clusters with their active
+    alarm counts; single-site clusters carry the site id and code.
+    """
+    try:
+        zoom = int(request.query_params.get('zoom', ''))
+    except ValueError:
+        return Response({'error': 'zoom must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 0 <= zoom <= 20:
+        return Response({'error': 'zoom must be between 0 and 20'}, status=status.HTTP_400_BAD_REQUEST)
+    bbox = request.query_params.get('bbox')
+    try:
+        bbox = parse_bbox(bbox) if bbox else None
+    except ValueError as exc:
+        return Response({'error': f'Invalid bbox: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    cell, clusters = get_site_index().clusters(
+        zoom, bbox, request.query_params.get('region'), get_snapshot()['site_alarms']
+    )
+    return Response({'zoom': zoom, 'cell_degrees': cell, 'clusters': clusters})
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def site_probes(request):
+    summary = get_probe_summary()
+    if summary is None:
+        return Response({'error': 'No probe sweep has run yet'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(summary)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def ingest_site_metrics(request):
+    items = request.data
+    if isinstance(items, dict):
+        items = items.get('samples')
+    if not isinstance(items, list):
+        return Response(
+            {'error': 'Expected a list of samples or an object with a "samples" list'},
+            status=status.HTTP_400_BAD_REQUEST
         )
-        
-        return Response({'message': 'Alarm resolved successfully'})
-    except Alarm.DoesNotExist:
+    if len(items) > settings.METRIC_MAX_ITEMS:
+        return Response(
+            {'error': f'At most {settings.METRIC_MAX_ITEMS} samples per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    stored, errors = record_metrics(items)
+    return Response({
+        'stored': stored,
+        'failed': len(errors),
+        'errors': errors
+    }, status=status.HTTP_201_CREATED if stored or not errors else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def site_metrics(request, site_id):
+    """
+    ?metric=latency&start=...&end=... (ISO 8601 or unix seconds, default the
+    last 24 hours). The resolution is picked from the range unless given.
+    """
+    if not Site.objects.filter(id=site_id).exists():
+        return Response({'error': 'Site not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    metric = request.query_params.get('metric', 'latency')
+    if metric not in METRICS:
+        return Response({'error': f'Unknown metric "{metric}"'}, status=status.HTTP_400_BAD_REQUEST)
+
+    now = timezone.now()
+    try:
+        end = parse_ping_time(request.query_params.get('end'), now)
+        start = request.query_params.get('start')
+        start = parse_ping_time(start, end) if start else end - timedelta(days=1)
+        resolution = request.query_params.get('resolution')
+        resolution = int(resolution) if resolution else None
+    except (TypeError, ValueError, OverflowError, OSError):
+        return Response({'error': 'Invalid start, end or resolution'}, status=status.HTTP_400_BAD_REQUEST)
+    if start >= end:
+        return Response({'error': 'start must be before end'}, status=status.HTTP_400_BAD_REQUEST)
+    if resolution is not None and resolution != 0 and resolution not in settings.METRIC_ROLLUPS:
+        return Response(
+            {'error': f'resolution must be 0 (raw) or one of {settings.METRIC_ROLLUPS}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    resolution, points = metric_series(site_id, metric, start, end, resolution)
+    return Response({
+        'site': site_id,
+        'metric': metric,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'resolution': resolution,
+        'columns': ['timestamp', 'avg', 'min', 'max'],
+        'points': points,
+    })
+
+
+def single_alarm_action(request, alarm_id, action):
+    alarms = Alarm.objects.filter(id=alarm_id)
+    if transition_alarms(alarms, action, user=request.user, comment=request.data.get('comment', '')):
+        return None
+    current = alarms.values_list('status', flat=True).first()
+    if current is None and ArchivedAlarm.objects.filter(id=alarm_id).exists():
+        current = 'archived'
+    if current is None:
         return Response({'error': 'Alarm not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(
+        {'error': f'Cannot {action} an alarm that is {current}'}, status=status.HTTP_409_CONFLICT
+    )
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def acknowledge_alarm(request, alarm_id):
+    return single_alarm_action(request, alarm_id, 'acknowledge') or Response(
+        {'message': 'Alarm acknowledged successfully'}
+    )
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def resolve_alarm(request, alarm_id):
+    return single_alarm_action(request, alarm_id, 'resolve') or Response(
+        {'message': 'Alarm resolved successfully'}
+    )
+
+
+def bulk_transition(request, action):
+    """
+    Body {"ids": [...]} or {"filter": {...alarm list filters}}, plus an
+    optional "comment". Alarms whose status does not allow the action are
+    skipped and reported.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    ids = data.get('ids')
+    filters = data.get('filter')
+    comment = data.get('comment', '')
+    if (ids is None) == (filters is None):
+        return Response({'error': 'Provide either "ids" or "filter"'}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(comment, str):
+        return Response({'error': '"comment" must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if ids is not None:
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(alarm_id, int) and not isinstance(alarm_id, bool) for alarm_id in ids)):
+            return Response({'error': '"ids" must be a non-empty list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.ALARM_BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {settings.ALARM_BULK_MAX_ITEMS} alarms per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = Alarm.objects.filter(id__in=ids)
+    else:
+        if not isinstance(filters, dict) or not filters:
+            return Response({'error': '"filter" must be a non-empty object'}, status=status.HTTP_400_BAD_REQUEST)
+        # An unknown key or empty value would be ignored and widen the
+        # update to every alarm
+        unknown = sorted(key for key in filters if key not in ALARM_FILTERS)
+        if unknown:
+            return Response(
+                {'error': f'Unknown filter keys: {", ".join(unknown)}; expected {", ".join(ALARM_FILTERS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(isinstance(value, str) and value for value in filters.values()):
+            return Response({'error': 'Filter values must be non-empty strings'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filter_alarms(Alarm.objects.all(), filters)
+
+    changed = transition_alarms(queryset, action, user=request.user, comment=comment)
+    result = {'updated': len(changed)}
+    if ids is not None:
+        changed = set(changed)
+        existing = set(queryset.values_list('id', flat=True))
+        result['skipped'] = sorted(alarm_id for alarm_id in existing if alarm_id not in changed)
+        result['not_found'] = sorted(set(ids) - existing)
+    return Response(result)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_acknowledge_alarms(request):
+    return bulk_transition(request, 'acknowledge')
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def bulk_resolve_alarms(request):
+    return bulk_transition(request, 'resolve')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_alarms(request, export_format):
+    """
+    Stream every alarm matching the list filters as CSV or NDJSON.
+    """
+    if export_format not in FORMATS:
+        return Response({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = filter_alarms(Alarm.objects.order_by('-created_at', '-id'), request.query_params)
+    archive = None
+    if include_archived(request.query_params):
+        archive = filter_alarms(ArchivedAlarm.objects.order_by('-created_at', '-id'), request.query_params)
+    return stream_export(queryset, ALARM_COLUMNS, export_format, 'alarms', archive)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_history(request, export_format):
+    if export_format not in FORMATS:
+        return Response({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = filter_history(AlarmHistory.objects.order_by('-created_at', '-id'), request.query_params)
+    archive = None
+    if include_archived(request.query_params):
+        archive = filter_history(ArchivedAlarmHistory.objects.order_by('-created_at', '-id'), request.query_params)
+    return stream_export(queryset, HISTORY_COLUMNS, export_format, 'alarm-history', archive)
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def dashboard_stats(request):
-    # Get basic counts
-    total_sites = Site.objects.count()
-    active_sites = Site.objects.filter(status='active').count()
-    total_alarms = Alarm.objects.filter(status='active').count()
-    critical_alarms = Alarm.objects.filter(status='active', severity='critical').count()
-    
-    # Alarms by type
-    alarms_by_type = Alarm.objects.filter(status='active').values('alarm_type').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Alarms by severity
-    alarms_by_severity = Alarm.objects.filter(status='active').values('severity').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Sites by region
-    sites_by_region = Site.objects.values('region__name').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Top impacted sites
-    top_impacted_sites = Site.objects.annotate(
-        alarm_count=Count('alarm', filter=Q(alarm__status='active'))
-    ).filter(alarm_count__gt=0).order_by('-alarm_count')[:10]
-    
-    return Response({
-        'total_sites': total_sites,
-        'active_sites': active_sites,
-        'total_alarms': total_alarms,
-        'critical_alarms': critical_alarms,
-        'alarms_by_type': list(alarms_by_type),
-        'alarms_by_severity': list(alarms_by_severity),
-        'sites_by_region': list(sites_by_region),
-        'top_impacted_sites': [
-            {
-                'name': site.name,
-                'code': site.code,
-                'region': site.region.name,
-                'alarm_count': site.alarm_count
-            }
-            for site in top_impacted_sites
-        ]
-    })
\ No newline at end of file
+    # Served from the cached snapshot; ?fresh=1 recomputes it from the database
+    fresh = request.query_params.get('fresh') in ('1', 'true')
+    return Response(get_dashboard_stats(fresh=fresh))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def analytics(request):
+    """
+    ?start=YYYY-MM-DD&end=YYYY-MM-DD (default the last 30 days), optionally
+    &region=CODE&type=ALARM_TYPE. Served from the daily rollup tables.
+    """
+    today = timezone.localdate()
+    try:
+        end = date.fromisoformat(request.query_params.get('end') or today.isoformat())
+        start = date.fromisoformat(request.query_params.get('start') or (end - timedelta(days=29)).isoformat())
+    except ValueError:
+        return Response({'error': 'Dates must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(alarm_analytics(
+        start, end,
+        region=request.query_params.get('region'),
+        alarm_type=request.query_params.get('type'),
+    ))
@@ -0,0 +1 @@
+# This makes Python treat the directory as a package
\ No newline at end of file
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'channel', 'event', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('channel', 'status', 'event')
+    search_fields = ('recipient__username', 'message')
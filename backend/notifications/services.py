@@ -0,0 +1,98 @@
+"""
+Notification queueing for BTS Monitoring System
+
+Events only insert Notification rows; the digest tasks later send one
+message per recipient and channel covering everything queued meanwhile.
+"""
+
+import base64
+import logging
+import time
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+DIGEST_SCHEDULED_KEY = 'notifications:digest-scheduled'
+
+
+def queue_notifications(notifications):
+    """
+    Queue (recipient, event, message) notifications on every channel the
+    recipient can receive. Recipients are dicts with 'id', 'email' and 'phone'.
+    """
+    rows = []
+    for recipient, event, message in notifications:
+        if recipient.get('email'):
+            rows.append(Notification(
+                recipient_id=recipient['id'], channel='email', event=event, message=message
+            ))
+        if recipient.get('phone'):
+            rows.append(Notification(
+                recipient_id=recipient['id'], channel='sms', event=event, message=message
+            ))
+
+    if rows:
+        Notification.objects.bulk_create(rows)
+        schedule_digest()
+    return len(rows)
+
+
+def schedule_digest():
+    # At most one digest run is scheduled per window
+    if cache.add(DIGEST_SCHEDULED_KEY, True, settings.NOTIFICATION_DIGEST_WINDOW):
+        transaction.on_commit(start_digest)
+
+
+def start_digest():
+    from .tasks import send_digests
+    try:
+        send_digests.apply_async(countdown=settings.NOTIFICATION_DIGEST_WINDOW)
+    except Exception:
+        # Rows stay pending and go out with the next digest
+        cache.delete(DIGEST_SCHEDULED_KEY)
+        logger.exception('Failed to schedule notification digest')
+
+
+def take_quota(channel, wanted):
+    """
+    Reserve up to `wanted` sends from the channel's per-minute budget.
+    """
+    limit = settings.NOTIFICATION_RATE_LIMITS[channel]
+    key = f'notifications:quota:{channel}:{int(time.time() // 60)}'
+    cache.add(key, 0, 120)
+    used = cache.incr(key, wanted)
+    return max(0, min(wanted, limit - (used - wanted)))
+
+
+def digest_text(notifications):
+    lines = [notification.message for notification in notifications]
+    if len(lines) == 1:
+        return lines[0]
+    return f'{len(lines)} notifications:\n' + '\n'.join(f'- {line}' for line in lines)
+
+
+def send_sms(phone, body):
+    """
+    Send one SMS through the Twilio REST API, or log it when Twilio is not
+    configured (simulation mode).
+    """
+    if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
+        logger.info('SMS (simulated) to %s: %s', phone, body)
+        return
+
+    url = f'https://api.twilio.com/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json'
+    credentials = f'{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}'.encode()
+    request = Request(url, data=urlencode({
+        'From': settings.TWILIO_PHONE_NUMBER,
+        'To': phone,
+        'Body': body[:settings.SMS_MAX_LENGTH],
+    }).encode(), headers={'Authorization': 'Basic ' + base64.b64encode(credentials).decode()})
+    with urlopen(request, timeout=10):
+        pass
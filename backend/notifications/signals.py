@@ -0,0 +1,134 @@
+"""
+Notification triggers for alarm and ticket events
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from monitoring.models import Site
+from monitoring.signals import alarm_states_changed
+from tickets.models import Ticket
+from tickets.signals import tickets_created
+from .services import queue_notifications
+
+User = get_user_model()
+
+RECIPIENT_FIELDS = ('id', 'email', 'phone')
+
+
+@receiver(alarm_states_changed)
+def notify_new_alarms(sender, changes, **kwargs):
+    """
+    Tell the members of the responsible teams about new alarms of the
+    notified severities, with one notification per member for the whole
+    batch.
+    """
+    created = [new for old, new in changes if old is None and new is not None
+               and new.severity in settings.NOTIFICATION_SEVERITIES
+               and new.alarm_type in settings.ALARM_TEAM_TYPES]
+    if not created:
+        return
+
+    members = {}
+    for user in User.objects.filter(
+        is_active=True, team__is_active=True,
+        team__team_type__in={settings.ALARM_TEAM_TYPES[state.alarm_type] for state in created}
+    ).values('team__team_type', *RECIPIENT_FIELDS):
+        members.setdefault(user.pop('team__team_type'), []).append(user)
+
+    site_codes = dict(Site.objects.filter(
+        id__in={state.site_id for state in created}
+    ).values_list('id', 'code'))
+
+    lines = {}
+    for state in created:
+        lines.setdefault(settings.ALARM_TEAM_TYPES[state.alarm_type], []).append(
+            f'[{state.severity.upper()}] {site_codes.get(state.site_id, state.site_id)}: {state.title}'
+        )
+
+    queue_notifications(
+        (member, 'alarm_created', alarm_batch_message(lines[team_type]))
+        for team_type, team_members in members.items()
+        for member in team_members
+    )
+
+
+def alarm_batch_message(lines):
+    if len(lines) == 1:
+        return lines[0]
+    limit = settings.NOTIFICATION_ALARM_LINES
+    message = f'{len(lines)} new alarms:\n' + '\n'.join(lines[:limit])
+    if len(lines) > limit:
+        message += f'\n... and {len(lines) - limit} more'
+    return message
+
+
+def created_ticket_notifications(tickets):
+    """
+    Notify each ticket's assignee, or its whole team while nobody is assigned.
+    """
+    user_ids = {ticket.assigned_to_id for ticket in tickets if ticket.assigned_to_id}
+    team_ids = {ticket.team_id for ticket in tickets if ticket.team_id and not ticket.assigned_to_id}
+    if not user_ids and not team_ids:
+        return []
+
+    users = {}
+    team_members = {}
+    for user in User.objects.filter(
+        Q(id__in=user_ids) | Q(team_id__in=team_ids), is_active=True
+    ).values('team_id', *RECIPIENT_FIELDS):
+        team_members.setdefault(user.pop('team_id'), []).append(user)
+        users[user['id']] = user
+
+    notifications = []
+    for ticket in tickets:
+        if ticket.assigned_to_id:
+            recipients = [users[ticket.assigned_to_id]] if ticket.assigned_to_id in users else []
+        else:
+            recipients = team_members.get(ticket.team_id, [])
+        notifications += [
+            (recipient, 'ticket_created', f'New ticket #{ticket.id}: {ticket.title}')
+            for recipient in recipients
+        ]
+    return notifications
+
+
+@receiver(tickets_created)
+def notify_created_tickets(sender, tickets, **kwargs):
+    queue_notifications(created_ticket_notifications(tickets))
+
+
+@receiver(post_init, sender=Ticket)
+def remember_ticket_state(sender, instance, **kwargs):
+    instance._notified_state = (instance.assigned_to_id, instance.status) if instance.pk else None
+
+
+@receiver(post_save, sender=Ticket)
+def notify_ticket_change(sender, instance, created, **kwargs):
+    old = None if created else instance._notified_state
+    instance._notified_state = (instance.assigned_to_id, instance.status)
+
+    notifications = []
+    if created:
+        notifications += created_ticket_notifications([instance])
+    elif old is not None:
+        old_assignee, old_status = old
+        if instance.assigned_to_id and instance.assigned_to_id != old_assignee:
+            notifications += [
+                (recipient, 'ticket_assigned', f'Ticket #{instance.id} assigned to you: {instance.title}')
+                for recipient in User.objects.filter(
+                    id=instance.assigned_to_id, is_active=True
+                ).values(*RECIPIENT_FIELDS)
+            ]
+        if instance.status == 'resolved' and old_status != 'resolved':
+            notifications += [
+                (recipient, 'ticket_resolved', f'Ticket #{instance.id} resolved: {instance.title}')
+                for recipient in User.objects.filter(
+                    id=instance.created_by_id, is_active=True
+                ).values(*RECIPIENT_FIELDS)
+            ]
+
+    queue_notifications(notifications)
@@ -0,0 +1,143 @@
+import random
+from datetime import timedelta
+from itertools import groupby
+from smtplib import SMTPException
+
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification
+from .services import DIGEST_SCHEDULED_KEY, digest_text, send_sms, take_quota
+
+MAX_RETRIES = 5
+
+
+def retry_delay(retries):
+    # Exponential backoff with jitter, capped at ten minutes
+    return min(600, 10 * 2 ** retries) + random.uniform(0, 5)
+
+
+def pending_digests(channel):
+    """
+    Pending notifications of a channel grouped per recipient, limited by
+    the channel's rate budget.
+    """
+    notifications = Notification.objects.filter(
+        status='pending', channel=channel
+    ).select_related('recipient').order_by('recipient_id', 'created_at')[:settings.NOTIFICATION_BATCH_SIZE]
+
+    digests = [list(group) for _, group in groupby(notifications, key=lambda n: n.recipient_id)]
+    allowed = take_quota(channel, len(digests))
+    return digests[:allowed], len(digests) > allowed
+
+
+def mark_sent(digests):
+    Notification.objects.filter(
+        id__in=[notification.id for digest in digests for notification in digest]
+    ).update(status='sent', sent_at=timezone.now(), attempts=F('attempts') + 1)
+
+
+def mark_failed_attempt(task, digests):
+    ids = [notification.id for digest in digests for notification in digest]
+    updates = {'attempts': F('attempts') + 1}
+    if task.request.retries >= task.max_retries:
+        updates['status'] = 'failed'
+    Notification.objects.filter(id__in=ids, status='pending').update(**updates)
+
+
+def claim(digest):
+    # Lock the digest's rows that are still pending; a concurrent run skips them
+    ids = set(Notification.objects.select_for_update(skip_locked=True).filter(
+        id__in=[notification.id for notification in digest], status='pending'
+    ).values_list('id', flat=True))
+    return [notification for notification in digest if notification.id in ids]
+
+
+def deliver(task, digests, send):
+    """
+    Send digests one at a time, marking each one's rows sent as soon as it
+    is delivered, so a retry after a failure part way through only resends
+    what was not delivered. Returns the number of digests sent.
+    """
+    delivered = 0
+    for index, digest in enumerate(digests):
+        try:
+            with transaction.atomic():
+                digest = claim(digest)
+                if digest:
+                    send(digest)
+                    mark_sent([digest])
+                    delivered += 1
+        except (SMTPException, OSError) as exc:
+            mark_failed_attempt(task, digests[index:])
+            raise task.retry(exc=exc, countdown=retry_delay(task.request.retries))
+    return delivered
+
+
+def email_message(digest):
+    return EmailMessage(
+        subject=f'[BTS Monitoring] {len(digest)} new notification(s)',
+        body=digest_text(digest),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[digest[0].recipient.email],
+    )
+
+
+@shared_task
+def send_digests():
+    cache.delete(DIGEST_SCHEDULED_KEY)
+    send_email_digests.delay()
+    send_sms_digests.delay()
+
+
+@shared_task(bind=True, max_retries=MAX_RETRIES)
+def send_email_digests(self):
+    digests, throttled = pending_digests('email')
+    delivered = 0
+    if digests:
+        try:
+            # One SMTP connection for the whole batch
+            with get_connection() as connection:
+                delivered = deliver(
+                    self, digests, lambda digest: connection.send_messages([email_message(digest)])
+                )
+        except (SMTPException, OSError) as exc:
+            # Opening or closing the connection failed; delivered rows are not pending any more
+            mark_failed_attempt(self, digests)
+            raise self.retry(exc=exc, countdown=retry_delay(self.request.retries))
+
+    if throttled and not self.request.is_eager:
+        self.apply_async(countdown=60)
+    return delivered
+
+
+@shared_task(bind=True, max_retries=MAX_RETRIES)
+def send_sms_digests(self):
+    digests, throttled = pending_digests('sms')
+    delivered = deliver(self, digests, lambda digest: send_sms(digest[0].recipient.phone, digest_text(digest)))
+
+    if throttled and not self.request.is_eager:
+        self.apply_async(countdown=60)
+    return delivered
+
+
+@shared_task
+def sweep_pending_notifications():
+    """
+    Send notifications still pending well after their digest window, e.g.
+    when the worker running their digest died or it was never scheduled.
+    """
+    stale = timezone.now() - timedelta(seconds=2 * settings.NOTIFICATION_DIGEST_WINDOW)
+    channels = set(Notification.objects.filter(
+        status='pending', created_at__lt=stale
+    ).values_list('channel', flat=True).distinct().order_by())
+    if 'email' in channels:
+        send_email_digests.delay()
+    if 'sms' in channels:
+        send_sms_digests.delay()
+    return sorted(channels)
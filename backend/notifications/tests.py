@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from authentication.models import Team, User
+from monitoring.models import Region, Site, Alarm
+from monitoring.signals import alarm_state
+from .models import Notification
+from .signals import notify_new_alarms
+
+
+class AlarmNotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        team = Team.objects.create(name='Power Team', team_type='power')
+        cls.member = User.objects.create_user('technician', password='x', email='tech@example.com', team=team)
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.sites = [
+            Site.objects.create(
+                name=f'Site {index}', code=f'CEN-{index:03d}', region=region,
+                latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address=f'10.0.0.{index + 1}'
+            )
+            for index in range(3)
+        ]
+
+    def test_one_notification_per_batch(self):
+        alarms = Alarm.objects.bulk_create([
+            Alarm(site=site, alarm_type='power', severity='critical', title='Mains failure', description='')
+            for site in self.sites
+        ])
+        notify_new_alarms(sender=Alarm, changes=[(None, alarm_state(alarm)) for alarm in alarms])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.channel), (self.member, 'email'))
+        self.assertTrue(notification.message.startswith('3 new alarms:\n[CRITICAL] CEN-000: Mains failure'))
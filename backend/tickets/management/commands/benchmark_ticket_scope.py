@@ -0,0 +1,102 @@
+"""
+Benchmark technician ticket visibility: the per-view checks the ticket
+views used before (Q(team=user.team), loading the ticket and comparing its
+assignee and team objects) against Ticket.objects.visible_to().
+
+Synthetic tickets are created inside a transaction that is rolled back.
+
+    python manage.py benchmark_ticket_scope --tickets 500000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import Team, User
+from monitoring.models import Region, Site
+from tickets.models import Ticket
+
+
+class Command(BaseCommand):
+    help = 'Compare technician ticket scoping before and after the visible_to() queryset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=500000)
+        parser.add_argument('--teams', type=int, default=10)
+        parser.add_argument('--technicians', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            technician = self.populate(options)
+            self.run(technician, options)
+            transaction.set_rollback(True)
+
+    def populate(self, options):
+        teams = Team.objects.bulk_create([
+            Team(name=f'Benchmark Team {index}', team_type='general') for index in range(options['teams'])
+        ])
+        technicians = User.objects.bulk_create([
+            User(username=f'benchmark-technician-{index}', role='technician', team=teams[index % len(teams)])
+            for index in range(options['technicians'])
+        ])
+        region = Region.objects.create(name='Benchmark', code='BENCH')
+        sites = Site.objects.bulk_create([
+            Site(name=f'Bench {index}', code=f'BENCH-{index:04d}', region=region,
+                 latitude=0, longitude=0, ip_address=f'10.255.{index // 256 % 256}.{index % 256}')
+            for index in range(100)
+        ])
+        statuses = [choice for choice, _ in Ticket.STATUS_CHOICES]
+        batch = []
+        for index in range(options['tickets']):
+            batch.append(Ticket(
+                title=f'Ticket {index}', description='Synthetic ticket', site=sites[index % len(sites)],
+                status=statuses[index % len(statuses)], created_by=technicians[0],
+                assigned_to=technicians[index % len(technicians)], team=teams[index % 7 % len(teams)],
+            ))
+            if len(batch) == 10000:
+                Ticket.objects.bulk_create(batch)
+                batch = []
+        Ticket.objects.bulk_create(batch)
+        return technicians[1]
+
+    def measure(self, user_id, check, repeat):
+        # A fresh user per request, as authentication hands the views
+        best = None
+        for _ in range(repeat):
+            user = User.objects.get(id=user_id)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                check(user)
+                elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(queries)
+
+    def run(self, technician, options):
+        # Visible through the team but assigned to someone else
+        ticket_id = Ticket.objects.filter(team_id=technician.team_id).exclude(
+            assigned_to=technician
+        ).values_list('id', flat=True).first()
+
+        def page(queryset):
+            return queryset.count(), list(queryset.order_by('-created_at', '-id').values('id', 'title')[:20])
+
+        def old_check(user):
+            ticket = Ticket.objects.get(id=ticket_id)
+            return not (ticket.assigned_to != user and ticket.team != user.team)
+
+        cases = [
+            ('list page, before', lambda user: page(Ticket.objects.filter(Q(assigned_to=user) | Q(team=user.team)))),
+            ('list page, visible_to', lambda user: page(Ticket.objects.visible_to(user))),
+            ('access check, before', old_check),
+            ('access check, visible_to',
+             lambda user: Ticket.objects.visible_to(user).filter(id=ticket_id).exists()),
+        ]
+        visible = Ticket.objects.visible_to(technician).count()
+        self.stdout.write(f'{options["tickets"]} tickets, {visible} visible to the technician')
+        for name, check in cases:
+            elapsed, queries = self.measure(technician.id, check, options['repeat'])
+            self.stdout.write(f'{name:<28} {queries:3d} queries  {elapsed * 1000:9.2f} ms')
@@ -1,10 +1,48 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
-from monitoring.models import Alarm, Site
+from monitoring.models import Alarm, ArchivedAlarm, Site
 
 User = get_user_model()
 
 
+def ticket_scope(user):
+    """
+    Q of the tickets a technician may see (assigned to them or their team),
+    None for roles that see every ticket. Built from ids so it never loads
+    the team, and kept on the user object, which lives for one request.
+    """
+    try:
+        return user._ticket_scope
+    except AttributeError:
+        pass
+    scope = None
+    if user.role == 'technician':
+        scope = Q(assigned_to_id=user.id)
+        # Without a team, team=None would match every unrouted ticket
+        if user.team_id is not None:
+            scope |= Q(team_id=user.team_id)
+    user._ticket_scope = scope
+    return scope
+
+
+def keep_archived_alarm(collector, field, sub_objs, using):
+    """
+    on_delete of Ticket.alarm: SET_NULL, except for tickets of alarms that
+    are being archived, which keep the id to find them in ArchivedAlarm.
+    """
+    archived = set(ArchivedAlarm.objects.using(using).filter(
+        id__in={ticket.alarm_id for ticket in sub_objs}
+    ).values_list('id', flat=True))
+    collector.add_field_update(field, None, [ticket for ticket in sub_objs if ticket.alarm_id not in archived])
+
+
+class TicketQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        scope = ticket_scope(user)
+        return self if scope is None else self.filter(scope)
+
+
 class Ticket(models.Model):
     STATUS_CHOICES = [
         ('open', 'Open'),
@@ -22,7 +60,10 @@ class Ticket(models.Model):
     
     title = models.CharField(max_length=200)
     description = models.TextField()
-    alarm = models.ForeignKey(Alarm, on_delete=models.CASCADE, null=True, blank=True)
+    # Unconstrained so tickets keep their alarm id once it is archived
+    alarm = models.ForeignKey(
+        Alarm, on_delete=keep_archived_alarm, db_constraint=False, null=True, blank=True
+    )
     site = models.ForeignKey(Site, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     priority = models.CharField(max_length=20, choices=PRIORITY_CHOICES, default='medium')
@@ -33,11 +74,26 @@ class Ticket(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TicketQuerySet.as_manager()
+
     def __str__(self):
         return f"#{self.id} - {self.title}"
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'priority'], name='ticket_status_priority_idx'),
+            models.Index(fields=['status', '-created_at'], name='ticket_status_created_idx'),
+            models.Index(fields=['assigned_to', 'status'], name='ticket_assignee_status_idx'),
+            models.Index(fields=['team', 'status'], name='ticket_team_status_idx'),
+            models.Index(fields=['site', 'status'], name='ticket_site_status_idx'),
+            models.Index(fields=['-created_at', '-id'], name='ticket_created_idx'),
+            # Partial index for the open work queue
+            models.Index(
+                fields=['priority', '-created_at'], name='ticket_open_priority_idx',
+                condition=Q(status__in=['open', 'in_progress'])
+            ),
+        ]
 
 
 class TicketComment(models.Model):
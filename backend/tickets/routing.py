@@ -0,0 +1,96 @@
+"""
+Ticket routing for BTS Monitoring System
+
+The router keeps an in-memory table of team type -> teams and their active
+technicians, plus the number of open tickets assigned to each technician.
+Both are loaded with one query each and reloaded every TICKET_ROUTING_TTL
+seconds; in between, ticket saves keep the counters current, so picking the
+least loaded technician costs no query.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+
+from authentication.models import Team
+from .models import Ticket
+
+User = get_user_model()
+
+OPEN_STATUSES = ('open', 'in_progress')
+
+
+class TicketRouter:
+    def __init__(self, ttl=None):
+        self.ttl = ttl or settings.TICKET_ROUTING_TTL
+        self.lock = threading.Lock()
+        self.teams = None
+        self.open_tickets = {}
+        self.loaded_at = 0
+
+    def load(self):
+        teams = {}
+        for team_id, team_type in Team.objects.filter(is_active=True).values_list('id', 'team_type'):
+            teams.setdefault(team_type, {})[team_id] = []
+        members = {team_id: users for by_id in teams.values() for team_id, users in by_id.items()}
+        for user_id, team_id in User.objects.filter(
+            is_active=True, role='technician', team_id__in=members
+        ).values_list('id', 'team_id'):
+            members[team_id].append(user_id)
+
+        self.teams = teams
+        self.open_tickets = dict(
+            Ticket.objects.filter(status__in=OPEN_STATUSES, assigned_to__isnull=False)
+            .values_list('assigned_to').annotate(count=Count('id')).values_list('assigned_to', 'count')
+        )
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self.lock:
+            self.teams = None
+
+    def route(self, alarm_type):
+        """
+        (team_id, user_id) for a new ticket about an alarm_type alarm: the
+        least loaded technician of the responsible teams, falling back to
+        the general team. Either may be None.
+        """
+        team_type = settings.ALARM_TEAM_TYPES.get(alarm_type, 'general')
+        with self.lock:
+            if self.teams is None or time.monotonic() - self.loaded_at > self.ttl:
+                self.load()
+            teams = self.teams.get(team_type) or self.teams.get('general')
+            if not teams:
+                return None, None
+
+            candidates = [(team_id, user_id) for team_id, users in teams.items() for user_id in users]
+            if not candidates:
+                return min(teams), None
+            team_id, user_id = min(
+                candidates, key=lambda candidate: (self.open_tickets.get(candidate[1], 0), candidate[1])
+            )
+            self.open_tickets[user_id] = self.open_tickets.get(user_id, 0) + 1
+            return team_id, user_id
+
+    def ticket_changed(self, old, new):
+        """
+        Adjust the counters for a ticket whose (assignee, status) went from
+        old to new; either may be None.
+        """
+        with self.lock:
+            for state, delta in ((old, -1), (new, 1)):
+                if state is not None and state[0] is not None and state[1] in OPEN_STATUSES:
+                    self.open_tickets[state[0]] = max(0, self.open_tickets.get(state[0], 0) + delta)
+
+
+_router = None
+
+
+def get_router():
+    global _router
+    if _router is None:
+        _router = TicketRouter()
+    return _router
@@ -0,0 +1,59 @@
+"""
+Read-optimized ticket list rows (see monitoring.rows).
+"""
+
+from monitoring.rows import Field, Nested, RowSpec, timestamp, user_name
+from .models import TicketComment, TicketAttachment
+
+
+def file_url(request, name):
+    # Same output as DRF's FileField: absolute URL when there is a request
+    if not name:
+        return None
+    url = TicketAttachment._meta.get_field('file').storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+COMMENT_ROWS = RowSpec({
+    'id': Field('id'),
+    'comment': Field('comment'),
+    'user': Field('user'),
+    'user_name': user_name('user'),
+    'is_internal': Field('is_internal'),
+    'created_at': timestamp('created_at'),
+})
+
+ATTACHMENT_ROWS = RowSpec({
+    'id': Field('id'),
+    'file': Field('file', convert=file_url, uses_request=True),
+    'filename': Field('filename'),
+    'uploaded_by': Field('uploaded_by'),
+    'uploaded_by_name': user_name('uploaded_by'),
+    'uploaded_at': timestamp('uploaded_at'),
+}, always=('id',))
+
+TICKET_ROWS = RowSpec({
+    'id': Field('id'),
+    'title': Field('title'),
+    'description': Field('description'),
+    'alarm': Field('alarm'),
+    'alarm_title': Field('alarm__title'),
+    'site': Field('site'),
+    'site_name': Field('site__name'),
+    'site_code': Field('site__code'),
+    'region_name': Field('site__region__name'),
+    'status': Field('status'),
+    'priority': Field('priority'),
+    'assigned_to': Field('assigned_to'),
+    'assigned_to_name': user_name('assigned_to'),
+    'created_by': Field('created_by'),
+    'created_by_name': user_name('created_by'),
+    'team': Field('team'),
+    'team_name': Field('team__name'),
+    'resolved_at': timestamp('resolved_at'),
+    'created_at': timestamp('created_at'),
+    'updated_at': timestamp('updated_at'),
+}, expansions={
+    'comments': Nested(TicketComment.objects.all(), 'ticket', COMMENT_ROWS, list(COMMENT_ROWS.fields)),
+    'attachments': Nested(TicketAttachment.objects.all(), 'ticket', ATTACHMENT_ROWS, list(ATTACHMENT_ROWS.fields)),
+})
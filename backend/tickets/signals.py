@@ -0,0 +1,72 @@
+"""
+Ticket signals for BTS Monitoring System
+
+tickets_created is sent with tickets=[...] when tickets are bulk created,
+which bypasses post_save.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from authentication.models import Team, User
+from monitoring.signals import alarm_states_changed
+from .models import Ticket
+from .routing import get_router
+from .stats import bump_version
+
+logger = logging.getLogger(f'bts_monitoring.{__name__}')
+
+# Sent with tickets=[...]
+tickets_created = Signal()
+
+
+@receiver(alarm_states_changed)
+def open_tickets_for_alarms(sender, changes, **kwargs):
+    alarm_ids = [new.id for old, new in changes if old is None and new is not None
+                 and new.severity in settings.TICKET_AUTO_SEVERITIES]
+    if alarm_ids:
+        # Imported here as the task module imports this one
+        from .tasks import create_tickets_for_alarms
+        try:
+            create_tickets_for_alarms.delay(alarm_ids)
+        except Exception:
+            # The alarms are already stored; never fail their write
+            logger.exception('Failed to queue tickets for %d alarms', len(alarm_ids))
+
+
+@receiver(post_init, sender=Ticket)
+def remember_ticket_assignment(sender, instance, **kwargs):
+    instance._routed_state = (instance.assigned_to_id, instance.status) if instance.pk else None
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, **kwargs):
+    new = (instance.assigned_to_id, instance.status)
+    old, instance._routed_state = instance._routed_state, new
+    if old != new:
+        # Counted once the save commits, so a rollback leaves them alone
+        old = None if created else old
+        transaction.on_commit(lambda: get_router().ticket_changed(old, new))
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    old = instance._routed_state
+    transaction.on_commit(lambda: get_router().ticket_changed(old, None))
+    transaction.on_commit(bump_version)
+
+
+@receiver(tickets_created)
+def tickets_bulk_created(sender, tickets, **kwargs):
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_save, sender=User)
+def team_membership_changed(sender, **kwargs):
+    get_router().invalidate()
@@ -0,0 +1,73 @@
+"""
+Ticket statistics for BTS Monitoring System
+
+Counts by status and priority come from one conditional-aggregation query
+over the tickets a user can see, and the result is cached per user. Ticket
+changes bump VERSION_KEY, which orphans every cached result at once.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Ticket
+from .rows import TICKET_ROWS
+
+VERSION_KEY = 'tickets:stats:version'
+
+STATUSES = sorted(choice for choice, _ in Ticket.STATUS_CHOICES)
+PRIORITIES = sorted(choice for choice, _ in Ticket.PRIORITY_CHOICES)
+RECENT_FIELDS = ['id', 'title', 'status', 'priority', 'site_code', 'assigned_to_name', 'created_at']
+
+
+def bump_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def stats_key(user):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    # Role and team decide which tickets the user sees
+    return f'tickets:stats:{version}:{user.id}:{user.role}:{user.team_id}'
+
+
+def compute_stats(queryset):
+    counts = queryset.aggregate(
+        total=Count('id'),
+        **{f'status_{value}': Count('id', filter=Q(status=value)) for value in STATUSES},
+        **{f'priority_{value}': Count('id', filter=Q(priority=value)) for value in PRIORITIES},
+    )
+    recent = queryset.order_by('-created_at', '-id').values(*TICKET_ROWS.lookups(RECENT_FIELDS))[:5]
+
+    return {
+        'total_tickets': counts['total'],
+        'open_tickets': counts['status_open'],
+        'in_progress_tickets': counts['status_in_progress'],
+        'resolved_tickets': counts['status_resolved'],
+        'stats_by_status': [
+            {'status': value, 'count': counts[f'status_{value}']}
+            for value in STATUSES if counts[f'status_{value}']
+        ],
+        'stats_by_priority': [
+            {'priority': value, 'count': counts[f'priority_{value}']}
+            for value in PRIORITIES if counts[f'priority_{value}']
+        ],
+        'recent_tickets': TICKET_ROWS.render(list(recent), RECENT_FIELDS, (), None),
+    }
+
+
+def get_ticket_stats(user, queryset):
+    """
+    Stats over `queryset`, the tickets visible to `user`.
+    """
+    key = stats_key(user)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_stats(queryset)
+        cache.set(key, stats, settings.TICKET_STATS_TTL)
+    return stats
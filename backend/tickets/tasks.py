@@ -0,0 +1,81 @@
+from celery import shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from monitoring.models import Alarm
+from .models import Ticket
+from .routing import get_router
+from .signals import tickets_created
+
+User = get_user_model()
+
+# Alarm severity -> ticket priority
+PRIORITIES = {
+    'critical': 'urgent',
+    'major': 'high',
+    'minor': 'medium',
+    'warning': 'low',
+}
+
+
+def system_user():
+    user, created = User.objects.get_or_create(
+        username=settings.TICKET_SYSTEM_USERNAME,
+        defaults={'role': 'admin', 'first_name': 'System', 'is_active': False},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    elif user.is_active or user.has_usable_password():
+        # Never attribute automatic tickets to an account someone can log into
+        raise ImproperlyConfigured(
+            f'TICKET_SYSTEM_USERNAME {user.username!r} belongs to a login account'
+        )
+    return user
+
+
+@shared_task
+def create_tickets_for_alarms(alarm_ids):
+    """
+    Open one routed ticket per alarm that is still active and has none yet.
+    Tickets are written with bulk inserts, so an alarm storm costs a few
+    queries per batch rather than several per alarm.
+    """
+    router = get_router()
+    created_by = system_user()
+    created = []
+
+    for start in range(0, len(alarm_ids), settings.TICKET_BATCH_SIZE):
+        batch = alarm_ids[start:start + settings.TICKET_BATCH_SIZE]
+        with transaction.atomic():
+            # Locking the alarms serializes concurrent or retried runs, so the
+            # ticketed check sees the tickets an earlier run committed
+            alarms = list(Alarm.objects.select_for_update(of=('self',)).filter(
+                id__in=batch, status='active'
+            ).select_related('site').order_by('id'))
+            ticketed = set(Ticket.objects.filter(
+                alarm_id__in=[alarm.id for alarm in alarms]
+            ).values_list('alarm_id', flat=True))
+
+            tickets = []
+            for alarm in alarms:
+                if alarm.id in ticketed:
+                    continue
+                team_id, user_id = router.route(alarm.alarm_type)
+                tickets.append(Ticket(
+                    title=f'{alarm.site.code}: {alarm.title}',
+                    description=alarm.description,
+                    alarm=alarm,
+                    site_id=alarm.site_id,
+                    priority=PRIORITIES.get(alarm.severity, 'medium'),
+                    assigned_to_id=user_id,
+                    team_id=team_id,
+                    created_by=created_by,
+                ))
+            created += Ticket.objects.bulk_create(tickets)
+
+    if created:
+        tickets_created.send(sender=Ticket, tickets=created)
+    return len(created)
@@ -0,0 +1,164 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from authentication.models import Team, User
+from monitoring.archive import archive_alarms
+from monitoring.models import Region, Site, Alarm, ArchivedAlarm
+from .models import Ticket
+from .routing import get_router
+
+
+class TicketStatsTests(APITestCase):
+    """
+    Ticket stats count the tickets each role can see, and are recomputed
+    once a ticket changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        power = Team.objects.create(name='Power Team', team_type='power')
+        radio = Team.objects.create(name='BSS Team', team_type='bss')
+        cls.admin = User.objects.create_user('admin', password='x', role='admin')
+        cls.operator = User.objects.create_user('operator', password='x', role='operator')
+        cls.technician = User.objects.create_user('technician', password='x', role='technician', team=power)
+        region = Region.objects.create(name='Centre', code='CEN')
+        site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+
+        def ticket(status, priority, **kwargs):
+            return Ticket.objects.create(
+                title=f'{status} {priority}', description='', site=site, status=status,
+                priority=priority, created_by=cls.admin, **kwargs
+            )
+
+        # The technician sees their own ticket and their team's
+        cls.assigned = ticket('open', 'high', assigned_to=cls.technician)
+        ticket('in_progress', 'urgent', team=power)
+        ticket('resolved', 'high', team=radio)
+        ticket('open', 'low')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_stats(self, user):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('ticket-stats'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_by_role(self):
+        for user in (self.admin, self.operator):
+            with self.subTest(role=user.role):
+                stats = self.get_stats(user)
+                self.assertEqual(stats['total_tickets'], 4)
+                self.assertEqual(
+                    (stats['open_tickets'], stats['in_progress_tickets'], stats['resolved_tickets']), (2, 1, 1)
+                )
+                self.assertEqual(stats['stats_by_priority'], [
+                    {'priority': 'high', 'count': 2},
+                    {'priority': 'low', 'count': 1},
+                    {'priority': 'urgent', 'count': 1},
+                ])
+                self.assertEqual(len(stats['recent_tickets']), 4)
+
+        stats = self.get_stats(self.technician)
+        self.assertEqual(stats['total_tickets'], 2)
+        self.assertEqual(stats['stats_by_status'], [
+            {'status': 'in_progress', 'count': 1},
+            {'status': 'open', 'count': 1},
+        ])
+        self.assertEqual(stats['stats_by_priority'], [
+            {'priority': 'high', 'count': 1},
+            {'priority': 'urgent', 'count': 1},
+        ])
+
+    def test_cached_until_a_ticket_changes(self):
+        self.assertEqual(self.get_stats(self.technician)['open_tickets'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_stats(self.technician)['open_tickets'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assigned.status = 'resolved'
+            self.assigned.save()
+
+        stats = self.get_stats(self.technician)
+        self.assertEqual((stats['open_tickets'], stats['resolved_tickets']), (0, 1))
+
+
+class TicketAlarmTests(APITestCase):
+    """
+    Deleting an alarm unlinks its tickets; archiving it keeps the link.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operator', password='x', role='operator')
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+
+    def ticket_for(self, alarm_status):
+        alarm = Alarm.objects.create(
+            site=self.site, alarm_type='power', severity='major', status=alarm_status,
+            title='Mains failure', description=''
+        )
+        return Ticket.objects.create(
+            title='Mains failure', description='', alarm=alarm, site=self.site, created_by=self.user
+        )
+
+    def test_delete(self):
+        ticket = self.ticket_for('active')
+        ticket.alarm.delete()
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.alarm_id)
+
+    def test_archive(self):
+        ticket = self.ticket_for('resolved')
+        archive_alarms(timezone.now() + timedelta(days=365))
+        ticket.refresh_from_db()
+        self.assertTrue(ArchivedAlarm.objects.filter(id=ticket.alarm_id).exists())
+
+
+class TicketRouterCounterTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.technician = User.objects.create_user('technician', password='x', role='technician')
+        region = Region.objects.create(name='Centre', code='CEN')
+        cls.site = Site.objects.create(
+            name='Site 1', code='CEN-001', region=region,
+            latitude=Decimal('3.8'), longitude=Decimal('11.5'), ip_address='10.0.0.1'
+        )
+
+    def setUp(self):
+        self.router = get_router()
+        self.router.open_tickets = {}
+
+    def create_ticket(self):
+        return Ticket.objects.create(
+            title='Mains failure', description='', site=self.site,
+            assigned_to=self.technician, created_by=self.technician
+        )
+
+    def test_counted_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_ticket()
+        self.assertEqual(self.router.open_tickets, {self.technician.id: 1})
+
+    def test_rollback_not_counted(self):
+        try:
+            with transaction.atomic():
+                self.create_ticket()
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertEqual(self.router.open_tickets, {})
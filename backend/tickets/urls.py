@@ -6,5 +6,6 @@ urlpatterns = [
     path('<int:pk>/', views.TicketDetailView.as_view(), name='ticket-detail'),
     path('<int:ticket_id>/comment/', views.add_comment, name='add-comment'),
     path('<int:ticket_id>/attachment/', views.add_attachment, name='add-attachment'),
+    path('export/<str:export_format>/', views.export_tickets, name='ticket-export'),
     path('stats/', views.ticket_stats, name='ticket-stats'),
 ]
\ No newline at end of file
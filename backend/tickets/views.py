@@ -1,18 +1,42 @@
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Count, Q
 from django.utils import timezone
+from monitoring.exports import FORMATS, TICKET_COLUMNS, stream_export
+from monitoring.pagination import SelectablePagination
 from .models import Ticket, TicketComment, TicketAttachment
+from .rows import TICKET_ROWS
+from .stats import get_ticket_stats
 from .serializers import (
     TicketSerializer, TicketCreateSerializer, 
     TicketCommentSerializer, TicketAttachmentSerializer
 )
 
 
+def filter_tickets(queryset, user, params):
+    # Role scoping and query filters shared by the ticket list and its export
+    queryset = queryset.visible_to(user)
+
+    status_filter = params.get('status')
+    priority = params.get('priority')
+    assigned_to = params.get('assigned_to')
+    site = params.get('site')
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+    if priority:
+        queryset = queryset.filter(priority=priority)
+    if assigned_to:
+        queryset = queryset.filter(assigned_to__id=assigned_to)
+    if site:
+        queryset = queryset.filter(site__code=site)
+    return queryset
+
+
 class TicketListCreateView(generics.ListCreateAPIView):
     queryset = Ticket.objects.all()
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SelectablePagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -20,32 +44,11 @@ class TicketListCreateView(generics.ListCreateAPIView):
         return TicketSerializer
     
     def get_queryset(self):
-        queryset = Ticket.objects.all()
-        
-        # Filter based on user role
-        user = self.request.user
-        if user.role == 'technician':
-            # Technicians only see tickets assigned to them or their team
-            queryset = queryset.filter(
-                Q(assigned_to=user) | Q(team=user.team)
-            )
-        
-        # Additional filters
-        status_filter = self.request.query_params.get('status')
-        priority = self.request.query_params.get('priority')
-        assigned_to = self.request.query_params.get('assigned_to')
-        site = self.request.query_params.get('site')
-        
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        if priority:
-            queryset = queryset.filter(priority=priority)
-        if assigned_to:
-            queryset = queryset.filter(assigned_to__id=assigned_to)
-        if site:
-            queryset = queryset.filter(site__code=site)
-            
-        return queryset
+        return filter_tickets(Ticket.objects.all(), self.request.user, self.request.query_params)
+    
+    def list(self, request, *args, **kwargs):
+        # Rendered from .values() rows; ?expand=comments,attachments nests them
+        return TICKET_ROWS.list_response(self, self.get_queryset())
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
@@ -57,88 +60,61 @@ class TicketDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        user = self.request.user
-        if user.role == 'technician':
-            return Ticket.objects.filter(
-                Q(assigned_to=user) | Q(team=user.team)
-            )
-        return Ticket.objects.all()
+        return Ticket.objects.visible_to(self.request.user)
+
+
+def ticket_access_error(user, ticket_id):
+    # One EXISTS on the visible tickets; why it failed is only asked after
+    if Ticket.objects.visible_to(user).filter(id=ticket_id).exists():
+        return None
+    if Ticket.objects.filter(id=ticket_id).exists():
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    return Response({'error': 'Ticket not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def add_comment(request, ticket_id):
-    try:
-        ticket = Ticket.objects.get(id=ticket_id)
-        
-        # Check permissions
-        user = request.user
-        if user.role == 'technician' and ticket.assigned_to != user and ticket.team != user.team:
-            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
-        serializer = TicketCommentSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(ticket=ticket, user=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
-    except Ticket.DoesNotExist:
-        return Response({'error': 'Ticket not found'}, status=status.HTTP_404_NOT_FOUND)
+    error = ticket_access_error(request.user, ticket_id)
+    if error is not None:
+        return error
+
+    serializer = TicketCommentSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(ticket_id=ticket_id, user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def add_attachment(request, ticket_id):
-    try:
-        ticket = Ticket.objects.get(id=ticket_id)
-        
-        # Check permissions
-        user = request.user
-        if user.role == 'technician' and ticket.assigned_to != user and ticket.team != user.team:
-            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
-        
-        serializer = TicketAttachmentSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save(ticket=ticket, uploaded_by=request.user)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-        
-    except Ticket.DoesNotExist:
-        return Response({'error': 'Ticket not found'}, status=status.HTTP_404_NOT_FOUND)
+    error = ticket_access_error(request.user, ticket_id)
+    if error is not None:
+        return error
+
+    serializer = TicketAttachmentSerializer(data=request.data)
+    if serializer.is_valid():
+        serializer.save(ticket_id=ticket_id, uploaded_by=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def ticket_stats(request):
-    user = self.request.user
-    
-    # Base queryset based on user role
-    if user.role == 'technician':
-        queryset = Ticket.objects.filter(
-            Q(assigned_to=user) | Q(team=user.team)
-        )
-    else:
-        queryset = Ticket.objects.all()
-    
-    # Get counts by status
-    stats_by_status = queryset.values('status').annotate(
-        count=Count('id')
-    ).order_by('status')
-    
-    # Get counts by priority
-    stats_by_priority = queryset.values('priority').annotate(
-        count=Count('id')
-    ).order_by('priority')
-    
-    # Recent tickets
-    recent_tickets = queryset.order_by('-created_at')[:5]
-    
-    return Response({
-        'total_tickets': queryset.count(),
-        'open_tickets': queryset.filter(status='open').count(),
-        'in_progress_tickets': queryset.filter(status='in_progress').count(),
-        'resolved_tickets': queryset.filter(status='resolved').count(),
-        'stats_by_status': list(stats_by_status),
-        'stats_by_priority': list(stats_by_priority),
-        'recent_tickets': TicketSerializer(recent_tickets, many=True).data
-    })
\ No newline at end of file
+    # Cached per user until any ticket changes
+    user = request.user
+    return Response(get_ticket_stats(user, Ticket.objects.visible_to(user)))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def export_tickets(request, export_format):
+    """
+    Stream every ticket matching the list filters as CSV or NDJSON.
+    """
+    if export_format not in FORMATS:
+        return Response({'error': 'Format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+    queryset = filter_tickets(Ticket.objects.order_by('-created_at', '-id'), request.user, request.query_params)
+    return stream_export(queryset, TICKET_COLUMNS, export_format, 'tickets')